@@ -1,116 +1,257 @@
 """
 Sky Test - Веб-приложение для создания и прохождения тестов
 Главный файл приложения - точка входа
+
+Приложение создается фабрикой create_app(). Импорт этого модуля не загружает
+модели, маршруты и flasgger и не обращается к БД. Таблицы создаются командой:
+    flask --app app init-db
+
+Для совместимости с `gunicorn app:app` атрибут модуля app создает приложение
+с настройками Config при первом обращении.
 """
 
 import os
 import json
-from flask import Flask, render_template
-from flasgger import Swagger
-from flask_cors import CORS
+import logging
+from flask import Flask
 from config import Config
-from backend.models import db
-from backend.models.user import User
-from backend.models.test import Test
-from backend.models.question import Question
-from backend.models.attempt import TestAttempt
-from backend.models.answer import Answer
-from backend.routes.auth import auth_bp
-from backend.routes.tests import tests_bp
-from backend.routes.questions import questions_bp
-from backend.routes.attempts import attempts_bp
-from backend.routes.statistics import statistics_bp
-from backend.routes.views import views_bp
-
-# Создание экземпляра Flask приложения
-app = Flask(__name__,
-            template_folder='templates',
-            static_folder='static')
-app.config.from_object(Config)
-
-# Создание папки для базы данных если её нет
-db_folder = os.path.join(os.path.dirname(__file__), 'database')
-os.makedirs(db_folder, exist_ok=True)
-
-# Инициализация SQLAlchemy (ORM для работы с БД)
-db.init_app(app)
-
-# Настройка CORS - разрешает API принимать запросы с других доменов
-CORS(app, resources={r"/api/*": {"origins": Config.CORS_ORIGINS}})
-
-# Ограничение размера запроса (защита от DoS-атак)
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB
-
-# Конфигурация Swagger (автодокументация API)
-swagger_config = {
-    "headers": [],
-    "specs": [{"endpoint": 'apispec', "route": '/apispec.json'}],
-    "static_url_path": "/flasgger_static",
-    "swagger_ui": True,
-    "specs_route": "/swagger"
-}
-
-swagger_template = {
-    "info": {
-        "title": "Sky Test API",
-        "description": "API для платформы тестирования",
-        "version": "1.0.0"
-    },
-    "securityDefinitions": {
-        "Bearer": {
-            "type": "apiKey",
-            "name": "Authorization",
-            "in": "header",
-            "description": "JWT token. Вставьте токен БЕЗ слова 'Bearer' - просто сам токен. Или используйте формат: Bearer {token}"
-        }
-    }
-}
-
-Swagger(app, config=swagger_config, template=swagger_template)
-
-# Кастомный фильтр Jinja2 для парсинга JSON в шаблонах
-# Используется для преобразования JSON строк (например, вариантов ответов) в список
-@app.template_filter('from_json')
-def from_json_filter(value):
-    """Парсит JSON строку в Python объект (список/словарь)"""
-    if not value:
-        return []
-    try:
-        return json.loads(value)
-    except (json.JSONDecodeError, TypeError):
-        return []
-
-# Регистрация маршрутов (blueprints)
-# API endpoints для JSON запросов
-app.register_blueprint(auth_bp)        # /api/auth/*
-app.register_blueprint(tests_bp)       # /api/tests/*
-app.register_blueprint(questions_bp)   # /api/questions/*
-app.register_blueprint(attempts_bp)    # /api/attempts/*
-app.register_blueprint(statistics_bp)  # /api/statistics/*
-
-# HTML views для браузера
-app.register_blueprint(views_bp)
-
-# Обработчики ошибок - показывают красивые страницы вместо стандартных ошибок
-@app.errorhandler(404)
-def page_not_found(e):
-    """Страница не найдена"""
-    return render_template('error.html', error_code=404,
-                         error_message='Страница не найдена'), 404
-
-@app.errorhandler(500)
-def internal_error(e):
-    """Внутренняя ошибка сервера"""
-    return render_template('error.html', error_code=500,
-                         error_message='Внутренняя ошибка сервера'), 500
-
-# Создание таблиц в базе данных при первом запуске
-with app.app_context():
-    db.create_all()  # Создает таблицы если их ещё нет
+
+
+def create_app(config=Config):
+    """
+    Создание и настройка экземпляра приложения
+
+    Args:
+        config: Объект настроек (по умолчанию Config - переменные окружения и .env);
+            модули backend читают настройки из current_app.config
+
+    Returns:
+        Flask: Настроенное приложение
+    """
+    from flask_cors import CORS
+    from backend.models import db
+    from backend.utils.api_docs import init_api_docs, get_api_spec
+    from backend.utils.db_pool import engine_options, install_statement_timeout
+    from backend.utils.db_routing import replica_binds
+    from backend.utils.sqlite_profile import setup_sqlite_profile
+    from backend.utils.sql_instrumentation import install_sql_instrumentation, init_sql_instrumentation
+    from backend.utils.slow_query_log import install_slow_query_log
+    from backend.utils.metrics import init_metrics
+    from backend.utils.profiling import init_profiling
+
+    logging.basicConfig(level=config.LOG_LEVEL, format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+
+    # Создание экземпляра Flask приложения
+    app = Flask(__name__,
+                template_folder='templates',
+                static_folder='static')
+    app.config.from_object(config)
+
+    # IP клиента и схема из заголовков доверенного обратного прокси (лимиты входа по IP)
+    proxy_count = app.config['TRUSTED_PROXY_COUNT']
+    if proxy_count:
+        from werkzeug.middleware.proxy_fix import ProxyFix
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=proxy_count, x_proto=proxy_count)
+
+    # Создание папки для базы данных если её нет
+    db_folder = os.path.join(os.path.dirname(__file__), 'database')
+    os.makedirs(db_folder, exist_ok=True)
+
+    # Инициализация SQLAlchemy (ORM для работы с БД) с параметрами пула соединений
+    # и необязательной репликой для чтения (bind 'replica')
+    with app.app_context():
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
+        app.config['SQLALCHEMY_BINDS'] = replica_binds(app.config['SQLALCHEMY_DATABASE_URI'])
+    db.init_app(app)
+
+    # Настройка CORS - разрешает API принимать запросы с других доменов
+    CORS(app, resources={r"/api/*": {"origins": app.config['CORS_ORIGINS']}})
+
+    # Ограничение размера запроса (защита от DoS-атак)
+    app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB
+
+    # Swagger UI и /apispec.json - flasgger загружается при первом обращении
+    init_api_docs(app)
+
+    # Кастомный фильтр Jinja2 для парсинга JSON в шаблонах
+    # Используется для преобразования JSON строк (например, вариантов ответов) в список
+    @app.template_filter('from_json')
+    def from_json_filter(value):
+        """Парсит JSON строку в Python объект (список/словарь)"""
+        if not value:
+            return []
+        try:
+            return json.loads(value)
+        except (json.JSONDecodeError, TypeError):
+            return []
+
+    # Метрики Prometheus (/metrics) - первый обработчик before_request, задержка учитывает остальные
+    init_metrics(app)
+
+    # Профилирование отдельных запросов по заголовку X-Profile или выборке (PROFILE_*)
+    init_profiling(app)
+
+    # Количество и время SQL запросов каждого HTTP запроса, поиск N+1
+    init_sql_instrumentation(app)
+
+    _register_blueprints(app)
+    _register_error_handlers(app)
+    _register_commands(app)
+
+    with app.app_context():
+        # Обработчики соединений подключаются до первого соединения с БД
+        for engine in db.engines.values():
+            install_statement_timeout(engine)
+            setup_sqlite_profile(engine)
+            install_sql_instrumentation(engine)
+            install_slow_query_log(engine)
+
+    # Спецификация API при запуске (иначе - при первом запросе к /apispec.json)
+    if app.config['API_SPEC_BUILD_ON_STARTUP']:
+        get_api_spec(app)
+
+    return app
+
+
+def _register_blueprints(app):
+    """Регистрация маршрутов (blueprints)"""
+    from backend.routes.auth import auth_bp
+    from backend.routes.tests import tests_bp
+    from backend.routes.questions import questions_bp
+    from backend.routes.attempts import attempts_bp
+    from backend.routes.statistics import statistics_bp
+    from backend.routes.views import views_bp
+
+    # API endpoints для JSON запросов
+    app.register_blueprint(auth_bp)        # /api/auth/*
+    app.register_blueprint(tests_bp)       # /api/tests/*
+    app.register_blueprint(questions_bp)   # /api/questions/*
+    app.register_blueprint(attempts_bp)    # /api/attempts/*
+    app.register_blueprint(statistics_bp)  # /api/statistics/*
+
+    # HTML views для браузера
+    app.register_blueprint(views_bp)
+
+
+def _register_error_handlers(app):
+    """Обработчики ошибок - показывают красивые страницы вместо стандартных ошибок"""
+    from flask import render_template, request, make_response
+    from backend.utils.db_pool import StatementTimeoutError
+    from backend.utils.password import PasswordHashingBusyError
+    from backend.utils.rate_limit import RateLimitExceeded
+    from backend.utils.responses import error_response
+
+    @app.errorhandler(404)
+    def page_not_found(e):
+        """Страница не найдена"""
+        return render_template('error.html', error_code=404,
+                             error_message='Страница не найдена'), 404
+
+    @app.errorhandler(500)
+    def internal_error(e):
+        """Внутренняя ошибка сервера"""
+        return render_template('error.html', error_code=500,
+                             error_message='Внутренняя ошибка сервера'), 500
+
+    @app.errorhandler(PasswordHashingBusyError)
+    def password_hashing_busy(e):
+        """Пул хеширования паролей перегружен - просим клиента повторить позже"""
+        if request.path.startswith('/api/'):
+            response, status = error_response('Server is busy, please retry later', 503)
+        else:
+            response = make_response(render_template('error.html', error_code=503,
+                                                     error_message='Сервер перегружен, попробуйте позже'), 503)
+        response.status_code = 503
+        response.headers['Retry-After'] = str(int(app.config['PASSWORD_HASH_WAIT_TIMEOUT']) or 1)
+        return response
+
+    @app.errorhandler(RateLimitExceeded)
+    def rate_limit_exceeded(e):
+        """Слишком много попыток входа или регистрации - отклоняем до хеширования пароля"""
+        if request.path.startswith('/api/'):
+            response, status = error_response('Too many attempts, please retry later', 429)
+        else:
+            response = make_response(render_template('error.html', error_code=429,
+                                                     error_message='Слишком много попыток, попробуйте позже'), 429)
+        response.status_code = 429
+        response.headers['Retry-After'] = str(e.retry_after)
+        return response
+
+    @app.errorhandler(StatementTimeoutError)
+    def statement_timeout(e):
+        """SQL запрос превысил допустимое время выполнения"""
+        if request.path.startswith('/api/'):
+            response, status = error_response('Request took too long, please retry later', 503)
+        else:
+            response = make_response(render_template('error.html', error_code=503,
+                                                     error_message='Запрос выполнялся слишком долго, попробуйте позже'), 503)
+        response.status_code = 503
+        return response
+
+
+def _register_commands(app):
+    """CLI команды (запуск: flask --app app <команда>)"""
+    import click
+    from backend.models import db
+    from backend.services.stats_service import rebuild_test_stats
+    from backend.utils.api_docs import build_api_spec, write_api_spec
+    from backend.utils.db_routing import sync_sqlite_replica, REPLICA_BIND
+    from database.init_db import init_database
+
+    @app.cli.command('init-db')
+    def init_db_command():
+        """Создает таблицы и индексы, которых еще нет в базе данных (повторный запуск безопасен)"""
+        init_database(app)
+        # Локальная копия-реплика должна получить созданную схему
+        replica_uri = app.config['SQLALCHEMY_BINDS'].get(REPLICA_BIND)
+        if replica_uri and app.config['READ_REPLICA_SQLITE_COPY']:
+            sync_sqlite_replica(app.config['SQLALCHEMY_DATABASE_URI'], replica_uri)
+        click.echo('База данных инициализирована')
+
+    @app.cli.command('rebuild-test-stats')
+    @click.option('--test-id', type=int, default=None, help='ID теста (по умолчанию - все тесты)')
+    def rebuild_test_stats_command(test_id):
+        """Пересчитывает агрегаты статистики тестов (таблица test_stats) из попыток"""
+        result = rebuild_test_stats(test_id)
+        db.session.commit()
+        count = 1 if test_id is not None else result
+        click.echo(f'Пересчитана статистика тестов: {count}')
+
+    @app.cli.command('build-api-spec')
+    @click.option('--output', default=None, help='Путь к файлу (по умолчанию API_SPEC_PATH)')
+    def build_api_spec_command(output):
+        """Собирает спецификацию OpenAPI из docstring маршрутов и сохраняет в JSON файл"""
+        path = output or app.config['API_SPEC_PATH']
+        spec = build_api_spec(app)
+        write_api_spec(spec, path)
+        click.echo(f'Спецификация API сохранена: {path} (маршрутов: {len(spec.get("paths", {}))})')
+
+    @app.cli.command('sync-replica')
+    def sync_replica_command():
+        """Обновляет локальную копию SQLite, используемую как реплика (READ_REPLICA_SQLITE_COPY)"""
+        replica_uri = app.config['SQLALCHEMY_BINDS'].get(REPLICA_BIND)
+        if not replica_uri or not sync_sqlite_replica(app.config['SQLALCHEMY_DATABASE_URI'], replica_uri):
+            click.echo('Локальная реплика SQLite не настроена')
+            return
+        click.echo('Реплика обновлена')
+
+
+def __getattr__(name):
+    """Ленивый атрибут app (gunicorn app:app) - приложение создается при первом обращении"""
+    if name == 'app':
+        app = globals()['app'] = create_app()
+        return app
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
 
 # Точка входа - запуск сервера
 if __name__ == '__main__':
+    from database.init_db import init_database
+
     debug_mode = os.getenv('FLASK_DEBUG', 'False') == 'True'
     host = os.getenv('FLASK_HOST', '127.0.0.1')
     port = int(os.getenv('FLASK_PORT', 8000))
+    app = create_app()
+    # Локальный запуск создает недостающие таблицы и индексы (как init-db)
+    init_database(app)
     app.run(host=host, port=port, debug=debug_mode)
@@ -3,5 +3,7 @@
 """
 
 from flask_sqlalchemy import SQLAlchemy
+from backend.utils.db_routing import RoutingSession
 
-db = SQLAlchemy()
+# Сессия с маршрутизацией чтения на реплику (см. backend/utils/db_routing.py)
+db = SQLAlchemy(session_options={'class_': RoutingSession})
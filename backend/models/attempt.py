@@ -9,6 +9,12 @@ class TestAttempt(db.Model):
     """Попытка прохождения теста конкретным пользователем"""
 
     __tablename__ = 'test_attempts'
+    __table_args__ = (
+        # Составной индекс для статистики пользователя (фильтр по user_id и завершенности)
+        db.Index('ix_test_attempts_user_finished', 'user_id', 'finished_at'),
+        # Составной индекс для списка попыток теста (сортировка по started_at, курсорная пагинация)
+        db.Index('ix_test_attempts_test_started', 'test_id', 'started_at', 'id'),
+    )
 
     # Основные поля
     id = db.Column(db.Integer, primary_key=True)
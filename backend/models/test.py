@@ -3,12 +3,20 @@
 """
 
 from datetime import datetime
+from sqlalchemy import select, func
+from sqlalchemy.orm import column_property, undefer
 from backend.models import db
+from backend.models.question import Question
+from backend.models.attempt import TestAttempt
 
 class Test(db.Model):
     """Тест, созданный преподавателем"""
 
     __tablename__ = 'tests'
+    # Составной индекс для курсорной пагинации списка тестов пользователя
+    __table_args__ = (
+        db.Index('ix_tests_user_created', 'user_id', 'created_at', 'id'),
+    )
 
     # Основные поля
     id = db.Column(db.Integer, primary_key=True)
@@ -24,6 +32,29 @@ class Test(db.Model):
     # При удалении теста удаляются все его вопросы и попытки прохождения
     questions = db.relationship('Question', backref='test', lazy=True, cascade='all, delete-orphan')
     attempts = db.relationship('TestAttempt', backref='test', lazy=True, cascade='all, delete-orphan')
+    stats = db.relationship('TestStats', uselist=False, lazy=True, cascade='all, delete-orphan')
+
+    # Количество вопросов и попыток - подзапросы COUNT вместо загрузки всех связанных строк
+    # deferred: не вычисляются при каждом Test.query.get, в списках подгружаются через undefer()
+    questions_count = column_property(
+        select(func.count(Question.id))
+        .where(Question.test_id == id)
+        .correlate_except(Question)
+        .scalar_subquery(),
+        deferred=True
+    )
+    attempts_count = column_property(
+        select(func.count(TestAttempt.id))
+        .where(TestAttempt.test_id == id)
+        .correlate_except(TestAttempt)
+        .scalar_subquery(),
+        deferred=True
+    )
+
+    @classmethod
+    def with_counts(cls):
+        """Опции запроса для загрузки количества вопросов и попыток вместе с тестами"""
+        return (undefer(cls.questions_count), undefer(cls.attempts_count))
 
     def to_dict(self, include_questions=False):
         """Преобразует тест в словарь для JSON ответов"""
@@ -36,10 +67,30 @@ class Test(db.Model):
             'link_token': self.link_token,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None,
-            'attempts_count': len(self.attempts)
+            'attempts_count': self.attempts_count
         }
         # Опционально включаем вопросы (для детального просмотра теста)
         if include_questions:
             # Сортируем вопросы по order_index для правильного порядка отображения
             result['questions'] = [q.to_dict() for q in sorted(self.questions, key=lambda x: x.order_index)]
         return result
+
+    def to_public_dict(self):
+        """
+        Данные теста для прохождения студентом по ссылке
+
+        Те же поля, что и у to_dict(include_questions=True), кроме правильных ответов
+        и attempts_count (меняется с каждой попыткой, считается отдельным запросом),
+        поэтому результат можно кэшировать до изменения теста.
+        """
+        return {
+            'id': self.id,
+            'title': self.title,
+            'description': self.description,
+            'user_id': self.user_id,
+            'is_published': self.is_published,
+            'link_token': self.link_token,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
+            'questions': [q.to_dict() for q in sorted(self.questions, key=lambda x: (x.order_index or 0, x.id))]
+        }
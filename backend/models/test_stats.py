@@ -0,0 +1,45 @@
+"""
+Модель агрегированной статистики теста - поддерживается инкрементально при завершении попыток
+"""
+
+from datetime import datetime
+from backend.models import db
+
+class TestStats(db.Model):
+    """Сводная статистика по завершенным попыткам теста (одна строка на тест)"""
+
+    __tablename__ = 'test_stats'
+
+    # Основные поля
+    test_id = db.Column(db.Integer, db.ForeignKey('tests.id'), primary_key=True)
+    attempts_count = db.Column(db.Integer, nullable=False, default=0)  # Количество завершенных попыток
+    score_sum = db.Column(db.Float, nullable=False, default=0)  # Сумма результатов (для среднего)
+    score_sq_sum = db.Column(db.Float, nullable=False, default=0)  # Сумма квадратов (для дисперсии)
+    min_score = db.Column(db.Float, nullable=True)  # Худший результат (null если попыток нет)
+    max_score = db.Column(db.Float, nullable=True)  # Лучший результат (null если попыток нет)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def to_dict(self):
+        """Преобразует агрегат в словарь статистики для JSON"""
+        count = self.attempts_count or 0
+        if count == 0:
+            return {
+                'test_id': self.test_id,
+                'total_attempts': 0,
+                'average_score': 0,
+                'highest_score': 0,
+                'lowest_score': 0,
+                'score_stddev': 0
+            }
+
+        average = self.score_sum / count
+        # Дисперсия через сумму квадратов; max(0, ...) защищает от ошибок округления
+        variance = max(self.score_sq_sum / count - average * average, 0)
+        return {
+            'test_id': self.test_id,
+            'total_attempts': count,
+            'average_score': round(average, 2),
+            'highest_score': self.max_score,
+            'lowest_score': self.min_score,
+            'score_stddev': round(variance ** 0.5, 2)
+        }
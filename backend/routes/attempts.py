@@ -4,10 +4,12 @@ API маршруты для прохождения тестов
 
 from flask import Blueprint, request
 from backend.services.attempt_service import (
-    start_attempt, submit_answer, finish_attempt, get_attempt_results
+    start_attempt, submit_answer, submit_answers, finish_attempt, get_attempt_results,
+    get_attempt_results_version
 )
-from backend.utils.responses import success_response, error_response
+from backend.utils.responses import success_response, error_response, conditional_response
 from backend.utils.jwt_utils import require_auth
+from backend.utils.sql_instrumentation import statement_budget
 
 attempts_bp = Blueprint('attempts', __name__, url_prefix='/api')
 
@@ -91,6 +93,65 @@ def submit(user_id, attempt_id):
     except ValueError as e:
         return error_response(str(e), 400)
 
+@attempts_bp.route('/attempts/<int:attempt_id>/answers/batch', methods=['POST'])
+@require_auth
+def submit_batch(user_id, attempt_id):
+    """
+    Отправить ответы на несколько вопросов одним запросом
+    ---
+    tags:
+      - Attempts
+    security:
+      - Bearer: []
+    parameters:
+      - name: attempt_id
+        in: path
+        type: integer
+        required: true
+      - name: body
+        in: body
+        required: true
+        schema:
+          type: object
+          required:
+            - answers
+          properties:
+            answers:
+              type: array
+              items:
+                type: object
+                required:
+                  - question_id
+                  - answer
+                properties:
+                  question_id:
+                    type: integer
+                    example: 1
+                  answer:
+                    oneOf:
+                      - type: string
+                      - type: array
+                    example: "Ответ на вопрос"
+    responses:
+      200:
+        description: Результат сохранения по каждому ответу
+      400:
+        description: Некорректные данные
+    """
+    data = request.json
+    if not data or not isinstance(data.get('answers'), list) or not data['answers']:
+        return error_response('answers must be a non-empty list', 400)
+
+    items = data['answers']
+    if not all(isinstance(item, dict) and 'question_id' in item and 'answer' in item for item in items):
+        return error_response('Each answer must contain question_id and answer', 400)
+
+    try:
+        result = submit_answers(attempt_id, items, user_id)
+        return success_response(result)
+    except ValueError as e:
+        return error_response(str(e), 400)
+
 @attempts_bp.route('/attempts/<int:attempt_id>/finish', methods=['POST'])
 @require_auth
 def finish(user_id, attempt_id):
@@ -120,6 +181,8 @@ def finish(user_id, attempt_id):
 
 @attempts_bp.route('/attempts/<int:attempt_id>/results', methods=['GET'])
 @require_auth
+@conditional_response(lambda user_id, attempt_id: get_attempt_results_version(attempt_id, user_id))
+@statement_budget(6)
 def results(user_id, attempt_id):
     """
     Получить результаты попытки
@@ -5,12 +5,14 @@ API маршруты для аутентификации и управления
 from flask import Blueprint, request
 from backend.services.auth_service import register_user, login_user, get_user_profile, update_user_profile
 from backend.utils.responses import success_response, error_response
-from backend.utils.jwt_utils import require_auth
+from backend.utils.jwt_utils import require_auth, get_request_token, revoke_token
+from backend.utils.rate_limit import auth_rate_limit
 from backend.utils.validation import validate_email, validate_password
 
 auth_bp = Blueprint('auth', __name__, url_prefix='/api/auth')
 
 @auth_bp.route('/register', methods=['POST'])
+@auth_rate_limit
 def register():
     """
     Регистрация нового пользователя
@@ -42,6 +44,8 @@ def register():
         description: Пользователь зарегистрирован
       400:
         description: Некорректные данные
+      429:
+        description: Слишком много попыток (см. заголовок Retry-After)
     """
     data = request.json
     if not data or not all(k in data for k in ('name', 'email', 'password')):
@@ -64,6 +68,7 @@ def register():
         return error_response(str(e), 400)
 
 @auth_bp.route('/login', methods=['POST'])
+@auth_rate_limit
 def login():
     """
     Вход пользователя
@@ -91,6 +96,8 @@ def login():
         description: Вход выполнен
       401:
         description: Неверные данные
+      429:
+        description: Слишком много попыток (см. заголовок Retry-After)
     """
     data = request.json
     if not data or not all(k in data for k in ('email', 'password')):
@@ -102,6 +109,25 @@ def login():
     except ValueError as e:
         return error_response(str(e), 401)
 
+@auth_bp.route('/logout', methods=['POST'])
+@require_auth
+def logout(user_id):
+    """
+    Выход пользователя - отзыв текущего токена
+    ---
+    tags:
+      - Auth
+    security:
+      - Bearer: []
+    responses:
+      200:
+        description: Токен отозван
+      401:
+        description: Требуется аутентификация
+    """
+    revoke_token(get_request_token())
+    return success_response({'message': 'Logged out'})
+
 @auth_bp.route('/profile', methods=['GET'])
 @require_auth
 def get_profile(user_id):
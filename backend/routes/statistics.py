@@ -2,17 +2,24 @@
 API маршруты для получения статистики
 """
 
-from flask import Blueprint, request
+from datetime import datetime
+from flask import Blueprint, Response, request, stream_with_context
 from backend.services.stats_service import (
-    get_test_statistics, get_test_attempts, get_user_statistics
+    get_test_statistics, get_test_attempts, get_test_attempts_after, get_user_statistics,
+    get_test_statistics_version, get_test_attempts_version, export_test_attempts
 )
-from backend.utils.responses import success_response, error_response
+from backend.utils.responses import success_response, error_response, conditional_response
 from backend.utils.jwt_utils import require_auth
+from backend.utils.pagination import decode_cursor
+from backend.utils.export import csv_chunks, ndjson_chunks, gzip_chunks, parse_since
+from backend.utils.sql_instrumentation import statement_budget
 
 statistics_bp = Blueprint('statistics', __name__, url_prefix='/api')
 
 @statistics_bp.route('/tests/<int:test_id>/statistics', methods=['GET'])
 @require_auth
+@conditional_response(lambda user_id, test_id: get_test_statistics_version(test_id, user_id))
+@statement_budget(6)
 def test_stats(user_id, test_id):
     """
     Получить статистику теста
@@ -40,6 +47,8 @@ def test_stats(user_id, test_id):
 
 @statistics_bp.route('/tests/<int:test_id>/attempts', methods=['GET'])
 @require_auth
+@conditional_response(lambda user_id, test_id: get_test_attempts_version(test_id, user_id))
+@statement_budget(6)
 def test_attempts(user_id, test_id):
     """
     Получить попытки прохождения теста
@@ -61,6 +70,10 @@ def test_attempts(user_id, test_id):
         in: query
         type: integer
         default: 20
+      - name: cursor
+        in: query
+        type: string
+        description: next_cursor предыдущей страницы (пустое значение - первая страница курсорного режима)
     responses:
       200:
         description: Список попыток
@@ -76,12 +89,107 @@ def test_attempts(user_id, test_id):
     if limit < 1 or limit > 100:
         return error_response('limit должен быть от 1 до 100', 400)
 
+    # Курсор (next_cursor предыдущей страницы); пустое значение - первая страница
+    cursor = request.args.get('cursor')
+    position = None
+    if cursor:
+        try:
+            position = decode_cursor(cursor)
+        except ValueError as e:
+            return error_response(str(e), 400)
+
     try:
+        # Курсорный режим: {'items': [...], 'next_cursor': ...}
+        if cursor is not None:
+            return success_response(get_test_attempts_after(test_id, user_id, position, limit))
+
         attempts = get_test_attempts(test_id, user_id, skip, limit)
         return success_response(attempts)
     except ValueError as e:
         return error_response(str(e), 404)
 
+EXPORT_FORMATS = {
+    'csv': (csv_chunks, 'text/csv; charset=utf-8'),
+    'ndjson': (ndjson_chunks, 'application/x-ndjson; charset=utf-8'),
+}
+
+@statistics_bp.route('/tests/<int:test_id>/export', methods=['GET'])
+@require_auth
+def export_attempts(user_id, test_id):
+    """
+    Выгрузить все попытки теста с ответами (потоковый ответ)
+    ---
+    tags:
+      - Statistics
+    security:
+      - Bearer: []
+    produces:
+      - text/csv
+      - application/x-ndjson
+    parameters:
+      - name: test_id
+        in: path
+        type: integer
+        required: true
+      - name: format
+        in: query
+        type: string
+        enum: [csv, ndjson]
+        default: csv
+        description: csv - строка на каждый ответ, ndjson - попытка с вложенными ответами на строку
+      - name: since
+        in: query
+        type: string
+        format: date-time
+        description: Только попытки, начатые или завершенные не раньше (UTC, ISO 8601) - для инкрементальной выгрузки
+      - name: Accept-Encoding
+        in: header
+        type: string
+        description: gzip - ответ сжимается (Content-Encoding gzip)
+    responses:
+      200:
+        description: Попытки теста; заголовок X-Export-Timestamp - значение since для следующей выгрузки
+      400:
+        description: Неверный format или since
+      404:
+        description: Тест не найден
+    """
+    export_format = request.args.get('format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        return error_response('format должен быть csv или ndjson', 400)
+
+    since = request.args.get('since')
+    if since:
+        try:
+            since = parse_since(since)
+        except ValueError as e:
+            return error_response(str(e), 400)
+    else:
+        since = None
+
+    # Момент начала выгрузки - since для следующей инкрементальной выгрузки
+    exported_at = datetime.utcnow()
+    try:
+        attempts = export_test_attempts(test_id, user_id, since)
+    except ValueError as e:
+        return error_response(str(e), 404)
+
+    formatter, mimetype = EXPORT_FORMATS[export_format]
+    body = formatter(attempts)
+    use_gzip = request.accept_encodings['gzip'] > 0
+    if use_gzip:
+        body = gzip_chunks(body)
+
+    # Чтение из БД продолжается во время отправки - нужен контекст запроса
+    response = Response(stream_with_context(body), mimetype=mimetype)
+    if use_gzip:
+        response.headers['Content-Encoding'] = 'gzip'
+    response.vary.add('Accept-Encoding')
+    response.headers['Content-Disposition'] = f'attachment; filename=test-{test_id}-attempts.{export_format}'
+    response.headers['X-Export-Timestamp'] = exported_at.isoformat() + 'Z'
+    response.cache_control.no_store = True
+    return response
+
 @statistics_bp.route('/statistics/user', methods=['GET'])
 @require_auth
 def user_stats(user_id):
@@ -4,16 +4,19 @@ API маршруты для управления тестами
 
 from flask import Blueprint, request
 from backend.services.test_service import (
-    create_test, get_user_tests, get_test, update_test,
-    delete_test, publish_test, get_test_by_link
+    create_test, get_user_tests, get_user_tests_after, get_test, update_test,
+    delete_test, publish_test, get_test_by_link,
+    get_user_tests_version, get_test_version, get_test_by_link_version
 )
-from backend.utils.responses import success_response, error_response
+from backend.utils.responses import success_response, error_response, conditional_response
 from backend.utils.jwt_utils import require_auth
+from backend.utils.pagination import decode_cursor
 
 tests_bp = Blueprint('tests', __name__, url_prefix='/api/tests')
 
 @tests_bp.route('', methods=['GET'])
 @require_auth
+@conditional_response(lambda user_id: get_user_tests_version(user_id))
 def list_tests(user_id):
     """
     Получить список тестов пользователя
@@ -31,6 +34,10 @@ def list_tests(user_id):
         in: query
         type: integer
         default: 20
+      - name: cursor
+        in: query
+        type: string
+        description: next_cursor предыдущей страницы (пустое значение - первая страница курсорного режима)
     responses:
       200:
         description: Список тестов
@@ -44,7 +51,20 @@ def list_tests(user_id):
     if limit < 1 or limit > 100:
         return error_response('limit должен быть от 1 до 100', 400)
 
+    # Курсор (next_cursor предыдущей страницы); пустое значение - первая страница
+    cursor = request.args.get('cursor')
+    position = None
+    if cursor:
+        try:
+            position = decode_cursor(cursor)
+        except ValueError as e:
+            return error_response(str(e), 400)
+
     try:
+        # Курсорный режим: {'items': [...], 'next_cursor': ...}
+        if cursor is not None:
+            return success_response(get_user_tests_after(user_id, position, limit))
+
         tests = get_user_tests(user_id, skip, limit)
         return success_response(tests)
     except Exception as e:
@@ -52,6 +72,7 @@ def list_tests(user_id):
 
 @tests_bp.route('/<int:test_id>', methods=['GET'])
 @require_auth
+@conditional_response(lambda user_id, test_id: get_test_version(test_id, user_id))
 def get_test_detail(user_id, test_id):
     """
     Получить тест по ID
@@ -213,6 +234,7 @@ def publish(user_id, test_id):
         return error_response(str(e), 404)
 
 @tests_bp.route('/link/<string:link_token>', methods=['GET'])
+@conditional_response(lambda link_token: get_test_by_link_version(link_token), public=True)
 def get_by_link(link_token):
     """
     Получить тест по ссылке
@@ -226,7 +248,7 @@ def get_by_link(link_token):
         required: true
     responses:
       200:
-        description: Данные теста
+        description: Данные теста с вопросами (без правильных ответов и без attempts_count)
       404:
         description: Тест не найден
     """
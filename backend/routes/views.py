@@ -7,7 +7,7 @@ import json
 import secrets
 from functools import wraps
 from datetime import datetime
-from flask import Blueprint, render_template, request, redirect, url_for, flash, session
+from flask import Blueprint, render_template, request, redirect, url_for, flash, session, g
 from sqlalchemy.exc import IntegrityError, OperationalError
 from backend.models import db
 from backend.models.user import User
@@ -15,6 +15,15 @@ from backend.models.test import Test
 from backend.models.question import Question
 from backend.models.attempt import TestAttempt
 from backend.models.answer import Answer
+from backend.services.grading_service import invalidate_answer_key, grade_attempt, calculate_percent
+from backend.services.test_service import get_test_by_link, invalidate_test_payload
+from backend.services.stats_service import get_test_stats, get_test_attempts_page, record_attempt_score
+from backend.services.auth_service import rehash_password_if_needed
+from backend.utils.jwt_utils import revoke_user_tokens
+from backend.utils.password import PasswordHashingBusyError
+from backend.utils.db_routing import read_replica
+from backend.utils.rate_limit import auth_rate_limit
+from backend.utils.sql_instrumentation import statement_budget
 from backend.utils.validation import validate_password
 
 views_bp = Blueprint('views', __name__)
@@ -29,6 +38,8 @@ def login_required(f):
         if 'user_id' not in session:
             flash('Пожалуйста, войдите в систему', 'warning')
             return redirect(url_for('views.login'))
+        # Текущий пользователь запроса (read-your-writes при чтении с реплики)
+        g.user_id = session['user_id']
         return f(*args, **kwargs)
     return decorated_function
 
@@ -38,6 +49,7 @@ def index():
     return render_template('index.html')
 
 @views_bp.route('/login', methods=['GET', 'POST'])
+@auth_rate_limit
 def login():
     """Страница входа"""
     if request.method == 'POST':
@@ -47,6 +59,7 @@ def login():
         user = User.query.filter_by(email=email).first()
 
         if user and user.check_password(password):
+            rehash_password_if_needed(user, password)
             session['user_id'] = user.id
             session['name'] = user.name
             flash('Вы успешно вошли в систему', 'success')
@@ -57,6 +70,7 @@ def login():
     return render_template('login.html')
 
 @views_bp.route('/register', methods=['GET', 'POST'])
+@auth_rate_limit
 def register():
     """Страница регистрации"""
     if request.method == 'POST':
@@ -98,6 +112,9 @@ def register():
             db.session.rollback()
             flash('Ошибка при создании пользователя. Попробуйте другой email или имя.', 'error')
             return render_template('register.html')
+        except PasswordHashingBusyError:
+            db.session.rollback()
+            raise
         except Exception as e:
             db.session.rollback()
             flash('Произошла ошибка при регистрации', 'error')
@@ -107,6 +124,8 @@ def register():
 
 @views_bp.route('/dashboard')
 @login_required
+@read_replica
+@statement_budget(4)
 def dashboard():
     """Дашборд пользователя"""
     user = User.query.get(session['user_id'])
@@ -114,20 +133,16 @@ def dashboard():
         flash('Пользователь не найден', 'error')
         return redirect(url_for('views.login'))
 
-    tests = Test.query.filter_by(user_id=user.id).all()
+    # Количество вопросов и попыток загружаются тем же запросом (без обхода связей)
+    tests = Test.query.filter_by(user_id=user.id).options(*Test.with_counts()).all()
 
     # Подсчет статистики
     stats = {
         'total': len(tests),
         'published': len([t for t in tests if t.is_published]),
-        'attempts': sum([len(t.attempts) for t in tests])
+        'attempts': sum(t.attempts_count for t in tests)
     }
 
-    # Добавление дополнительной информации к тестам
-    for test in tests:
-        test.questions_count = len(test.questions)
-        test.attempts_count = len(test.attempts)
-
     return render_template('dashboard.html', user=user, tests=tests, stats=stats, active_page='dashboard')
 
 @views_bp.route('/create-test', methods=['GET', 'POST'])
@@ -248,8 +263,13 @@ def edit_test(test_id):
         # Удаление теста
         if action == 'delete':
             try:
+                question_ids = [q.id for q in test.questions]
+                link_token = test.link_token
                 db.session.delete(test)
                 db.session.commit()
+                for question_id in question_ids:
+                    invalidate_answer_key(question_id)
+                invalidate_test_payload(link_token)
                 flash('Тест успешно удалён', 'success')
                 return redirect(url_for('views.dashboard'))
             except Exception as e:
@@ -271,12 +291,14 @@ def edit_test(test_id):
             test.title = title
             test.description = description
             test.is_published = is_published
+            # Вопросы пересоздаются - версия теста меняется даже без изменения полей
+            test.updated_at = datetime.utcnow()
 
             if is_published and not test.link_token:
                 test.link_token = secrets.token_urlsafe(32)
 
             # Удалить все старые вопросы
-
+            old_question_ids = [q.id for q in test.questions]
             for question in test.questions:
                 db.session.delete(question)
 
@@ -321,6 +343,10 @@ def edit_test(test_id):
                 db.session.add(question)
 
             db.session.commit()
+            # Старые вопросы удалены - их скомпилированные ключи больше не нужны
+            for question_id in old_question_ids:
+                invalidate_answer_key(question_id)
+            invalidate_test_payload(test.link_token)
             flash('Тест успешно обновлён' if is_published else 'Черновик сохранён', 'success')
             return redirect(url_for('views.dashboard'))
 
@@ -333,6 +359,8 @@ def edit_test(test_id):
 
 @views_bp.route('/statistics/<int:test_id>')
 @login_required
+@read_replica
+@statement_budget(8)
 def statistics(test_id):
     """Страница статистики теста"""
     user = User.query.get(session['user_id'])
@@ -346,7 +374,23 @@ def statistics(test_id):
         flash('У вас нет прав для просмотра статистики этого теста', 'error')
         return redirect(url_for('views.dashboard'))
 
-    return render_template('statistics.html', user=user, test=test)
+    # Сводка берется из агрегата test_stats, а не вычисляется по всем попыткам
+    stats = get_test_stats(test.id).to_dict()
+    questions_count = Question.query.filter_by(test_id=test.id).count()
+
+    # Таблица попыток - постранично, с сортировкой на стороне БД
+    attempts_page = get_test_attempts_page(
+        test.id,
+        page=request.args.get('page', 1, type=int),
+        per_page=min(max(request.args.get('per_page', 20, type=int), 1), 100),
+        sort=request.args.get('sort', 'date'),
+        order=request.args.get('order', 'desc'),
+        total=stats['total_attempts']
+    )
+
+    return render_template('statistics.html', user=user, test=test,
+                         stats=stats, questions_count=questions_count,
+                         attempts_page=attempts_page)
 
 @views_bp.route('/settings', methods=['GET', 'POST'])
 @login_required
@@ -378,7 +422,12 @@ def settings():
                     else:
                         user.set_password(new_password)
                         db.session.commit()
+                        # Токены API, выданные до смены пароля, больше недействительны
+                        revoke_user_tokens(user.id)
                         flash('Пароль успешно изменён', 'success')
+                except PasswordHashingBusyError:
+                    db.session.rollback()
+                    raise
                 except Exception as e:
                     db.session.rollback()
                     flash('Ошибка при изменении пароля', 'error')
@@ -411,8 +460,10 @@ def settings():
 @views_bp.route('/take-test/<string:link_token>', methods=['GET', 'POST'])
 def take_test(link_token):
     """Страница прохождения теста"""
-    test = Test.query.filter_by(link_token=link_token).first()
-    if not test or not test.is_published:
+    # Данные для отображения берутся из кэша опубликованных тестов (без правильных ответов)
+    try:
+        test_data = get_test_by_link(link_token)
+    except ValueError:
         flash('Тест не найден или не опубликован', 'error')
         return redirect(url_for('views.index'))
 
@@ -423,6 +474,8 @@ def take_test(link_token):
             return redirect(url_for('views.login'))
 
         try:
+            test = Test.query.get(test_data['id'])
+
             # Создаем запись о попытке прохождения теста
             attempt = TestAttempt(
                 test_id=test.id,
@@ -431,63 +484,43 @@ def take_test(link_token):
             db.session.add(attempt)
             db.session.flush()  # Получаем attempt.id для связи с ответами
 
-            # Обрабатываем каждый вопрос и подсчитываем правильные ответы
-            correct_count = 0
-            total_questions = len(test.questions)
-
-            for question in test.questions:
-                # Получаем ответ пользователя из формы (поле называется question_{id})
+            # Собираем ответы пользователя из формы (поле называется question_{id})
+            questions = test.questions
+            submitted = {}
+            stored = {}
+            for question in questions:
                 answer_key = f'question_{question.id}'
-                user_answer = request.form.get(answer_key)
 
                 # Для множественного выбора (checkboxes) нужен getlist
                 if question.question_type == 'multiple':
-                    user_answer = request.form.getlist(answer_key)
-                    user_answer = json.dumps([int(a) for a in user_answer]) if user_answer else ''
-                elif question.question_type == 'single':
-                    # Для single типа сохраняем как число
-                    user_answer = user_answer if user_answer else ''
-
-                # Сохраняем ответ в БД
-                answer = Answer(
+                    selected = [int(a) for a in request.form.getlist(answer_key)]
+                    stored[question.id] = json.dumps(selected) if selected else ''
+                    if selected:
+                        submitted[question.id] = selected
+                else:
+                    # single сохраняем как число в строке, text - как есть
+                    user_answer = request.form.get(answer_key) or ''
+                    stored[question.id] = user_answer
+                    if user_answer:
+                        submitted[question.id] = user_answer
+
+            # Проверяем всю попытку за один проход (тот же движок, что и в API)
+            grading = grade_attempt(questions, submitted)
+
+            # Сохраняем ответы в БД вместе с результатом проверки
+            for question in questions:
+                db.session.add(Answer(
                     attempt_id=attempt.id,
                     question_id=question.id,
-                    user_answer=user_answer
-                )
-                db.session.add(answer)
-
-                # Проверяем правильность ответа
-                if question.correct_answer:
-                    try:
-                        correct = json.loads(question.correct_answer)
-                        # Проверка для множественного выбора (порядок не важен, поэтому sorted)
-                        if question.question_type == 'multiple':
-                            user_ans = json.loads(user_answer) if user_answer else []
-                            if isinstance(correct, list) and isinstance(user_ans, list):
-                                if sorted(user_ans) == sorted(correct):
-                                    correct_count += 1
-                        # Проверка для одиночного выбора
-                        elif question.question_type == 'single':
-                            if user_answer:
-                                user_ans_int = int(user_answer)
-                                # correct может быть списком [0] или числом 0
-                                if isinstance(correct, list):
-                                    if len(correct) > 0 and user_ans_int == correct[0]:
-                                        correct_count += 1
-                                else:
-                                    if user_ans_int == correct:
-                                        correct_count += 1
-                        # Проверка для текстового ответа (без учета регистра)
-                        else:  # text
-                            if user_answer and user_answer.strip().lower() == str(correct).lower():
-                                correct_count += 1
-                    except:
-                        pass  # Игнорируем ошибки парсинга
+                    user_answer=stored[question.id],
+                    is_correct=grading['results'][question.id]
+                ))
 
             # Подсчитываем итоговый процент правильных ответов
-            attempt.score = int((correct_count / total_questions) * 100) if total_questions > 0 else 0
-            attempt.completed = True
+            attempt.score = calculate_percent(grading['correct_count'], grading['total'])
             attempt.finished_at = datetime.utcnow()  # Фиксируем время завершения
+            # Агрегат статистики теста обновляется в той же транзакции
+            record_attempt_score(test.id, attempt.score)
 
             db.session.commit()
 
@@ -497,9 +530,9 @@ def take_test(link_token):
         except Exception as e:
             db.session.rollback()
             flash(f'Ошибка при отправке теста: {str(e)}', 'error')
-            return render_template('take_test.html', test=test)
+            return render_template('take_test.html', test=test_data)
 
-    return render_template('take_test.html', test=test)
+    return render_template('take_test.html', test=test_data)
 
 @views_bp.route('/test-result/<int:attempt_id>')
 def test_result(attempt_id):
@@ -516,9 +549,9 @@ def test_result(attempt_id):
         flash('Войдите в систему для просмотра результатов', 'warning')
         return redirect(url_for('views.login'))
 
-    # Подсчет правильных ответов
-    total_questions = len(test.questions)
-    correct_count = int((attempt.score * total_questions) / 100)
+    # Подсчет правильных ответов - по флагам, сохраненным при проверке попытки
+    total_questions = Question.query.filter_by(test_id=test.id).count()
+    correct_count = Answer.query.filter_by(attempt_id=attempt.id, is_correct=True).count()
 
     return render_template('test_result.html',
                          attempt=attempt,
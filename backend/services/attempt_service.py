@@ -4,12 +4,18 @@
 
 import json
 from datetime import datetime
+from sqlalchemy import func
 from sqlalchemy.exc import IntegrityError
 from backend.models import db
 from backend.models.test import Test
 from backend.models.question import Question
 from backend.models.attempt import TestAttempt
 from backend.models.answer import Answer
+from backend.services.stats_service import record_attempt_score
+from backend.services.grading_service import (
+    get_answer_key, match_answer, grade_attempt, calculate_percent
+)
+
 def start_attempt(test_id, user_id):
     """Создание новой попытки прохождения теста"""
     test = Test.query.get(test_id)
@@ -71,61 +77,90 @@ def submit_answer(attempt_id, question_id, answer_data, user_id):
         db.session.rollback()
         raise ValueError(f'Error submitting answer: {str(e)}')
 
-def check_answer(question, user_answer):
-    """Проверка правильности ответа в зависимости от типа вопроса"""
-    if not question.correct_answer:
-        return None
+def submit_answers(attempt_id, items, user_id):
+    """
+    Пакетное сохранение ответов на несколько вопросов одной транзакцией
 
-    try:
-        correct = json.loads(question.correct_answer)
-    except (json.JSONDecodeError, TypeError):
-        return None
+    Args:
+        attempt_id: ID попытки
+        items: Список словарей {'question_id': ..., 'answer': ...}
+        user_id: ID пользователя, отправившего ответы
 
-    # Один правильный вариант (radio button) - сравниваем числа
-    if question.question_type == 'single':
-        # user_answer может быть строкой "0", числом 0, или JSON строкой
-        # correct может быть списком [0] или числом 0
-        try:
-            # Пытаемся распарсить, если это JSON строка
-            if isinstance(user_answer, str):
-                try:
-                    user_ans_parsed = json.loads(user_answer)
-                    user_ans_int = int(user_ans_parsed)
-                except (json.JSONDecodeError, ValueError, TypeError):
-                    # Если не JSON, пытаемся преобразовать напрямую
-                    user_ans_int = int(user_answer)
+    Returns:
+        list: Результат по каждому элементу в исходном порядке
+            {'question_id': ..., 'saved': True} или {'question_id': ..., 'saved': False, 'error': '...'}
+    """
+    # Проверки попытки выполняются один раз на весь пакет
+    attempt = TestAttempt.query.get(attempt_id)
+    if not attempt:
+        raise ValueError('Attempt not found')
+    if attempt.user_id != user_id:
+        raise ValueError('Access denied')
+    if attempt.finished_at:
+        raise ValueError('Attempt already finished')
+
+    question_ids = {item['question_id'] for item in items if isinstance(item.get('question_id'), int)}
+
+    # Все вопросы пакета одним запросом (только вопросы этого теста)
+    questions = {}
+    if question_ids:
+        questions = {q.id: q for q in Question.query.filter(
+            Question.id.in_(question_ids),
+            Question.test_id == attempt.test_id
+        ).all()}
+
+    # Уже существующие ответы - тоже одним запросом (для обновления)
+    existing_answers = {}
+    if questions:
+        existing_answers = {a.question_id: a for a in Answer.query.filter(
+            Answer.attempt_id == attempt_id,
+            Answer.question_id.in_(questions.keys())
+        ).all()}
+
+    results = []
+    try:
+        for item in items:
+            question_id = item.get('question_id')
+            question = questions.get(question_id) if isinstance(question_id, int) else None
+            if not question:
+                results.append({'question_id': question_id, 'saved': False, 'error': 'Question not found'})
+                continue
+
+            answer_data = item['answer']
+            user_answer = json.dumps(answer_data)
+            is_correct = check_answer(question, answer_data)
+
+            answer = existing_answers.get(question_id)
+            if answer:
+                # Обновляем существующий ответ (в том числе повтор вопроса в пакете)
+                answer.user_answer = user_answer
+                answer.is_correct = is_correct
             else:
-                user_ans_int = int(user_answer)
-        except (ValueError, TypeError):
-            return False
-        
-        if isinstance(correct, list):
-            if len(correct) > 0:
-                return user_ans_int == correct[0]
-            return False
-        else:
-            return user_ans_int == correct
-    # Несколько правильных вариантов (checkboxes) - сравниваем отсортированные списки
-    elif question.question_type == 'multiple':
-        # user_answer может быть списком или JSON строкой
-        if isinstance(user_answer, str):
-            try:
-                user_ans = json.loads(user_answer)
-            except (json.JSONDecodeError, TypeError):
-                return False
-        else:
-            user_ans = user_answer
-            
-        if not isinstance(user_ans, list):
-            return False
-        if not isinstance(correct, list):
-            return None
-        return sorted(user_ans) == sorted(correct)
-    # Текстовый ответ - сравниваем строки без учета регистра и пробелов
-    elif question.question_type == 'text':
-        return str(user_answer).strip().lower() == str(correct).strip().lower()
-
-    return None
+                answer = Answer(
+                    attempt_id=attempt_id,
+                    question_id=question_id,
+                    user_answer=user_answer,
+                    is_correct=is_correct
+                )
+                db.session.add(answer)
+                existing_answers[question_id] = answer
+
+            results.append({'question_id': question_id, 'saved': True})
+
+        db.session.commit()
+        return results
+    except IntegrityError:
+        db.session.rollback()
+        raise ValueError('Answer already exists for this question')
+    except Exception as e:
+        db.session.rollback()
+        raise ValueError(f'Error submitting answers: {str(e)}')
+
+def check_answer(question, user_answer):
+    """Проверка правильности ответа в зависимости от типа вопроса"""
+    # Ключ правильного ответа компилируется один раз и берется из кэша
+    key = get_answer_key(question)
+    return match_answer(question.question_type, key, user_answer)
 
 def finish_attempt(attempt_id, user_id):
     """Завершение попытки - подсчет итогового результата"""
@@ -137,10 +172,17 @@ def finish_attempt(attempt_id, user_id):
     if attempt.finished_at:
         raise ValueError('Attempt already finished')
 
+    # Перепроверяем все ответы за один проход (вопрос мог измениться после ответа)
+    grading, answers = _grade_stored_attempt(attempt)
+    for answer in answers:
+        answer.is_correct = grading['results'].get(answer.question_id)
+
     # Подсчитываем процент правильных ответов
-    score = calculate_score(attempt_id)
+    score = calculate_percent(grading['correct_count'], grading['total'])
     attempt.score = score
     attempt.finished_at = datetime.utcnow()  # Фиксируем время завершения
+    # Агрегат статистики теста обновляется в той же транзакции
+    record_attempt_score(attempt.test_id, score)
     db.session.commit()
 
     return {
@@ -154,22 +196,39 @@ def calculate_score(attempt_id):
     if not attempt:
         return 0
 
-    # Получаем все вопросы теста (важно считать от общего количества, а не от отвеченных)
-    test = Test.query.get(attempt.test_id)
-    if not test or not test.questions:
-        return 0
-
-    total_questions = len(test.questions)
-
-    # Получаем ответы пользователя
-    answers = Answer.query.filter_by(attempt_id=attempt_id).all()
-
-    # Считаем только правильные ответы (is_correct=True)
-    # None игнорируем (вопросы без правильного ответа)
-    correct_count = sum(1 for a in answers if a.is_correct is True)
-
+    grading, _ = _grade_stored_attempt(attempt)
     # Результат в процентах, округленный до 2 знаков
-    return round((correct_count / total_questions) * 100, 2)
+    return calculate_percent(grading['correct_count'], grading['total'])
+
+def _grade_stored_attempt(attempt):
+    """Проверка сохраненных ответов попытки - по одному запросу на вопросы и на ответы"""
+    # Важно считать от общего количества вопросов теста, а не от отвеченных
+    questions = Question.query.filter_by(test_id=attempt.test_id).all()
+    answers = Answer.query.filter_by(attempt_id=attempt.id).all()
+
+    decoded = {}
+    for answer in answers:
+        # Пустой ответ равносилен отсутствию ответа
+        if answer.user_answer in (None, ''):
+            continue
+        try:
+            decoded[answer.question_id] = json.loads(answer.user_answer)
+        except (json.JSONDecodeError, TypeError):
+            # HTML форма сохраняет текстовые ответы без JSON кодирования
+            decoded[answer.question_id] = answer.user_answer
+
+    return grade_attempt(questions, decoded), answers
+
+def get_attempt_results_version(attempt_id, user_id):
+    """Версия результатов попытки для ETag - только для завершенных попыток"""
+    row = db.session.query(TestAttempt.user_id, TestAttempt.finished_at, TestAttempt.score)\
+        .filter(TestAttempt.id == attempt_id)\
+        .first()
+    if not row or row.user_id != user_id or not row.finished_at:
+        return None
+    # Ответы могут исчезнуть при удалении вопроса - учитываем их количество
+    answers_count = db.session.query(func.count(Answer.id)).filter(Answer.attempt_id == attempt_id).scalar()
+    return (row.finished_at, row.score, answers_count), None
 
 def get_attempt_results(attempt_id, user_id):
     """Получение результатов попытки с детализацией по ответам"""
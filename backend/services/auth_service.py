@@ -2,13 +2,16 @@
 Сервис аутентификации - регистрация, вход, обновление профиля
 """
 
+import logging
 from sqlalchemy.exc import IntegrityError
 from backend.models import db
 from backend.models.user import User
-from backend.utils.password import hash_password, verify_password
-from backend.utils.jwt_utils import create_token
+from backend.utils.password import hash_password, verify_password, needs_rehash, PasswordHashingBusyError
+from backend.utils.jwt_utils import create_token, revoke_user_tokens
 from backend.utils.validation import validate_email, validate_password
 
+logger = logging.getLogger(__name__)
+
 def register_user(name, email, password):
     """Регистрация нового пользователя с валидацией данных"""
 
@@ -47,6 +50,9 @@ def register_user(name, email, password):
     except IntegrityError:
         db.session.rollback()
         raise ValueError('Email already registered')
+    except PasswordHashingBusyError:
+        db.session.rollback()
+        raise
     except Exception as e:
         db.session.rollback()
         raise ValueError(f'Error creating user: {str(e)}')
@@ -59,9 +65,33 @@ def login_user(email, password):
     if not user or not verify_password(password, user.password_hash):
         raise ValueError('Invalid email or password')
 
+    rehash_password_if_needed(user, password)
+
     token = create_token(user.id)
     return {'token': token, 'user': user.to_dict()}
 
+def rehash_password_if_needed(user, password):
+    """
+    Перехеширование пароля по текущей политике после успешного входа
+
+    Вызывается только после проверки пароля. Ошибка сохранения не мешает входу -
+    хеш обновится при следующем входе.
+    """
+    if not needs_rehash(user.password_hash):
+        return
+    try:
+        password_hash = hash_password(password)
+    except PasswordHashingBusyError:
+        # Пул хеширования занят - вход не задерживаем, в сессии ничего не изменено
+        logger.info('Password rehash for user %s skipped: hashing pool is busy', user.id)
+        return
+    try:
+        user.password_hash = password_hash
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        logger.warning('Password rehash for user %s was not saved', user.id, exc_info=True)
+
 def get_user_profile(user_id):
     """Получение профиля пользователя по ID"""
     user = User.query.get(user_id)
@@ -103,6 +133,9 @@ def update_user_profile(user_id, data):
             user.password_hash = hash_password(data['password'])
 
         db.session.commit()
+        if 'password' in data:
+            # После смены пароля ранее выданные токены недействительны
+            revoke_user_tokens(user_id)
         return user.to_dict()
     except IntegrityError:
         db.session.rollback()
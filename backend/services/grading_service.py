@@ -0,0 +1,196 @@
+"""
+Сервис проверки ответов - компиляция и кэширование ключей правильных ответов,
+проверка попытки целиком (общая для API и HTML страниц)
+"""
+
+import json
+from config import Config
+from backend.utils.cache import LRUCache
+
+# Маркер "ключа нет" - у вопроса не задан или поврежден правильный ответ (результат проверки None)
+NO_KEY = object()
+# Маркер "совпадение невозможно" - например, пустой список правильных ответов для single
+NO_MATCH = object()
+# Маркер "правильный ответ 'multiple' не список" - результат None для ответа-списка, иначе False
+NO_LIST_KEY = object()
+# Маркер промаха кэша (None не подходит - ключи кэшируются как есть)
+_MISSING = object()
+
+# Кэш скомпилированных ключей: question_id -> key (версия - см. question_version)
+_cache = LRUCache('answer_keys', Config.ANSWER_KEY_CACHE_SIZE)
+
+
+def question_version(question):
+    """
+    Версия вопроса для кэша - поля, от которых зависит проверка ответа
+
+    Если вопрос изменили в обход invalidate_answer_key, версия не совпадет
+    и ключ будет скомпилирован заново.
+    """
+    return (question.question_type, question.correct_answer)
+
+
+def compile_answer_key(question_type, correct_answer):
+    """
+    Компиляция правильного ответа в форму, удобную для быстрого сравнения
+
+    Сравнение повторяет исходную проверку check_answer: для 'single' индекс сравнивается
+    с сохраненным значением как есть (без приведения к int), для 'multiple' сравниваются
+    отсортированные списки (повторы учитываются).
+
+    Returns:
+        значение для 'single', отсортированный список для 'multiple', нормализованная строка
+        для 'text', NO_KEY если ответ не задан или не парсится, NO_MATCH если совпадение
+        невозможно, NO_LIST_KEY если ответ 'multiple' не список
+    """
+    if not correct_answer:
+        return NO_KEY
+
+    try:
+        correct = json.loads(correct_answer)
+    except (json.JSONDecodeError, TypeError):
+        return NO_KEY
+
+    # Один правильный вариант - храним значение (correct может быть списком [0] или числом 0)
+    if question_type == 'single':
+        if isinstance(correct, list):
+            if not correct:
+                return NO_MATCH
+            correct = correct[0]
+        return correct
+    # Несколько правильных вариантов - отсортированный список (порядок не важен)
+    elif question_type == 'multiple':
+        if not isinstance(correct, list):
+            return NO_LIST_KEY
+        try:
+            return sorted(correct)
+        except TypeError:
+            # Несравнимые значения - исходная проверка падала, здесь ответ просто неверный
+            return NO_MATCH
+    # Текстовый ответ - строка без учета регистра и пробелов по краям
+    elif question_type == 'text':
+        return str(correct).strip().lower()
+
+    return NO_KEY
+
+
+def get_answer_key(question):
+    """Получение скомпилированного ключа вопроса из кэша (с компиляцией при промахе)"""
+    version = question_version(question)
+    key = _cache.get(question.id, version=version, default=_MISSING)
+    if key is not _MISSING:
+        return key
+
+    key = compile_answer_key(question.question_type, question.correct_answer)
+
+    # Вопросы без id (еще не сохранены в БД) не кэшируем
+    if question.id is not None:
+        _cache.set(question.id, key, version=version)
+    return key
+
+
+def invalidate_answer_key(question_id):
+    """Удаление ключа вопроса из кэша (после изменения или удаления вопроса)"""
+    _cache.pop(question_id)
+
+
+def clear_answer_keys():
+    """Полная очистка кэша ключей"""
+    _cache.clear()
+
+
+def _parse_single(user_answer):
+    """Приведение ответа на вопрос 'single' к индексу варианта"""
+    # user_answer может быть строкой "0", числом 0, или JSON строкой
+    if isinstance(user_answer, str):
+        try:
+            return int(json.loads(user_answer))
+        except (json.JSONDecodeError, ValueError, TypeError):
+            # Если не JSON, пытаемся преобразовать напрямую
+            return int(user_answer)
+    return int(user_answer)
+
+
+def match_answer(question_type, key, user_answer):
+    """
+    Сравнение ответа пользователя со скомпилированным ключом
+
+    Returns:
+        True/False - правильный ответ или нет, None если у вопроса нет правильного ответа
+    """
+    if key is NO_KEY:
+        return None
+
+    if question_type == 'single':
+        try:
+            user_ans_int = _parse_single(user_answer)
+        except (ValueError, TypeError):
+            return False
+        return key is not NO_MATCH and user_ans_int == key
+    elif question_type == 'multiple':
+        # user_answer может быть списком или JSON строкой
+        if isinstance(user_answer, str):
+            try:
+                user_answer = json.loads(user_answer)
+            except (json.JSONDecodeError, TypeError):
+                return False
+        if not isinstance(user_answer, list):
+            return False
+        if key is NO_LIST_KEY:
+            return None
+        if key is NO_MATCH:
+            return False
+        try:
+            return sorted(user_answer) == key
+        except TypeError:
+            return False
+    elif question_type == 'text':
+        return str(user_answer).strip().lower() == key
+
+    return None
+
+
+def grade_attempt(questions, answers):
+    """
+    Проверка всей попытки за один проход по вопросам теста
+
+    Args:
+        questions: Все вопросы теста
+        answers: Словарь question_id -> ответ пользователя (уже декодированный из JSON)
+
+    Returns:
+        dict: {
+            'correct_count': количество правильных ответов,
+            'total': количество вопросов в тесте,
+            'results': question_id -> True/False/None (None - у вопроса нет правильного ответа)
+        }
+    """
+    results = {}
+    correct_count = 0
+
+    for question in questions:
+        key = get_answer_key(question)
+        if key is NO_KEY:
+            is_correct = None
+        elif question.id not in answers:
+            # Вопрос без ответа считается неправильным
+            is_correct = False
+        else:
+            is_correct = match_answer(question.question_type, key, answers[question.id])
+
+        results[question.id] = is_correct
+        if is_correct is True:
+            correct_count += 1
+
+    return {
+        'correct_count': correct_count,
+        'total': len(questions),
+        'results': results
+    }
+
+
+def calculate_percent(correct_count, total):
+    """Результат в процентах от общего количества вопросов, округленный до 2 знаков"""
+    if not total:
+        return 0
+    return round((correct_count / total) * 100, 2)
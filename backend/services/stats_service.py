@@ -2,11 +2,22 @@
 Сервис для получения статистики
 """
 
-from sqlalchemy import func
+import json
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import func, case, and_, or_, select, update
+from sqlalchemy.exc import IntegrityError
 from backend.models import db
 from backend.models.test import Test
 from backend.models.attempt import TestAttempt
+from backend.models.test_stats import TestStats
+from backend.models.user import User
+from backend.models.answer import Answer
+from backend.models.question import Question
+from backend.utils.db_routing import read_replica, read_primary, replica_reads, primary_reads
+from backend.utils.pagination import keyset_page
 
+@read_replica
 def get_test_statistics(test_id, user_id):
     test = Test.query.get(test_id)
     if not test:
@@ -14,31 +25,140 @@ def get_test_statistics(test_id, user_id):
     if test.user_id != user_id:
         raise ValueError('Access denied')
 
-    attempts = TestAttempt.query.filter_by(test_id=test_id).filter(
-        TestAttempt.finished_at.isnot(None)
-    ).all()
+    return get_test_stats(test_id).to_dict()
 
-    total_attempts = len(attempts)
-    if total_attempts == 0:
-        return {
-            'test_id': test_id,
-            'total_attempts': 0,
-            'average_score': 0,
-            'highest_score': 0,
-            'lowest_score': 0
-        }
+@read_replica
+def get_test_statistics_version(test_id, user_id):
+    """Версия статистики теста для ETag и Last-Modified - одна строка агрегата"""
+    row = db.session.query(Test.user_id, TestStats.updated_at, TestStats.attempts_count)\
+        .outerjoin(TestStats, TestStats.test_id == Test.id)\
+        .filter(Test.id == test_id)\
+        .first()
+    # Нет агрегата - пусть маршрут его построит
+    if not row or row.user_id != user_id or row.updated_at is None:
+        return None
+    return (row.updated_at, row.attempts_count), row.updated_at
 
-    scores = [a.score for a in attempts if a.score is not None]
-    avg_score = sum(scores) / len(scores) if scores else 0
+@read_replica
+def get_test_stats(test_id):
+    """
+    Агрегат статистики теста - чтение одной строки вместо обхода всех попыток
 
-    return {
-        'test_id': test_id,
-        'total_attempts': total_attempts,
-        'average_score': round(avg_score, 2),
-        'highest_score': max(scores) if scores else 0,
-        'lowest_score': min(scores) if scores else 0
+    Если строки нет на реплике, она читается с основной БД (реплика могла отстать);
+    если ее нет и там (тест создан до появления таблицы test_stats), агрегат
+    считается из попыток без сохранения - чтение ничего не пишет. Строку создает
+    первая завершенная попытка или команда rebuild-test-stats.
+    """
+    stats = TestStats.query.get(test_id)
+    if stats is None:
+        with primary_reads():
+            stats = TestStats.query.get(test_id)
+            if stats is None:
+                # Объект не добавляется в сессию и не попадет в flush
+                stats = TestStats(test_id=test_id)
+                _fill_stats(stats, _stats_aggregates(test_id).get(test_id))
+    return stats
+
+def record_attempt_score(test_id, score):
+    """
+    Учет результата завершенной попытки в агрегате теста
+
+    Не делает commit - вызывается в транзакции, завершающей попытку.
+    Обновление выполняется одним UPDATE с выражениями, поэтому параллельные
+    завершения попыток не теряют друг друга.
+
+    Правило то же, что в rebuild_test_stats: попытка без результата (score None)
+    учитывается в количестве, но не в сумме, минимуме и максимуме.
+    """
+    values = {
+        'attempts_count': TestStats.attempts_count + 1,
+        'updated_at': datetime.utcnow()
     }
+    if score is not None:
+        score = float(score)
+        values.update({
+            'score_sum': TestStats.score_sum + score,
+            'score_sq_sum': TestStats.score_sq_sum + score * score,
+            'min_score': case(
+                (or_(TestStats.min_score.is_(None), TestStats.min_score > score), score),
+                else_=TestStats.min_score
+            ),
+            'max_score': case(
+                (or_(TestStats.max_score.is_(None), TestStats.max_score < score), score),
+                else_=TestStats.max_score
+            ),
+        })
+    statement = update(TestStats).where(TestStats.test_id == test_id).values(values)
+    if db.session.execute(statement).rowcount:
+        return
+
+    # Строки еще нет - пересчитываем агрегат из попыток (текущая попытка уже во flush)
+    try:
+        with db.session.begin_nested():
+            rebuild_test_stats(test_id)
+    except IntegrityError:
+        # Строку параллельно создал другой запрос - достаточно инкремента
+        db.session.execute(statement)
 
+@read_primary
+def rebuild_test_stats(test_id=None):
+    """
+    Полный пересчет агрегата из завершенных попыток
+
+    Количество - все завершенные попытки; сумма, минимум и максимум - по попыткам
+    с результатом (агрегатные функции SQL пропускают NULL).
+
+    Args:
+        test_id: ID теста или None для пересчета всех тестов
+
+    Returns:
+        TestStats для одного теста или количество пересчитанных тестов
+    """
+    db.session.flush()
+    if test_id is not None:
+        test_ids = [test_id]
+    else:
+        test_ids = [row[0] for row in db.session.query(Test.id).all()]
+
+    aggregates = _stats_aggregates(test_id)
+    existing = {s.test_id: s for s in TestStats.query.filter(TestStats.test_id.in_(test_ids)).all()}
+
+    result = None
+    for current_id in test_ids:
+        stats = existing.get(current_id) or TestStats(test_id=current_id)
+        _fill_stats(stats, aggregates.get(current_id))
+        db.session.add(stats)
+        result = stats
+    db.session.flush()
+
+    return result if test_id is not None else len(test_ids)
+
+def _stats_aggregates(test_id=None):
+    """Агрегаты завершенных попыток: test_id -> (count, score_sum, score_sq_sum, min, max)"""
+    query = db.session.query(
+        TestAttempt.test_id,
+        func.count(TestAttempt.id),
+        func.coalesce(func.sum(TestAttempt.score), 0),
+        func.coalesce(func.sum(TestAttempt.score * TestAttempt.score), 0),
+        func.min(TestAttempt.score),
+        func.max(TestAttempt.score)
+    ).filter(
+        TestAttempt.finished_at.isnot(None)
+    ).group_by(TestAttempt.test_id)
+    if test_id is not None:
+        query = query.filter(TestAttempt.test_id == test_id)
+    return {row[0]: row[1:] for row in query.all()}
+
+def _fill_stats(stats, aggregate):
+    """Заполнение агрегата значениями _stats_aggregates (None - попыток нет)"""
+    count, score_sum, score_sq_sum, min_score, max_score = aggregate or (0, 0, 0, None, None)
+    stats.attempts_count = count
+    stats.score_sum = score_sum
+    stats.score_sq_sum = score_sq_sum
+    stats.min_score = min_score
+    stats.max_score = max_score
+
+@read_replica
 def get_test_attempts(test_id, user_id, skip=0, limit=20):
     test = Test.query.get(test_id)
     if not test:
@@ -47,29 +167,273 @@ def get_test_attempts(test_id, user_id, skip=0, limit=20):
         raise ValueError('Access denied')
 
     attempts = TestAttempt.query.filter_by(test_id=test_id)\
-        .order_by(TestAttempt.started_at.desc())\
+        .order_by(TestAttempt.started_at.desc(), TestAttempt.id.desc())\
         .offset(skip)\
         .limit(limit)\
         .all()
 
     return [a.to_dict() for a in attempts]
 
-def get_user_statistics(user_id):
-    total_attempts = TestAttempt.query.filter_by(user_id=user_id).filter(
-        TestAttempt.finished_at.isnot(None)
-    ).count()
+@read_replica
+def get_test_attempts_version(test_id, user_id):
+    """Версия списка попыток теста для ETag (новые попытки и завершения)"""
+    owner_id = db.session.query(Test.user_id).filter(Test.id == test_id).scalar()
+    if owner_id is None or owner_id != user_id:
+        return None
+    row = db.session.query(
+        func.count(TestAttempt.id),
+        func.max(TestAttempt.id),
+        func.max(TestAttempt.finished_at)
+    ).filter(TestAttempt.test_id == test_id).one()
+    return tuple(row), None
 
-    tests_created = Test.query.filter_by(user_id=user_id).count()
+@read_replica
+def get_test_attempts_after(test_id, user_id, position=None, limit=20):
+    """Курсорная пагинация попыток теста (последние первыми); position - разобранный курсор"""
+    test = Test.query.get(test_id)
+    if not test:
+        raise ValueError('Test not found')
+    if test.user_id != user_id:
+        raise ValueError('Access denied')
 
-    completed_attempts = TestAttempt.query.filter_by(user_id=user_id).filter(
-        TestAttempt.finished_at.isnot(None)
-    ).all()
+    query = TestAttempt.query.filter_by(test_id=test_id)
+    attempts, next_cursor = keyset_page(query, TestAttempt.started_at, TestAttempt.id, position, limit)
+    return {'items': [a.to_dict() for a in attempts], 'next_cursor': next_cursor}
+
+# Допустимые поля сортировки таблицы попыток на странице статистики
+ATTEMPT_SORT_FIELDS = {
+    'date': TestAttempt.started_at,
+    'score': TestAttempt.score,
+    'name': User.name
+}
+
+@read_replica
+def get_test_attempts_page(test_id, page=1, per_page=20, sort='date', order='desc', total=None):
+    """
+    Страница завершенных попыток теста для таблицы на странице статистики
+
+    Имя пользователя подгружается JOIN-ом, количество правильных ответов -
+    подзапросом по флагам is_correct (а не пересчетом из процента).
+
+    Args:
+        total: Общее количество завершенных попыток, если уже известно (например, из test_stats)
+
+    Returns:
+        dict: items, page, per_page, total, pages, sort, order
+    """
+    if sort not in ATTEMPT_SORT_FIELDS:
+        sort = 'date'
+    if order not in ('asc', 'desc'):
+        order = 'desc'
 
-    scores = [a.score for a in completed_attempts if a.score is not None]
-    avg_score = sum(scores) / len(scores) if scores else 0
+    finished = and_(TestAttempt.test_id == test_id, TestAttempt.finished_at.isnot(None))
+    if total is None:
+        total = db.session.query(func.count(TestAttempt.id)).filter(finished).scalar()
+
+    pages = max((total + per_page - 1) // per_page, 1)
+    page = min(max(page, 1), pages)
+
+    correct_count = select(func.count(Answer.id))\
+        .where(Answer.attempt_id == TestAttempt.id, Answer.is_correct.is_(True))\
+        .correlate(TestAttempt)\
+        .scalar_subquery()
+
+    sort_column = ATTEMPT_SORT_FIELDS[sort]
+    direction = sort_column.asc() if order == 'asc' else sort_column.desc()
+    tie_breaker = TestAttempt.id.asc() if order == 'asc' else TestAttempt.id.desc()
+
+    rows = db.session.query(
+        TestAttempt.id,
+        TestAttempt.user_id,
+        User.name,
+        TestAttempt.score,
+        TestAttempt.started_at,
+        TestAttempt.finished_at,
+        correct_count
+    ).join(User, User.id == TestAttempt.user_id)\
+        .filter(finished)\
+        .order_by(direction, tie_breaker)\
+        .offset((page - 1) * per_page)\
+        .limit(per_page)\
+        .all()
+
+    items = [{
+        'id': attempt_id,
+        'user_id': user_id,
+        'user_name': user_name,
+        'score': score,
+        'started_at': started_at,
+        'finished_at': finished_at,
+        'correct_count': correct
+    } for attempt_id, user_id, user_name, score, started_at, finished_at, correct in rows]
+
+    return {
+        'items': items,
+        'page': page,
+        'per_page': per_page,
+        'total': total,
+        'pages': pages,
+        'sort': sort,
+        'order': order
+    }
+
+@read_replica
+def export_test_attempts(test_id, user_id, since=None):
+    """
+    Выгрузка всех попыток теста с пользователями и ответами
+
+    Проверка доступа выполняется сразу, строки читаются лениво - по мере
+    потребления генератора (партиями EXPORT_YIELD_PER строк).
+
+    Args:
+        test_id: ID теста
+        user_id: ID владельца теста
+        since: Только попытки, начатые или завершенные не раньше этого времени (UTC)
+
+    Returns:
+        generator: Словари попыток (started_at, id по возрастанию) со списком answers
+
+    Raises:
+        ValueError: Тест не найден или принадлежит другому пользователю
+    """
+    owner_id = db.session.query(Test.user_id).filter(Test.id == test_id).scalar()
+    if owner_id is None:
+        raise ValueError('Test not found')
+    if owner_id != user_id:
+        raise ValueError('Access denied')
+    return _iter_export_attempts(test_id, since)
+
+def _iter_export_attempts(test_id, since):
+    """Попытки теста одним запросом (попытка x ответ), сгруппированные по попытке"""
+    # Генератор потребляется после выхода из read_replica - контекст реплики свой
+    with replica_reads():
+        query = db.session.query(
+            TestAttempt.id,
+            TestAttempt.user_id,
+            User.name,
+            TestAttempt.started_at,
+            TestAttempt.finished_at,
+            TestAttempt.score,
+            Answer.question_id,
+            Question.order_index,
+            Question.question_type,
+            Question.question_text,
+            Answer.user_answer,
+            Answer.is_correct
+        ).join(User, User.id == TestAttempt.user_id)\
+            .outerjoin(Answer, Answer.attempt_id == TestAttempt.id)\
+            .outerjoin(Question, Question.id == Answer.question_id)\
+            .filter(TestAttempt.test_id == test_id)
+        if since is not None:
+            query = query.filter(or_(TestAttempt.started_at >= since, TestAttempt.finished_at >= since))
+
+        # Порядок индекса (test_id, started_at, id); выгрузка может идти дольше STATEMENT_TIMEOUT_MS -
+        # ограничение снимается для этого запроса (SQLite: без срока, PostgreSQL: SET LOCAL ... = 0)
+        rows = query.order_by(TestAttempt.started_at, TestAttempt.id, Answer.id)\
+            .execution_options(statement_timeout=False)\
+            .yield_per(current_app.config['EXPORT_YIELD_PER'])
+
+        attempt = None
+        for (attempt_id, attempt_user_id, user_name, started_at, finished_at, score,
+             question_id, order_index, question_type, question_text, user_answer, is_correct) in rows:
+            if attempt is None or attempt['attempt_id'] != attempt_id:
+                if attempt is not None:
+                    yield attempt
+                attempt = {
+                    'attempt_id': attempt_id,
+                    'user_id': attempt_user_id,
+                    'user_name': user_name,
+                    'started_at': started_at.isoformat() if started_at else None,
+                    'finished_at': finished_at.isoformat() if finished_at else None,
+                    'score': score,
+                    'answers': []
+                }
+            if question_id is not None:
+                attempt['answers'].append({
+                    'question_id': question_id,
+                    'order_index': order_index,
+                    'question_type': question_type,
+                    'question_text': question_text,
+                    'user_answer': _decode_answer(user_answer),
+                    'is_correct': is_correct
+                })
+        if attempt is not None:
+            yield attempt
+
+def _decode_answer(user_answer):
+    """Ответ пользователя из JSON (как в Answer.to_dict); не JSON - как есть"""
+    if not user_answer:
+        return None
+    try:
+        return json.loads(user_answer)
+    except (json.JSONDecodeError, TypeError):
+        return user_answer
+
+@read_replica
+def get_user_statistics(user_id):
+    finished = and_(TestAttempt.user_id == user_id, TestAttempt.finished_at.isnot(None))
+
+    # Количество тестов пользователя - скалярный подзапрос в том же SELECT
+    tests_created = db.session.query(func.count(Test.id))\
+        .filter(Test.user_id == user_id)\
+        .scalar_subquery()
+
+    # Все агрегаты по завершенным попыткам одним запросом (индекс user_id, finished_at)
+    total_attempts, avg_score, best_score, last_activity, tests_count = db.session.query(
+        func.count(TestAttempt.id),
+        func.avg(TestAttempt.score),
+        func.max(TestAttempt.score),
+        func.max(TestAttempt.finished_at),
+        tests_created
+    ).filter(finished).one()
 
     return {
         'total_attempts': total_attempts,
-        'tests_created': tests_created,
-        'average_score': round(avg_score, 2)
+        'tests_created': tests_count,
+        'average_score': round(avg_score, 2) if avg_score is not None else 0,
+        'best_score': best_score if best_score is not None else 0,
+        'last_activity': last_activity.isoformat() if last_activity else None,
+        'tests': get_user_test_scores(user_id)
     }
+
+@read_replica
+def get_user_test_scores(user_id):
+    """
+    Лучший и последний результат пользователя по каждому пройденному тесту
+
+    Вычисляется в БД: оконная функция нумерует попытки внутри теста
+    от последней к первой, агрегаты берутся по группе теста.
+    """
+    ranked = db.session.query(
+        TestAttempt.test_id.label('test_id'),
+        TestAttempt.score.label('score'),
+        TestAttempt.finished_at.label('finished_at'),
+        func.row_number().over(
+            partition_by=TestAttempt.test_id,
+            order_by=(TestAttempt.finished_at.desc(), TestAttempt.id.desc())
+        ).label('position')
+    ).filter(
+        TestAttempt.user_id == user_id,
+        TestAttempt.finished_at.isnot(None)
+    ).subquery()
+
+    rows = db.session.query(
+        ranked.c.test_id,
+        Test.title,
+        func.count(),
+        func.max(ranked.c.score),
+        func.max(case((ranked.c.position == 1, ranked.c.score))),
+        func.max(ranked.c.finished_at)
+    ).join(Test, Test.id == ranked.c.test_id)\
+        .group_by(ranked.c.test_id, Test.title)\
+        .order_by(func.max(ranked.c.finished_at).desc())\
+        .all()
+
+    return [{
+        'test_id': test_id,
+        'title': title,
+        'attempts': attempts,
+        'best_score': best_score,
+        'latest_score': latest_score,
+        'latest_finished_at': latest_finished_at.isoformat() if latest_finished_at else None
+    } for test_id, title, attempts, best_score, latest_score, latest_finished_at in rows]
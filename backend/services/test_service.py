@@ -4,9 +4,30 @@
 
 import json
 import uuid
+from datetime import datetime
+from sqlalchemy import func
+from sqlalchemy.orm import selectinload
+from config import Config
 from backend.models import db
 from backend.models.test import Test
 from backend.models.question import Question
+from backend.models.attempt import TestAttempt
+from backend.services.grading_service import invalidate_answer_key
+from backend.utils.db_routing import read_replica, primary_reads
+from backend.utils.pagination import keyset_page
+from backend.utils.cache import LRUCache
+
+# Кэш данных опубликованных тестов для прохождения: link_token -> payload (версия - updated_at)
+_payload_cache = LRUCache('test_payloads', Config.TEST_PAYLOAD_CACHE_SIZE)
+
+def invalidate_test_payload(link_token):
+    """Удаление кэшированных данных теста (после изменения теста или его вопросов)"""
+    if link_token:
+        _payload_cache.pop(link_token)
+
+def get_payload_cache_stats():
+    """Счетчики попаданий/промахов кэша данных тестов"""
+    return _payload_cache.stats()
 
 def create_test(user_id, title, description):
     test = Test(
@@ -18,10 +39,52 @@ def create_test(user_id, title, description):
     db.session.commit()
     return test.to_dict()
 
+@read_replica
 def get_user_tests(user_id, skip=0, limit=20):
-    tests = Test.query.filter_by(user_id=user_id).offset(skip).limit(limit).all()
+    tests = Test.query.filter_by(user_id=user_id).options(*Test.with_counts())\
+        .order_by(Test.created_at.desc(), Test.id.desc())\
+        .offset(skip).limit(limit).all()
     return [t.to_dict() for t in tests]
 
+@read_replica
+def get_user_tests_after(user_id, position=None, limit=20):
+    """Курсорная пагинация тестов пользователя (новые первыми); position - разобранный курсор"""
+    query = Test.query.filter_by(user_id=user_id).options(*Test.with_counts())
+    tests, next_cursor = keyset_page(query, Test.created_at, Test.id, position, limit)
+    return {'items': [t.to_dict() for t in tests], 'next_cursor': next_cursor}
+
+@read_replica
+def get_user_tests_version(user_id):
+    """Версия списка тестов пользователя для ETag (количество, изменения, попытки)"""
+    attempts_total = db.session.query(func.count(TestAttempt.id))\
+        .join(Test, Test.id == TestAttempt.test_id)\
+        .filter(Test.user_id == user_id)\
+        .scalar_subquery()
+    row = db.session.query(func.count(Test.id), func.max(Test.updated_at), func.max(Test.id), attempts_total)\
+        .filter(Test.user_id == user_id)\
+        .one()
+    # Last-Modified не отдаем - attempts_count меняется без изменения updated_at
+    return tuple(row), None
+
+def get_test_version(test_id, user_id):
+    """Версия теста для ETag (изменение вопросов обновляет updated_at)"""
+    row = db.session.query(Test.user_id, Test.updated_at, Test.attempts_count)\
+        .filter(Test.id == test_id)\
+        .first()
+    if not row or row.user_id != user_id:
+        return None
+    return (row.updated_at, row.attempts_count), None
+
+@read_replica
+def get_test_by_link_version(link_token):
+    """Версия опубликованного теста для ETag и Last-Modified"""
+    row = db.session.query(Test.is_published, Test.updated_at)\
+        .filter(Test.link_token == link_token)\
+        .first()
+    if not row or not row.is_published or not row.updated_at:
+        return None
+    return row.updated_at, row.updated_at
+
 def get_test(test_id, user_id=None):
     test = Test.query.get(test_id)
     if not test:
@@ -43,6 +106,7 @@ def update_test(test_id, user_id, data):
         test.description = data['description']
 
     db.session.commit()
+    invalidate_test_payload(test.link_token)
     return test.to_dict()
 
 def delete_test(test_id, user_id):
@@ -52,8 +116,13 @@ def delete_test(test_id, user_id):
     if test.user_id != user_id:
         raise ValueError('Access denied')
 
+    question_ids = [q.id for q in test.questions]
+    link_token = test.link_token
     db.session.delete(test)
     db.session.commit()
+    for question_id in question_ids:
+        invalidate_answer_key(question_id)
+    invalidate_test_payload(link_token)
     return True
 
 def publish_test(test_id, user_id):
@@ -67,18 +136,43 @@ def publish_test(test_id, user_id):
     if question_count == 0:
         raise ValueError('Cannot publish test without questions. Add at least one question.')
 
+    old_link_token = test.link_token
     test.is_published = True
     test.link_token = str(uuid.uuid4())
     db.session.commit()
+    invalidate_test_payload(old_link_token)
     return test.to_dict()
 
+@read_replica
 def get_test_by_link(link_token):
-    test = Test.query.filter_by(link_token=link_token).first()
-    if not test:
+    """
+    Данные опубликованного теста для прохождения (без правильных ответов)
+
+    Каждый запрос выполняет только легкую проверку статуса и updated_at;
+    вопросы загружаются и сериализуются при промахе кэша.
+    """
+    query = db.session.query(Test.id, Test.is_published, Test.updated_at)\
+        .filter(Test.link_token == link_token)
+    row = query.first()
+    if not row or not row.is_published:
+        # Реплика может отставать от только что опубликованного теста - проверяем основную БД
+        with primary_reads():
+            return _published_payload(link_token, query.first())
+    return _published_payload(link_token, row)
+
+def _published_payload(link_token, row):
+    """Данные теста по строке (id, is_published, updated_at) - из кэша или из БД"""
+    if not row:
         raise ValueError('Test not found')
-    if not test.is_published:
+    if not row.is_published:
         raise ValueError('Test is not published')
-    return test.to_dict(include_questions=True)
+
+    payload = _payload_cache.get(link_token, version=row.updated_at)
+    if payload is None:
+        test = Test.query.options(selectinload(Test.questions)).filter_by(id=row.id).first()
+        payload = test.to_public_dict()
+        _payload_cache.set(link_token, payload, version=row.updated_at)
+    return payload
 
 def create_question(test_id, user_id, data):
     test = Test.query.get(test_id)
@@ -126,7 +220,10 @@ def create_question(test_id, user_id, data):
             order_index=data.get('order_index', 0)
         )
         db.session.add(question)
+        # Изменение вопросов меняет версию теста (updated_at) для кэшей
+        test.updated_at = datetime.utcnow()
         db.session.commit()
+        invalidate_test_payload(test.link_token)
         return question.to_dict(include_correct_answer=True)
     except Exception as e:
         db.session.rollback()
@@ -152,7 +249,12 @@ def update_question(test_id, question_id, user_id, data):
     if 'order_index' in data:
         question.order_index = data['order_index']
 
+    # Изменение вопросов меняет версию теста (updated_at) для кэшей
+    test.updated_at = datetime.utcnow()
     db.session.commit()
+    # Правильный ответ мог измениться - сбрасываем скомпилированный ключ
+    invalidate_answer_key(question.id)
+    invalidate_test_payload(test.link_token)
     return question.to_dict(include_correct_answer=True)
 
 def delete_question(test_id, question_id, user_id):
@@ -165,5 +267,8 @@ def delete_question(test_id, question_id, user_id):
         raise ValueError('Question not found')
 
     db.session.delete(question)
+    test.updated_at = datetime.utcnow()
     db.session.commit()
+    invalidate_answer_key(question_id)
+    invalidate_test_payload(test.link_token)
     return True
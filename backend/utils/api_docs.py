@@ -0,0 +1,198 @@
+"""
+Документация API (Swagger UI и /apispec.json) с ленивой загрузкой flasgger
+
+Маршруты документации регистрируются при создании приложения без импорта flasgger:
+пакет (вместе с jsonschema и разбором YAML) загружается при первом обращении
+к /swagger или /apispec.json.
+
+Спецификация собирается из YAML docstring маршрутов один раз и сохраняется в
+API_SPEC_PATH вместе с отпечатком маршрутов (x-route-fingerprint). Пока маршруты
+и их docstring не изменились, спецификация читается из файла без разбора YAML.
+/apispec.json отдается из памяти с ETag и сжатием gzip.
+"""
+
+import gzip
+import hashlib
+import json
+import logging
+import os
+import threading
+from importlib.metadata import version as package_version
+from importlib.util import find_spec
+from flask import Blueprint, Response, current_app, request
+
+logger = logging.getLogger(__name__)
+
+# Конфигурация Swagger (автодокументация API)
+SWAGGER_CONFIG = {
+    "headers": [],
+    "specs": [{"endpoint": 'apispec', "route": '/apispec.json'}],
+    "static_url_path": "/flasgger_static",
+    "swagger_ui": True,
+    "specs_route": "/swagger"
+}
+
+SWAGGER_TEMPLATE = {
+    "info": {
+        "title": "Sky Test API",
+        "description": "API для платформы тестирования",
+        "version": "1.0.0"
+    },
+    "securityDefinitions": {
+        "Bearer": {
+            "type": "apiKey",
+            "name": "Authorization",
+            "in": "header",
+            "description": "JWT token. Вставьте токен БЕЗ слова 'Bearer' - просто сам токен. Или используйте формат: Bearer {token}"
+        }
+    }
+}
+
+_init_lock = threading.RLock()
+
+
+def init_api_docs(app):
+    """
+    Регистрация маршрутов документации (те же URL и имена, что у flasgger)
+
+    Шаблоны и статика Swagger UI берутся из каталога пакета flasgger,
+    найденного без его импорта.
+    """
+    ui_path = os.path.join(os.path.dirname(find_spec('flasgger').origin), 'ui3')
+    blueprint = Blueprint(
+        'flasgger', __name__,
+        template_folder=os.path.join(ui_path, 'templates'),
+        static_folder=os.path.join(ui_path, 'static'),
+        static_url_path=SWAGGER_CONFIG['static_url_path']
+    )
+    blueprint.add_url_rule(SWAGGER_CONFIG['specs_route'], 'apidocs', view_func=_apidocs)
+    blueprint.add_url_rule('/oauth2-redirect.html', 'oauth_redirect', view_func=_oauth_redirect)
+    for spec in SWAGGER_CONFIG['specs']:
+        blueprint.add_url_rule(spec['route'], spec['endpoint'], view_func=_apispec)
+    app.register_blueprint(blueprint)
+
+
+def get_swagger():
+    """Объект Swagger текущего приложения (создается при первом обращении)"""
+    swagger = current_app.extensions.get('flasgger')
+    if swagger is None:
+        with _init_lock:
+            swagger = current_app.extensions.get('flasgger')
+            if swagger is None:
+                from flasgger import Swagger
+
+                # Без init_app: маршруты уже зарегистрированы в init_api_docs
+                swagger = Swagger(config=dict(SWAGGER_CONFIG), template=SWAGGER_TEMPLATE)
+                swagger.app = current_app._get_current_object()
+                swagger.load_config(swagger.app)
+                current_app.extensions['flasgger'] = swagger
+    return swagger
+
+
+def _apidocs():
+    """Swagger UI"""
+    from flasgger.base import APIDocsView
+    return APIDocsView.as_view('apidocs', view_args={'config': get_swagger().config})()
+
+
+def _oauth_redirect():
+    """Страница OAuth2 редиректа Swagger UI"""
+    from flasgger.base import OAuthRedirect
+    return OAuthRedirect.as_view('oauth_redirect')()
+
+
+def route_fingerprint(app):
+    """
+    Отпечаток определений маршрутов - меняется вместе с содержимым спецификации
+
+    Учитываются правила URL, методы, docstring обработчиков, шаблон Swagger
+    и версия flasgger (без разбора YAML).
+    """
+    digest = hashlib.sha256()
+    digest.update(json.dumps([SWAGGER_CONFIG, SWAGGER_TEMPLATE], sort_keys=True).encode())
+    digest.update(package_version('flasgger').encode())
+    for rule in sorted(app.url_map.iter_rules(), key=lambda r: (r.rule, r.endpoint)):
+        view = app.view_functions.get(rule.endpoint)
+        digest.update(repr((rule.rule, rule.endpoint, sorted(rule.methods or ()),
+                            getattr(view, '__doc__', None))).encode())
+    return digest.hexdigest()
+
+
+def build_api_spec(app, fingerprint=None):
+    """Сборка спецификации из docstring маршрутов (через flasgger)"""
+    with app.test_request_context():
+        spec = dict(get_swagger().get_apispecs('apispec'))
+    spec['x-route-fingerprint'] = fingerprint or route_fingerprint(app)
+    return spec
+
+
+def write_api_spec(spec, path):
+    """Сохранение спецификации в файл (запись через временный файл)"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(spec, f, ensure_ascii=False, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def load_api_spec(app):
+    """
+    Спецификация для текущих маршрутов: из файла API_SPEC_PATH, если он собран
+    для тех же маршрутов, иначе сборка и перезапись файла
+    """
+    fingerprint = route_fingerprint(app)
+    path = app.config['API_SPEC_PATH']
+    try:
+        with open(path, encoding='utf-8') as f:
+            spec = json.load(f)
+        if spec.get('x-route-fingerprint') == fingerprint:
+            return spec
+    except (OSError, ValueError):
+        pass
+
+    spec = build_api_spec(app, fingerprint)
+    try:
+        write_api_spec(spec, path)
+    except OSError as e:
+        # Каталог только для чтения - спецификация остается в памяти процесса
+        logger.warning('Could not write API spec to %s: %s', path, e)
+    return spec
+
+
+def get_api_spec(app):
+    """Готовое к отдаче представление спецификации: тело, gzip и ETag (одно на процесс)"""
+    cached = app.extensions.get('api_spec')
+    if cached is None:
+        with _init_lock:
+            cached = app.extensions.get('api_spec')
+            if cached is None:
+                spec = load_api_spec(app)
+                body = json.dumps(spec, ensure_ascii=False, sort_keys=True).encode('utf-8')
+                cached = {
+                    'etag': spec['x-route-fingerprint'][:32],
+                    'body': body,
+                    'gzip': gzip.compress(body, compresslevel=9)
+                }
+                app.extensions['api_spec'] = cached
+    return cached
+
+
+def _apispec():
+    """Спецификация OpenAPI (ETag + gzip, 304 при совпадении If-None-Match)"""
+    cached = get_api_spec(current_app)
+    use_gzip = request.accept_encodings['gzip'] > 0
+    # У сжатого и несжатого представлений разные ETag
+    etag = cached['etag'] + ('-gz' if use_gzip else '')
+
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+    else:
+        response = Response(cached['gzip'] if use_gzip else cached['body'], mimetype='application/json')
+        if use_gzip:
+            response.headers['Content-Encoding'] = 'gzip'
+
+    response.set_etag(etag)
+    response.vary.add('Accept-Encoding')
+    response.cache_control.public = True
+    response.cache_control.no_cache = True
+    return response
@@ -0,0 +1,77 @@
+"""
+Утилиты кэширования - ограниченный по размеру LRU кэш в памяти процесса
+"""
+
+import threading
+from collections import OrderedDict
+
+# Все созданные кэши по имени (для вывода статистики попаданий)
+_registry = {}
+
+
+class LRUCache:
+    """
+    Потокобезопасный LRU кэш с версионированием записей и счетчиками попаданий
+
+    Запись хранится вместе с версией (например, updated_at объекта). Если при чтении
+    версия не совпадает с сохраненной, запись считается устаревшей (промах).
+    """
+
+    def __init__(self, name, maxsize):
+        self.name = name
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        _registry[name] = self
+
+    def get(self, key, version=None, default=None):
+        """Получение значения по ключу (None/default при промахе или устаревшей версии)"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] != version:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value, version=None):
+        """Сохранение значения; при переполнении вытесняются давно не использованные записи"""
+        with self._lock:
+            self._data[key] = (version, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key):
+        """Удаление записи (инвалидация после изменения данных)"""
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        """Полная очистка кэша (счетчики сохраняются)"""
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        """Текущие счетчики кэша"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'name': self.name,
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_ratio': round(self.hits / total, 4) if total else 0
+            }
+
+
+def cache_stats():
+    """Статистика всех кэшей процесса"""
+    return [cache.stats() for cache in _registry.values()]
@@ -0,0 +1,177 @@
+"""
+Настройка пула соединений с БД - параметры пула, метрики выдачи соединений
+и ограничение времени выполнения SQL запросов в рамках HTTP запроса
+"""
+
+import threading
+import time
+from flask import current_app, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import OperationalError, TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+
+
+class StatementTimeoutError(RuntimeError):
+    """SQL запрос выполнялся дольше STATEMENT_TIMEOUT_MS и был прерван"""
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool со счетчиками выдачи соединений и времени ожидания свободного соединения"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._metrics_lock = threading.Lock()
+        self.checkouts = 0
+        self.checkout_timeouts = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            return super().connect()
+        except PoolTimeoutError:
+            with self._metrics_lock:
+                self.checkout_timeouts += 1
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._metrics_lock:
+                self.checkouts += 1
+                self.wait_seconds += elapsed
+                self.max_wait_seconds = max(self.max_wait_seconds, elapsed)
+
+
+def _is_memory_sqlite(url):
+    return url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:')
+
+
+def engine_options(uri):
+    """
+    Параметры create_engine для SQLALCHEMY_ENGINE_OPTIONS по настройкам приложения
+
+    Для SQLite в памяти (один общий коннект) параметры пула не применяются.
+    """
+    if _is_memory_sqlite(make_url(uri)):
+        return {}
+    return {
+        'poolclass': TimedQueuePool,
+        'pool_size': current_app.config['DB_POOL_SIZE'],
+        'max_overflow': current_app.config['DB_MAX_OVERFLOW'],
+        'pool_timeout': current_app.config['DB_POOL_TIMEOUT'],
+        'pool_pre_ping': current_app.config['DB_POOL_PRE_PING'],
+        'pool_recycle': current_app.config['DB_POOL_RECYCLE'],
+    }
+
+
+def pool_stats(engine):
+    """Текущее состояние пула и накопленные счетчики выдачи соединений"""
+    pool = engine.pool
+    if not isinstance(pool, TimedQueuePool):
+        return {'pool': type(pool).__name__}
+    with pool._metrics_lock:
+        checkouts = pool.checkouts
+        result = {
+            'pool': type(pool).__name__,
+            'size': pool.size(),
+            'checked_out': pool.checkedout(),
+            'overflow': pool.overflow(),
+            'checked_in': pool.checkedin(),
+            'checkouts': checkouts,
+            'checkout_timeouts': pool.checkout_timeouts,
+            'wait_seconds_total': round(pool.wait_seconds, 4),
+            'wait_seconds_max': round(pool.max_wait_seconds, 4),
+        }
+    result['wait_seconds_avg'] = round(result['wait_seconds_total'] / checkouts, 6) if checkouts else 0
+    return result
+
+
+def _statement_limited(context):
+    """Ограничивается ли запрос: только в рамках HTTP запроса и без execution_options(statement_timeout=False)"""
+    return has_request_context() and (
+        context is None or context.execution_options.get('statement_timeout', True))
+
+
+def install_statement_timeout(engine):
+    """
+    Ограничение времени выполнения SQL запросов (STATEMENT_TIMEOUT_MS, 0 - без ограничения)
+
+    Ограничиваются только запросы, выполняемые в рамках HTTP запроса (CLI команды
+    и фоновые задачи не ограничиваются), на обоих диалектах. Потоковое чтение (выгрузки)
+    отключает ограничение опцией execution_options(statement_timeout=False).
+
+    SQLite: progress handler прерывает запрос после истечения срока.
+    PostgreSQL: SET LOCAL statement_timeout перед первым запросом транзакции (и при смене
+    режима внутри нее) - значение действует до конца транзакции и не остается на соединении.
+    Прерванный запрос превращается в StatementTimeoutError.
+    """
+    timeout_ms = current_app.config['STATEMENT_TIMEOUT_MS']
+    if not timeout_ms:
+        return False
+
+    dialect = engine.dialect.name
+    if dialect == 'sqlite':
+        @event.listens_for(engine, 'connect')
+        def set_progress_handler(dbapi_connection, connection_record):
+            info = connection_record.info
+
+            def check_deadline():
+                deadline = info.get('statement_deadline')
+                # Ненулевой результат прерывает текущий запрос (sqlite3.OperationalError: interrupted)
+                return 1 if deadline is not None and time.monotonic() > deadline else 0
+
+            dbapi_connection.set_progress_handler(check_deadline, 1000)
+
+        @event.listens_for(engine, 'before_cursor_execute')
+        def set_deadline(conn, cursor, statement, parameters, context, executemany):
+            limited = _statement_limited(context)
+            conn.info['statement_deadline'] = time.monotonic() + timeout_ms / 1000 if limited else None
+
+        @event.listens_for(engine, 'checkin')
+        def clear_deadline(dbapi_connection, connection_record):
+            connection_record.info.pop('statement_deadline', None)
+
+    elif dialect == 'postgresql':
+        @event.listens_for(engine, 'before_cursor_execute')
+        def set_local_timeout(conn, cursor, statement, parameters, context, executemany):
+            # Вне HTTP запроса действует значение сервера по умолчанию
+            if not has_request_context():
+                return
+            value = int(timeout_ms) if _statement_limited(context) else 0
+            # Значение уже установлено в текущей транзакции (0 - без ограничения)
+            if conn.info.get('statement_timeout') == value:
+                return
+            # Отдельный курсор: основной может быть серверным (stream_results) и принимает один запрос
+            local_cursor = conn.connection.cursor()
+            try:
+                local_cursor.execute(f'SET LOCAL statement_timeout = {value}')
+            finally:
+                local_cursor.close()
+            conn.info['statement_timeout'] = value
+
+        # SET LOCAL заканчивается вместе с транзакцией (или откатывается с точкой сохранения)
+        @event.listens_for(engine, 'commit')
+        @event.listens_for(engine, 'rollback')
+        def clear_local_timeout(conn):
+            conn.info.pop('statement_timeout', None)
+
+        @event.listens_for(engine, 'rollback_savepoint')
+        def clear_savepoint_timeout(conn, name, context):
+            conn.info.pop('statement_timeout', None)
+
+        @event.listens_for(engine, 'checkin')
+        def clear_returned_timeout(dbapi_connection, connection_record):
+            connection_record.info.pop('statement_timeout', None)
+    else:
+        return False
+
+    @event.listens_for(engine, 'handle_error')
+    def convert_timeout(context):
+        original = context.original_exception
+        message = str(original).lower()
+        if isinstance(context.sqlalchemy_exception, OperationalError) and (
+                'interrupted' in message or 'statement timeout' in message):
+            return StatementTimeoutError(f'Statement exceeded {timeout_ms} ms')
+
+    return True
@@ -0,0 +1,216 @@
+"""
+Маршрутизация чтения на реплику БД
+
+Сервисы, которые только читают (статистика, списки тестов, тест по ссылке),
+оборачиваются в read_replica - их SELECT запросы уходят на bind 'replica'.
+Запись, flush и любые не-SELECT запросы всегда идут на основную БД.
+
+Read-your-writes: пользователь, который недавно что-то записал (попытка, тест),
+READ_YOUR_WRITES_SECONDS секунд читает с основной БД, чтобы не увидеть
+отстающую реплику. Отметки хранятся в памяти процесса.
+
+Если реплика не настроена, все запросы идут на основную БД.
+
+Локальная копия SQLite (READ_REPLICA_SQLITE_COPY) сама не обновляется: ее нужно
+обновлять командой sync-replica по расписанию (например, cron раз в минуту).
+Копия старше READ_REPLICA_MAX_STALENESS_SECONDS не используется.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from flask import current_app, g, has_request_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+REPLICA_BIND = 'replica'
+
+# Включена ли маршрутизация чтения на реплику в текущем контексте
+_use_replica = ContextVar('use_replica', default=False)
+
+# Как часто перечитывается время изменения локальной копии SQLite (секунды)
+REPLICA_MTIME_CHECK_SECONDS = 1.0
+
+# Время изменения файлов копий: path -> (время проверки, mtime или None)
+_replica_mtimes = {}
+
+# Время последней записи пользователя: user_id -> timestamp
+_recent_writes = {}
+_recent_writes_lock = threading.Lock()
+
+
+class RoutingSession(Session):
+    """
+    Сессия, отправляющая SELECT запросы внутри read_replica на реплику
+
+    Используются только аргументы get_bind: flush получает соединение через
+    get_bind(mapper) без clause, поэтому запись никогда не уходит на реплику.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (bind is None and _use_replica.get()
+                and clause is not None and getattr(clause, 'is_select', False)):
+            replica = current_app.extensions['sqlalchemy'].engines.get(REPLICA_BIND)
+            if replica is not None and _replica_fresh(replica):
+                return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def _replica_fresh(engine):
+    """
+    Локальная копия SQLite не старше READ_REPLICA_MAX_STALENESS_SECONDS
+
+    Копия обновляется только sync_sqlite_replica (командой sync-replica и после init-db),
+    время обновления - время изменения файла. Устаревшая копия не используется,
+    чтение идет с основной БД. Настоящая реплика (DATABASE_REPLICA_URL) не проверяется.
+    Время изменения файла кэшируется на REPLICA_MTIME_CHECK_SECONDS (без stat на каждый SELECT).
+    """
+    max_staleness = current_app.config['READ_REPLICA_MAX_STALENESS_SECONDS']
+    if current_app.config['DATABASE_REPLICA_URL'] or not max_staleness:
+        return True
+    path = _sqlite_path(engine.url)
+    if path is None:
+        return False
+    synced_at = _replica_mtime(path)
+    return synced_at is not None and time.time() - synced_at <= max_staleness
+
+
+def _replica_mtime(path):
+    """Время изменения файла копии (None - файла нет) с кэшем на REPLICA_MTIME_CHECK_SECONDS"""
+    now = time.monotonic()
+    cached = _replica_mtimes.get(path)
+    if cached is not None and now - cached[0] < REPLICA_MTIME_CHECK_SECONDS:
+        return cached[1]
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        mtime = None
+    _replica_mtimes[path] = (now, mtime)
+    return mtime
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _remember_writers(session, flush_context):
+    """Отметка пользователей, чьи данные только что изменились"""
+    user_ids = set()
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        # Попытки и тесты хранят владельца в user_id
+        user_id = getattr(obj, 'user_id', None)
+        if user_id is not None:
+            user_ids.add(user_id)
+    if has_request_context() and g.get('user_id') is not None:
+        user_ids.add(g.user_id)
+    if user_ids:
+        mark_recent_write(*user_ids)
+
+
+def mark_recent_write(*user_ids):
+    """Чтение данных пользователей с основной БД в течение READ_YOUR_WRITES_SECONDS"""
+    now = time.monotonic()
+    window = current_app.config['READ_YOUR_WRITES_SECONDS']
+    with _recent_writes_lock:
+        # Старые отметки больше не влияют на маршрутизацию
+        if len(_recent_writes) > 10000:
+            for user_id in [u for u, t in _recent_writes.items() if now - t > window]:
+                del _recent_writes[user_id]
+        for user_id in user_ids:
+            _recent_writes[user_id] = now
+
+
+def _wrote_recently(user_id):
+    written_at = _recent_writes.get(user_id)
+    return written_at is not None and time.monotonic() - written_at < current_app.config['READ_YOUR_WRITES_SECONDS']
+
+
+@contextmanager
+def replica_reads():
+    """Контекст, в котором SELECT запросы идут на реплику (если она настроена)"""
+    user_id = g.get('user_id') if has_request_context() else None
+    if user_id is not None and _wrote_recently(user_id):
+        yield
+        return
+    token = _use_replica.set(True)
+    try:
+        yield
+    finally:
+        _use_replica.reset(token)
+
+
+def read_replica(f):
+    """Декоратор для функций, которые только читают данные"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        with replica_reads():
+            return f(*args, **kwargs)
+    return decorated_function
+
+
+@contextmanager
+def primary_reads():
+    """Контекст, в котором все запросы идут на основную БД (даже внутри read_replica)"""
+    token = _use_replica.set(False)
+    try:
+        yield
+    finally:
+        _use_replica.reset(token)
+
+
+def read_primary(f):
+    """Декоратор для функций, которым нужны актуальные данные (например, пересчет агрегатов)"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        with primary_reads():
+            return f(*args, **kwargs)
+    return decorated_function
+
+
+def replica_binds(primary_uri):
+    """
+    SQLALCHEMY_BINDS с репликой по настройкам приложения
+
+    DATABASE_REPLICA_URL - адрес реплики; READ_REPLICA_SQLITE_COPY - локальная копия
+    основной SQLite БД (для проверки маршрутизации без настоящей репликации).
+    """
+    if current_app.config['DATABASE_REPLICA_URL']:
+        return {REPLICA_BIND: current_app.config['DATABASE_REPLICA_URL']}
+    if current_app.config['READ_REPLICA_SQLITE_COPY']:
+        primary_path = _sqlite_path(primary_uri)
+        if primary_path:
+            root, ext = os.path.splitext(primary_path)
+            return {REPLICA_BIND: f'sqlite:///{root}_replica{ext or ".db"}'}
+    return {}
+
+
+def _sqlite_path(uri):
+    url = make_url(uri)
+    if url.get_backend_name() != 'sqlite' or url.database in (None, '', ':memory:'):
+        return None
+    return url.database
+
+
+def sync_sqlite_replica(primary_uri, replica_uri):
+    """
+    Копирование основной SQLite БД в файл реплики (backup API, без остановки записи)
+
+    Returns:
+        bool: True если копия обновлена
+    """
+    primary_path, replica_path = _sqlite_path(primary_uri), _sqlite_path(replica_uri)
+    if not primary_path or not replica_path:
+        return False
+    source = sqlite3.connect(primary_path)
+    target = sqlite3.connect(replica_path)
+    try:
+        source.backup(target)
+    finally:
+        target.close()
+        source.close()
+    # Время изменения файла - время последнего обновления копии (см. _replica_fresh)
+    os.utime(replica_path)
+    _replica_mtimes.pop(replica_path, None)
+    return True
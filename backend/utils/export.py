@@ -0,0 +1,102 @@
+"""
+Потоковая выгрузка попыток в CSV и NDJSON
+
+Генераторы принимают попытки из stats_service.export_test_attempts и отдают
+текст частями около CHUNK_SIZE байт - ответ отправляется клиенту по мере чтения
+из БД, память не зависит от количества попыток.
+"""
+
+import csv
+import io
+import json
+import zlib
+from datetime import datetime, timezone
+
+CHUNK_SIZE = 64 * 1024
+
+# Одна строка CSV - один ответ (попытка без ответов - одна строка с пустыми полями ответа)
+CSV_COLUMNS = (
+    'attempt_id', 'user_id', 'user_name', 'started_at', 'finished_at', 'score',
+    'question_id', 'order_index', 'question_type', 'question_text', 'user_answer', 'is_correct'
+)
+
+# Начало ячейки, которое табличные редакторы считают формулой
+_FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def parse_since(value):
+    """
+    Разбор параметра since (ISO 8601) в наивное время UTC, как в БД
+
+    Raises:
+        ValueError: Если значение не является датой/временем ISO 8601
+    """
+    try:
+        since = datetime.fromisoformat(value.strip().replace('Z', '+00:00'))
+    except (ValueError, AttributeError):
+        raise ValueError('since must be an ISO 8601 datetime')
+    if since.tzinfo is not None:
+        since = since.astimezone(timezone.utc).replace(tzinfo=None)
+    return since
+
+
+def _safe_cell(value):
+    """Текст пользователя не должен исполняться как формула при открытии CSV"""
+    if isinstance(value, str) and value.startswith(_FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def _csv_answer(user_answer):
+    if user_answer is None or isinstance(user_answer, str):
+        return user_answer
+    return json.dumps(user_answer, ensure_ascii=False)
+
+
+def csv_chunks(attempts):
+    """CSV с заголовком: строка на каждый ответ каждой попытки"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_COLUMNS)
+    for attempt in attempts:
+        head = (attempt['attempt_id'], attempt['user_id'], _safe_cell(attempt['user_name']),
+                attempt['started_at'], attempt['finished_at'], attempt['score'])
+        if not attempt['answers']:
+            writer.writerow(head + (None,) * 6)
+        for answer in attempt['answers']:
+            writer.writerow(head + (
+                answer['question_id'], answer['order_index'], answer['question_type'],
+                _safe_cell(answer['question_text']), _safe_cell(_csv_answer(answer['user_answer'])),
+                answer['is_correct']
+            ))
+        if buffer.tell() >= CHUNK_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def ndjson_chunks(attempts):
+    """NDJSON: одна попытка с вложенными ответами на строку"""
+    lines = []
+    size = 0
+    for attempt in attempts:
+        line = json.dumps(attempt, ensure_ascii=False) + '\n'
+        lines.append(line)
+        size += len(line)
+        if size >= CHUNK_SIZE:
+            yield ''.join(lines)
+            lines, size = [], 0
+    if lines:
+        yield ''.join(lines)
+
+
+def gzip_chunks(chunks):
+    """Сжатие потока частей в gzip без накопления всего ответа"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
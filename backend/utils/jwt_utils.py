@@ -3,44 +3,128 @@
 """
 
 import jwt
-from datetime import datetime, timedelta
+import secrets
+import time
+import threading
 from functools import wraps
-from flask import request
+from flask import current_app, request, g
 from config import Config
+from .cache import LRUCache
 from .responses import error_response
 
+# Кэш проверенных токенов: token -> (user_id, issued_at, token_id, cached_until)
+# Повторная проверка подписи и exp для одного и того же токена не нужна до cached_until
+_verified_tokens = LRUCache('verified_tokens', Config.TOKEN_CACHE_SIZE)
+
+# Отозванные токены (выход из системы): jti -> exp, хранятся до истечения срока
+# Отзыв действует в пределах процесса - при нескольких воркерах каждый ведет свой список
+_revoked_tokens = {}
+# Время, до которого выданные токены пользователя недействительны (смена пароля):
+# user_id -> timestamp с долями секунды (iat новых токенов тоже с долями секунды)
+_revoked_before = {}
+_revoke_lock = threading.Lock()
+
 def create_token(user_id):
+    now = time.time()
     payload = {
         'user_id': user_id,
-        'exp': datetime.utcnow() + timedelta(hours=Config.JWT_EXPIRATION_HOURS)
+        'jti': secrets.token_hex(8),
+        'iat': now,
+        'exp': int(now) + current_app.config['JWT_EXPIRATION_HOURS'] * 3600
     }
-    return jwt.encode(payload, Config.SECRET_KEY, algorithm='HS256')
+    return jwt.encode(payload, current_app.config['SECRET_KEY'], algorithm='HS256')
 
 def decode_token(token):
+    """
+    Проверка токена и получение user_id (None если токен недействителен)
+
+    Результат успешной проверки кэшируется не дольше TOKEN_CACHE_TTL секунд
+    и не дольше срока действия самого токена.
+    """
+    now = time.time()
+    cached = _verified_tokens.get(token)
+    if cached is not None and now < cached[3]:
+        user_id, issued_at, token_id = cached[:3]
+    else:
+        payload = _decode_token_uncached(token)
+        if payload is None:
+            return None
+        user_id, issued_at, token_id = payload['user_id'], payload.get('iat', 0), _token_id(token, payload)
+        cached_until = min(payload['exp'], now + current_app.config['TOKEN_CACHE_TTL'])
+        _verified_tokens.set(token, (user_id, issued_at, token_id, cached_until))
+
+    if _is_revoked(token_id, user_id, issued_at):
+        return None
+    return user_id
+
+def _decode_token_uncached(token):
+    """Полная проверка токена - подпись, срок действия, наличие user_id"""
     try:
-        payload = jwt.decode(token, Config.SECRET_KEY, algorithms=['HS256'])
-        return payload['user_id']
+        payload = jwt.decode(token, current_app.config['SECRET_KEY'], algorithms=['HS256'])
     except jwt.ExpiredSignatureError:
         return None
     except jwt.InvalidTokenError:
         return None
+    if 'user_id' not in payload or 'exp' not in payload:
+        return None
+    return payload
+
+def _token_id(token, payload):
+    """Идентификатор токена для списка отзыва (токены без jti - сам токен)"""
+    return payload.get('jti') or token
+
+def _is_revoked(token_id, user_id, issued_at):
+    """Проверка отзыва токена (по идентификатору или по времени выдачи)"""
+    if token_id in _revoked_tokens:
+        return True
+    revoked_before = _revoked_before.get(user_id)
+    # Токен, выданный в ту же секунду до отзыва, тоже недействителен
+    # (у старых токенов iat целый - они отзываются вместе со всей секундой)
+    return revoked_before is not None and issued_at <= revoked_before
+
+def revoke_token(token):
+    """Отзыв одного токена (выход из системы)"""
+    payload = _decode_token_uncached(token)
+    if payload is None:
+        return
+    now = time.time()
+    with _revoke_lock:
+        # Истекшие токены больше не нужно помнить - они отклоняются проверкой exp
+        for expired in [t for t, exp in _revoked_tokens.items() if exp <= now]:
+            del _revoked_tokens[expired]
+        _revoked_tokens[_token_id(token, payload)] = payload['exp']
+    _verified_tokens.pop(token)
+
+def revoke_user_tokens(user_id):
+    """Отзыв всех ранее выданных токенов пользователя (смена пароля)"""
+    with _revoke_lock:
+        _revoked_before[user_id] = time.time()
+
+def clear_token_cache():
+    """Очистка кэша проверенных токенов (отзывы сохраняются)"""
+    _verified_tokens.clear()
+
+def get_request_token():
+    """Извлечение токена из заголовка Authorization текущего запроса (None если его нет)"""
+    auth_header = request.headers.get('Authorization')
+    if not auth_header:
+        return None
+
+    # Поддержка разных форматов токена в заголовке Authorization:
+    # 1. "Bearer {token}" - стандартный формат OAuth 2.0
+    # 2. "{token}" - упрощенный формат (используется Swagger UI)
+    if auth_header.startswith('Bearer '):
+        token = auth_header.split(' ', 1)[1]  # Берем все после "Bearer "
+    else:
+        # Если нет префикса "Bearer ", считаем что весь заголовок - это токен
+        token = auth_header.strip()
+
+    return token or None
 
 def require_auth(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        auth_header = request.headers.get('Authorization')
-        if not auth_header:
-            return error_response('Authentication required', 401)
-
-        # Поддержка разных форматов токена в заголовке Authorization:
-        # 1. "Bearer {token}" - стандартный формат OAuth 2.0
-        # 2. "{token}" - упрощенный формат (используется Swagger UI)
-        if auth_header.startswith('Bearer '):
-            token = auth_header.split(' ', 1)[1]  # Берем все после "Bearer "
-        else:
-            # Если нет префикса "Bearer ", считаем что весь заголовок - это токен
-            token = auth_header.strip()
-
+        token = get_request_token()
         if not token:
             return error_response('Authentication required', 401)
 
@@ -49,6 +133,9 @@ def require_auth(f):
         if not user_id:
             return error_response('Invalid or expired token', 401)
 
+        # Текущий пользователь запроса (read-your-writes при чтении с реплики)
+        g.user_id = user_id
+
         return f(user_id, *args, **kwargs)
 
     return decorated_function
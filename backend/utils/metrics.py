@@ -0,0 +1,369 @@
+"""
+Метрики приложения в текстовом формате Prometheus (/metrics)
+
+Сбор на каждый HTTP запрос - несколько операций со словарями под одной блокировкой:
+гистограммы задержки и времени БД по endpoint (с меткой blueprint), счетчики
+запросов и ошибок по статусу. Состояние пула соединений, кэшей, лимитера входа
+и хеширования паролей читается из их собственных счетчиков при выдаче метрик.
+
+Несколько воркеров: при заданном METRICS_MULTIPROC_DIR каждый процесс не чаще
+раза в METRICS_FLUSH_SECONDS сохраняет снимок своих метрик в файл <pid>.json,
+а /metrics суммирует снимки всех процессов. Счетчики завершившихся процессов
+сохраняются, их мгновенные значения (gauge) не выдаются. Каталог очищается
+перед запуском сервера.
+"""
+
+import atexit
+import hmac
+import ipaddress
+import json
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from flask import Response, current_app, g, request
+
+logger = logging.getLogger(__name__)
+
+# Тип и описание каждой метрики
+METRICS = {
+    'http_requests_total': ('counter', 'HTTP requests by endpoint, method and status'),
+    'http_request_errors_total': ('counter', 'HTTP responses with status >= 400 by endpoint and status'),
+    'http_request_duration_seconds': ('histogram', 'HTTP request latency by endpoint'),
+    'http_request_db_seconds': ('histogram', 'Time spent in SQL statements per HTTP request'),
+    'http_request_sql_statements_total': ('counter', 'SQL statements executed by HTTP requests'),
+    'db_pool_checkouts_total': ('counter', 'Connections checked out from the pool'),
+    'db_pool_checkout_timeouts_total': ('counter', 'Pool checkouts that timed out waiting for a connection'),
+    'db_pool_checkout_wait_seconds_total': ('counter', 'Time spent waiting for a pool connection'),
+    'db_pool_size': ('gauge', 'Configured pool size per process'),
+    'db_pool_checked_out': ('gauge', 'Connections currently checked out per process'),
+    'db_pool_overflow': ('gauge', 'Current pool overflow per process'),
+    'cache_hits_total': ('counter', 'Cache hits'),
+    'cache_misses_total': ('counter', 'Cache misses'),
+    'cache_evictions_total': ('counter', 'Cache evictions'),
+    'cache_hit_ratio': ('gauge', 'Cache hit ratio over all processes'),
+    'cache_entries': ('gauge', 'Cache entries per process'),
+    'auth_rate_limit_allowed_total': ('counter', 'Login and registration attempts allowed by the rate limiter'),
+    'auth_rate_limit_rejected_total': ('counter', 'Login and registration attempts rejected by the rate limiter'),
+    'auth_rate_limit_hashing_seconds_saved_total': ('counter', 'Estimated password hashing time avoided by rejected attempts'),
+    'password_hash_operations_total': ('counter', 'Password KDF computations'),
+    'password_hash_seconds_total': ('counter', 'Time spent computing password KDF'),
+}
+
+
+class MetricsRegistry:
+    """Метрики HTTP запросов текущего процесса"""
+
+    def __init__(self, buckets):
+        self.buckets = sorted(buckets)
+        self._lock = threading.Lock()
+        self.requests = defaultdict(int)     # (blueprint, endpoint, method, status) -> количество
+        self.errors = defaultdict(int)       # (blueprint, endpoint, status) -> количество
+        self.statements = defaultdict(int)   # (blueprint, endpoint) -> количество SQL запросов
+        self.duration = {}                   # (blueprint, endpoint) -> [счетчики корзин..., сумма, количество]
+        self.db_time = {}
+
+    def _observe(self, histogram, key, value):
+        row = histogram.get(key)
+        if row is None:
+            row = histogram[key] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+        row[bisect_left(self.buckets, value)] += 1
+        row[-2] += value
+        row[-1] += 1
+
+    def observe_request(self, blueprint, endpoint, method, status, seconds, db_seconds, statements):
+        """Учет одного HTTP запроса"""
+        key = (blueprint, endpoint)
+        with self._lock:
+            self.requests[(blueprint, endpoint, method, status)] += 1
+            if status >= 400:
+                self.errors[(blueprint, endpoint, status)] += 1
+            self._observe(self.duration, key, seconds)
+            if db_seconds is not None:
+                self._observe(self.db_time, key, db_seconds)
+                self.statements[key] += statements
+
+    def snapshot(self):
+        """Снимок метрик HTTP запросов в виде, пригодном для JSON"""
+        endpoint_labels = ('blueprint', 'endpoint')
+        with self._lock:
+            return {
+                'counters': {
+                    'http_requests_total': [
+                        [dict(zip(endpoint_labels + ('method', 'status'), key[:3] + (str(key[3]),))), value]
+                        for key, value in self.requests.items()
+                    ],
+                    'http_request_errors_total': [
+                        [dict(zip(endpoint_labels + ('status',), key[:2] + (str(key[2]),))), value]
+                        for key, value in self.errors.items()
+                    ],
+                    'http_request_sql_statements_total': [
+                        [dict(zip(endpoint_labels, key)), value] for key, value in self.statements.items()
+                    ],
+                },
+                'histograms': {
+                    'http_request_duration_seconds': [
+                        [dict(zip(endpoint_labels, key)), list(row)] for key, row in self.duration.items()
+                    ],
+                    'http_request_db_seconds': [
+                        [dict(zip(endpoint_labels, key)), list(row)] for key, row in self.db_time.items()
+                    ],
+                },
+            }
+
+
+def _process_samples(engines):
+    """Счетчики и мгновенные значения пула, кэшей, лимитера и хеширования этого процесса"""
+    from .cache import cache_stats
+    from .db_pool import pool_stats
+    from .password import get_hashing_stats
+    from .rate_limit import get_auth_limiter
+
+    counters = defaultdict(list)
+    gauges = defaultdict(list)
+
+    for bind, engine in engines.items():
+        stats = pool_stats(engine)
+        if 'checkouts' not in stats:
+            continue
+        labels = {'bind': bind or 'default'}
+        counters['db_pool_checkouts_total'].append([labels, stats['checkouts']])
+        counters['db_pool_checkout_timeouts_total'].append([labels, stats['checkout_timeouts']])
+        counters['db_pool_checkout_wait_seconds_total'].append([labels, stats['wait_seconds_total']])
+        gauges['db_pool_size'].append([labels, stats['size']])
+        gauges['db_pool_checked_out'].append([labels, stats['checked_out']])
+        gauges['db_pool_overflow'].append([labels, stats['overflow']])
+
+    for stats in cache_stats():
+        labels = {'cache': stats['name']}
+        counters['cache_hits_total'].append([labels, stats['hits']])
+        counters['cache_misses_total'].append([labels, stats['misses']])
+        counters['cache_evictions_total'].append([labels, stats['evictions']])
+        gauges['cache_entries'].append([labels, stats['size']])
+
+    if current_app.config['RATE_LIMIT_ENABLED']:
+        stats = get_auth_limiter().stats()
+        counters['auth_rate_limit_allowed_total'].append([{}, stats['allowed']])
+        counters['auth_rate_limit_rejected_total'].append([{'key': 'ip'}, stats['rejected_ip']])
+        counters['auth_rate_limit_rejected_total'].append([{'key': 'email'}, stats['rejected_email']])
+        counters['auth_rate_limit_hashing_seconds_saved_total'].append([{}, stats['hashing_seconds_saved']])
+
+    stats = get_hashing_stats()
+    counters['password_hash_operations_total'].append([{}, stats['operations']])
+    counters['password_hash_seconds_total'].append([{}, stats['total_seconds']])
+    return counters, gauges
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class MetricsCollector:
+    """Метрики процесса, сохранение снимков и сборка ответа /metrics"""
+
+    def __init__(self, app):
+        self.app = app
+        self.registry = MetricsRegistry(app.config['METRICS_LATENCY_BUCKETS'])
+        self.multiproc_dir = app.config['METRICS_MULTIPROC_DIR']
+        self._last_flush = time.monotonic()
+        self._flush_lock = threading.Lock()
+
+    def snapshot(self):
+        """Полный снимок метрик процесса"""
+        from backend.models import db
+
+        data = self.registry.snapshot()
+        data['pid'] = os.getpid()
+        data['buckets'] = self.registry.buckets
+        counters, gauges = _process_samples(db.engines)
+        data['counters'].update(counters)
+        data['gauges'] = gauges
+        return data
+
+    def maybe_flush(self):
+        """Сохранение снимка, если прошло METRICS_FLUSH_SECONDS (без ожидания других потоков)"""
+        if not self.multiproc_dir or time.monotonic() - self._last_flush < self.app.config['METRICS_FLUSH_SECONDS']:
+            return
+        if not self._flush_lock.acquire(blocking=False):
+            return
+        try:
+            self._last_flush = time.monotonic()
+            self.flush()
+        finally:
+            self._flush_lock.release()
+
+    def flush(self):
+        """Запись снимка процесса в METRICS_MULTIPROC_DIR/<pid>.json"""
+        if not self.multiproc_dir:
+            return
+        try:
+            with self.app.app_context():
+                data = self.snapshot()
+            os.makedirs(self.multiproc_dir, exist_ok=True)
+            path = os.path.join(self.multiproc_dir, f'{data["pid"]}.json')
+            tmp_path = f'{path}.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning('Could not write metrics snapshot to %s: %s', self.multiproc_dir, e)
+
+    def _snapshots(self):
+        """Снимки всех процессов; для текущего - актуальные значения"""
+        own = self.snapshot()
+        snapshots = [own]
+        if not self.multiproc_dir or not os.path.isdir(self.multiproc_dir):
+            return snapshots
+        for name in os.listdir(self.multiproc_dir):
+            if not name.endswith('.json') or name == f'{own["pid"]}.json':
+                continue
+            try:
+                with open(os.path.join(self.multiproc_dir, name), encoding='utf-8') as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if data.get('buckets') != own['buckets']:
+                # Снимок с другими корзинами гистограмм - гистограммы не складываются
+                data['histograms'] = {}
+            if not _pid_alive(data.get('pid', 0)):
+                data['gauges'] = {}
+            snapshots.append(data)
+        return snapshots
+
+    def render(self):
+        """Метрики всех процессов в текстовом формате Prometheus"""
+        snapshots = self._snapshots()
+        buckets = snapshots[0]['buckets']
+        counters = defaultdict(lambda: defaultdict(float))
+        histograms = defaultdict(dict)
+        gauges = defaultdict(dict)
+
+        for data in snapshots:
+            for name, samples in data['counters'].items():
+                for labels, value in samples:
+                    counters[name][_label_key(labels)] += value
+            for name, samples in data['histograms'].items():
+                for labels, row in samples:
+                    merged = histograms[name].setdefault(_label_key(labels), [0] * len(row))
+                    for i, value in enumerate(row):
+                        merged[i] += value
+            for name, samples in data['gauges'].items():
+                for labels, value in samples:
+                    gauges[name][_label_key(dict(labels, pid=str(data['pid'])))] = value
+
+        # Доля попаданий по всем процессам
+        for key, hits in counters.get('cache_hits_total', {}).items():
+            total = hits + counters['cache_misses_total'].get(key, 0)
+            gauges['cache_hit_ratio'][key] = hits / total if total else 0
+
+        lines = []
+        for name, (kind, help_text) in METRICS.items():
+            if name in counters:
+                samples = [(name, key, value) for key, value in sorted(counters[name].items())]
+            elif name in histograms:
+                samples = _histogram_samples(name, sorted(histograms[name].items()), buckets)
+            elif name in gauges:
+                samples = [(name, key, value) for key, value in sorted(gauges[name].items())]
+            else:
+                continue
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            for sample_name, key, value in samples:
+                lines.append(f'{sample_name}{_format_labels(key)} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _histogram_samples(name, rows, buckets):
+    """Строки _bucket (накопительно), _sum и _count для каждого набора меток"""
+    samples = []
+    for key, row in rows:
+        cumulative = 0
+        for bound, count in zip(buckets + ['+Inf'], row[:-2]):
+            cumulative += count
+            samples.append((f'{name}_bucket', key + (('le', str(bound)),), cumulative))
+        samples.append((f'{name}_sum', key, row[-2]))
+        samples.append((f'{name}_count', key, row[-1]))
+    return samples
+
+
+def _format_labels(key):
+    if not key:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in key) + '}'
+
+
+def _escape(value):
+    """Экранирование значения метки (обратная косая черта, кавычка, перевод строки)"""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_value(value):
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def _metrics_access_allowed():
+    """
+    Доступ к /metrics: с METRICS_TOKEN - по заголовку Authorization: Bearer,
+    без токена - только с локального адреса (loopback)
+    """
+    token = current_app.config['METRICS_TOKEN']
+    if token:
+        return hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}')
+    try:
+        return ipaddress.ip_address(request.remote_addr or '').is_loopback
+    except ValueError:
+        return False
+
+
+def init_metrics(app):
+    """
+    Сбор метрик HTTP запросов и маршрут /metrics
+
+    Вызывается до остальных обработчиков before_request, чтобы задержка
+    учитывала их время. Время тела потокового ответа не учитывается.
+    """
+    if not app.config['METRICS_ENABLED']:
+        return
+    collector = MetricsCollector(app)
+    app.extensions['metrics'] = collector
+
+    @app.before_request
+    def start_request_timer():
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def record_request(response):
+        started = g.get('request_started')
+        if started is not None:
+            sql_stats = g.get('sql_stats')
+            collector.registry.observe_request(
+                request.blueprint or '', request.endpoint or '', request.method, response.status_code,
+                time.perf_counter() - started,
+                sql_stats.seconds if sql_stats is not None else None,
+                sql_stats.count if sql_stats is not None else 0
+            )
+            collector.maybe_flush()
+        return response
+
+    def metrics():
+        """Метрики в текстовом формате Prometheus"""
+        if not _metrics_access_allowed():
+            return Response('Forbidden\n', status=403, mimetype='text/plain')
+        return Response(collector.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+    app.add_url_rule('/metrics', 'metrics', metrics)
+    atexit.register(collector.flush)
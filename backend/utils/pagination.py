@@ -0,0 +1,79 @@
+"""
+Утилиты для курсорной (keyset) пагинации списков API
+"""
+
+import base64
+import json
+from datetime import datetime
+from sqlalchemy import and_, or_
+
+
+def encode_cursor(timestamp, row_id):
+    """
+    Формирование непрозрачного курсора из позиции последней строки страницы
+
+    Args:
+        timestamp: Значение колонки сортировки (created_at / started_at), может быть None
+        row_id: ID строки (разрешает совпадения по времени)
+
+    Returns:
+        str: Курсор в формате base64url без паддинга
+    """
+    raw = json.dumps([timestamp.isoformat() if timestamp else None, row_id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    Разбор курсора, полученного от клиента
+
+    Returns:
+        tuple: (timestamp, row_id) - timestamp равен None, если у строки нет значения сортировки
+
+    Raises:
+        ValueError: Если курсор поврежден или сформирован не сервером
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        timestamp, row_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if not isinstance(row_id, int):
+            raise TypeError
+        return (datetime.fromisoformat(timestamp) if timestamp is not None else None), row_id
+    except (ValueError, TypeError, UnicodeDecodeError):
+        raise ValueError('Invalid cursor')
+
+
+def keyset_page(query, time_column, id_column, position, limit):
+    """
+    Страница запроса с сортировкой (time_column DESC NULLS LAST, id_column DESC) после позиции курсора
+
+    Args:
+        query: SQLAlchemy запрос с уже примененными фильтрами
+        position: Разобранный курсор (timestamp, row_id) или None для первой страницы
+        limit: Размер страницы
+
+    Returns:
+        tuple: (rows, next_cursor) - next_cursor равен None на последней странице
+    """
+    if position is not None:
+        timestamp, row_id = position
+        # Строки строго "после" курсора в порядке убывания (time, id); строки без времени идут последними
+        if timestamp is None:
+            query = query.filter(time_column.is_(None), id_column < row_id)
+        else:
+            query = query.filter(or_(
+                time_column < timestamp,
+                and_(time_column == timestamp, id_column < row_id),
+                time_column.is_(None)
+            ))
+
+    # Берем на одну строку больше, чтобы узнать, есть ли следующая страница
+    order = (time_column.desc().nulls_last(), id_column.desc())
+    rows = query.order_by(*order).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(getattr(last, time_column.key), getattr(last, id_column.key))
+    return rows, next_cursor
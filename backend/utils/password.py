@@ -1,17 +1,117 @@
 """
 Утилиты для работы с паролями
+
+Хеширование и проверка выполняются в ограниченном пуле потоков: одновременно
+работает не больше PASSWORD_HASH_WORKERS вычислений KDF, еще PASSWORD_HASH_QUEUE_SIZE
+могут ждать в очереди. Если очередь заполнена дольше PASSWORD_HASH_WAIT_TIMEOUT
+секунд, выбрасывается PasswordHashingBusyError (ответ 503 с Retry-After).
 """
 
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
 from werkzeug.security import generate_password_hash, check_password_hash
 
+
+class PasswordHashingBusyError(RuntimeError):
+    """Пул хеширования паролей перегружен - запрос нужно повторить позже"""
+
+
+_executor = None
+_slots = None
+# Канонический вид метода хеширования: PASSWORD_HASH_METHOD -> префикс хеша
+_canonical_methods = {}
+_init_lock = threading.Lock()
+
+# Счетчики вычислений KDF (для оценки сэкономленного времени при отклонении запросов)
+_stats = {'operations': 0, 'seconds': 0.0}
+_stats_lock = threading.Lock()
+
+
+def _get_executor():
+    """Ленивое создание пула (после fork воркера, а не при импорте)"""
+    global _executor, _slots
+    if _executor is None:
+        with _init_lock:
+            if _executor is None:
+                _slots = threading.BoundedSemaphore(
+                    current_app.config['PASSWORD_HASH_WORKERS'] + current_app.config['PASSWORD_HASH_QUEUE_SIZE']
+                )
+                _executor = ThreadPoolExecutor(
+                    max_workers=current_app.config['PASSWORD_HASH_WORKERS'],
+                    thread_name_prefix='password-hash'
+                )
+    return _executor
+
+
+def _run(func, *args):
+    """Выполнение функции KDF в пуле с ограничением очереди"""
+    executor = _get_executor()
+    if not _slots.acquire(timeout=current_app.config['PASSWORD_HASH_WAIT_TIMEOUT']):
+        raise PasswordHashingBusyError('Password hashing queue is full')
+    try:
+        future = executor.submit(_timed, func, *args)
+    except Exception:
+        _slots.release()
+        raise
+    future.add_done_callback(lambda _: _slots.release())
+    return future.result()
+
+
+def _timed(func, *args):
+    """Выполнение функции KDF с учетом затраченного времени"""
+    started = time.perf_counter()
+    try:
+        return func(*args)
+    finally:
+        elapsed = time.perf_counter() - started
+        with _stats_lock:
+            _stats['operations'] += 1
+            _stats['seconds'] += elapsed
+
+
+def get_hashing_stats():
+    """Количество вычислений KDF и затраченное на них время в этом процессе"""
+    with _stats_lock:
+        operations, seconds = _stats['operations'], _stats['seconds']
+    return {
+        'operations': operations,
+        'total_seconds': round(seconds, 4),
+        'average_seconds': round(seconds / operations, 6) if operations else 0
+    }
+
+
 def hash_password(password):
     """
     Хеширование пароля для безопасного хранения
     """
-    return generate_password_hash(password)
+    return _run(generate_password_hash, password, current_app.config['PASSWORD_HASH_METHOD'])
+
 
 def verify_password(password, password_hash):
     """
     Проверка пароля путем сравнения с хешем
     """
-    return check_password_hash(password_hash, password)
+    return _run(check_password_hash, password_hash, password)
+
+
+def current_hash_method():
+    """
+    Полная строка метода для текущей политики (например 'scrypt:32768:8:1')
+
+    PASSWORD_HASH_METHOD может быть задан без параметров ('scrypt'), поэтому
+    канонический вид берется из префикса реального хеша (вычисляется один раз на метод).
+    """
+    method = current_app.config['PASSWORD_HASH_METHOD']
+    canonical = _canonical_methods.get(method)
+    if canonical is None:
+        canonical = _canonical_methods[method] = generate_password_hash('', method).split('$', 1)[0]
+    return canonical
+
+
+def needs_rehash(password_hash):
+    """Проверка, создан ли хеш по устаревшей политике (другой метод или стоимость)"""
+    if not password_hash or '$' not in password_hash:
+        return True
+    return password_hash.split('$', 1)[0] != current_hash_method()
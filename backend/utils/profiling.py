@@ -0,0 +1,214 @@
+"""
+Профилирование отдельных HTTP запросов по требованию
+
+Запрос профилируется, если в нем передан заголовок X-Profile с токеном PROFILE_TOKEN
+или он попал в выборку PROFILE_SAMPLE_RATE. Режимы (PROFILE_MODE):
+    cprofile - детерминированный профилировщик, результат <id>.pstats
+    sampling - снимки стека потока запроса раз в PROFILE_SAMPLE_INTERVAL_MS,
+               результат <id>.collapsed (формат flamegraph.pl / speedscope)
+Рядом сохраняется <id>.json: endpoint, статус, длительность и время каждого SQL запроса.
+
+Накладные расходы ограничены: в процессе одновременно профилируется не больше
+одного запроса, в каталоге PROFILE_DIR хранятся последние PROFILE_MAX_ARTIFACTS профилей.
+"""
+
+import cProfile
+import hmac
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from flask import current_app, g, request
+from config import BASE_DIR
+from .sql_instrumentation import count_statements
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = 'X-Profile'
+ARTIFACT_EXTENSIONS = ('.pstats', '.collapsed', '.json')
+
+# Одновременно профилируется один запрос на процесс
+_slot = threading.Lock()
+
+
+class StackSampler:
+    """Периодические снимки стека одного потока (свернутые стеки: 'a;b;c' -> количество)"""
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profile-sampler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_name} ({_short_path(code.co_filename)}:{code.co_firstlineno})')
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def dump(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f'{stack} {count}\n')
+
+
+def _short_path(filename):
+    """Путь относительно проекта (файлы библиотек - от site-packages)"""
+    if filename.startswith(BASE_DIR):
+        return os.path.relpath(filename, BASE_DIR)
+    marker = 'site-packages' + os.sep
+    index = filename.find(marker)
+    return filename[index + len(marker):] if index >= 0 else os.path.basename(filename)
+
+
+def _requested():
+    """Нужно ли профилировать текущий запрос; 'header' или 'sample'"""
+    token = current_app.config['PROFILE_TOKEN']
+    header = request.headers.get(PROFILE_HEADER)
+    if token and header and hmac.compare_digest(header, token):
+        return 'header'
+    sample_rate = current_app.config['PROFILE_SAMPLE_RATE']
+    if sample_rate > 0 and random.random() < sample_rate:
+        return 'sample'
+    return None
+
+
+def _start():
+    trigger = _requested()
+    if trigger is None or not _slot.acquire(blocking=False):
+        return
+    if current_app.config['PROFILE_MODE'] == 'sampling':
+        profiler = StackSampler(threading.get_ident(), current_app.config['PROFILE_SAMPLE_INTERVAL_MS'] / 1000)
+        profiler.start()
+    else:
+        profiler = cProfile.Profile()
+        profiler.enable()
+    sql = count_statements(timings=True)
+    g.profile = {
+        'trigger': trigger,
+        'profiler': profiler,
+        'sql': sql,
+        'sql_stats': sql.__enter__(),
+        'started': time.perf_counter(),
+        'id': f'{datetime.utcnow():%Y%m%dT%H%M%S%f}-{os.getpid()}-{request.endpoint or "none"}',
+    }
+
+
+def _finish(profile, status):
+    """Остановка профилировщика и запись артефактов"""
+    try:
+        profiler = profile['profiler']
+        if isinstance(profiler, StackSampler):
+            profiler.stop()
+        else:
+            profiler.disable()
+        profile['sql'].__exit__(None, None, None)
+        duration = time.perf_counter() - profile['started']
+
+        # Запросы из выборки быстрее порога не сохраняются
+        if profile['trigger'] == 'sample' and duration * 1000 < current_app.config['PROFILE_MIN_DURATION_MS']:
+            return
+        _write_artifacts(profile, status, duration)
+    except OSError as e:
+        logger.warning('Could not write profile to %s: %s', current_app.config['PROFILE_DIR'], e)
+    finally:
+        _slot.release()
+
+
+def _write_artifacts(profile, status, duration):
+    directory = current_app.config['PROFILE_DIR']
+    os.makedirs(directory, exist_ok=True)
+    base = os.path.join(directory, profile['id'])
+
+    profiler = profile['profiler']
+    if isinstance(profiler, StackSampler):
+        profiler.dump(base + '.collapsed')
+    else:
+        profiler.dump_stats(base + '.pstats')
+
+    sql_stats = profile['sql_stats']
+    meta = {
+        'id': profile['id'],
+        'trigger': profile['trigger'],
+        'mode': 'sampling' if isinstance(profiler, StackSampler) else 'cprofile',
+        'method': request.method,
+        'path': request.path,
+        'endpoint': request.endpoint,
+        'status': status,
+        'duration_ms': round(duration * 1000, 3),
+        'sql_count': sql_stats.count,
+        'sql_ms': round(sql_stats.seconds * 1000, 3),
+        'sql': sorted((
+            {'statement': statement, 'count': count, 'total_ms': round(total * 1000, 3),
+             'max_ms': round(longest * 1000, 3)}
+            for statement, (count, total, longest) in sql_stats.timings.items()
+        ), key=lambda item: item['total_ms'], reverse=True),
+    }
+    with open(base + '.json', 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+    logger.info('Profiled %s %s (%s, %.1f ms) -> %s', request.method, request.path,
+                profile['trigger'], duration * 1000, base)
+    prune_artifacts(directory, current_app.config['PROFILE_MAX_ARTIFACTS'])
+
+
+def prune_artifacts(directory, keep):
+    """Удаление старых профилей - остаются последние keep (по времени изменения)"""
+    groups = {}
+    for name in os.listdir(directory):
+        stem, ext = os.path.splitext(name)
+        if ext in ARTIFACT_EXTENSIONS:
+            path = os.path.join(directory, name)
+            groups[stem] = max(groups.get(stem, 0), os.path.getmtime(path))
+    for stem in sorted(groups, key=groups.get, reverse=True)[keep:]:
+        for ext in ARTIFACT_EXTENSIONS:
+            try:
+                os.remove(os.path.join(directory, stem + ext))
+            except FileNotFoundError:
+                pass
+
+
+def init_profiling(app):
+    """
+    Профилирование запросов по заголовку или выборке
+
+    Вызывается до init_sql_instrumentation: профиль охватывает остальные
+    обработчики запроса, а счетчики SQL вложены в правильном порядке.
+    """
+    if not app.config['PROFILE_TOKEN'] and app.config['PROFILE_SAMPLE_RATE'] <= 0:
+        return
+
+    @app.before_request
+    def start_profile():
+        _start()
+
+    @app.after_request
+    def mark_profile(response):
+        profile = g.get('profile')
+        if profile is not None:
+            profile['status'] = response.status_code
+            response.headers['X-Profile-Id'] = profile['id']
+        return response
+
+    @app.teardown_request
+    def finish_profile(exc):
+        profile = g.pop('profile', None)
+        if profile is not None:
+            _finish(profile, profile.get('status', 500))
@@ -0,0 +1,216 @@
+"""
+Ограничение частоты запросов к входу и регистрации (token bucket)
+
+Каждый запрос к /api/auth/login, /api/auth/register, /login и /register стоит полного
+вычисления KDF. Лимит проверяется до любой работы с паролем - в первую очередь по email,
+затем по IP клиента. Корзина IP широкая: за одним NAT (класс, прокси) много пользователей;
+за доверенным обратным прокси IP клиента берется из X-Forwarded-For (TRUSTED_PROXY_COUNT).
+Хранилище корзин: память процесса ('memory') или общий файл SQLite ('sqlite'),
+чтобы лимиты действовали для всех воркеров на одном сервере.
+"""
+
+import math
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from flask import current_app, request
+from .password import get_hashing_stats
+
+
+class RateLimitExceeded(Exception):
+    """Лимит запросов исчерпан - повторить через retry_after секунд"""
+
+    def __init__(self, retry_after):
+        super().__init__('Too many requests')
+        self.retry_after = retry_after
+
+
+class MemoryBucketStore:
+    """Корзины в памяти процесса (ограниченный размер, вытесняются давно не использованные)"""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key, capacity, rate):
+        """Списание одного токена; возвращает 0 или время ожидания в секундах"""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (capacity, now))
+            tokens, retry_after = _refill_and_take(tokens, updated, now, capacity, rate)
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            # Вытесненная корзина эквивалентна полной - лимит от этого только мягче
+            while len(self._buckets) > self.maxsize:
+                self._buckets.popitem(last=False)
+        return retry_after
+
+
+class SQLiteBucketStore:
+    """Корзины в общем файле SQLite - атомарно для всех процессов на сервере"""
+
+    # Как часто (в вызовах) удалять давно заполненные корзины
+    PRUNE_EVERY = 1000
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._calls = 0
+        self._connection().execute(
+            'CREATE TABLE IF NOT EXISTS rate_limit_buckets '
+            '(key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)'
+        )
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            # isolation_level=None - транзакциями управляем явно (BEGIN IMMEDIATE)
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            self._local.connection = connection
+        return connection
+
+    def take(self, key, capacity, rate):
+        """Списание одного токена; возвращает 0 или время ожидания в секундах"""
+        now = time.time()
+        connection = self._connection()
+        # BEGIN IMMEDIATE берет блокировку записи - чтение и обновление корзины атомарны
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            row = connection.execute(
+                'SELECT tokens, updated FROM rate_limit_buckets WHERE key = ?', (key,)
+            ).fetchone()
+            tokens, updated = row if row else (capacity, now)
+            tokens, retry_after = _refill_and_take(tokens, updated, now, capacity, rate)
+            connection.execute(
+                'INSERT OR REPLACE INTO rate_limit_buckets (key, tokens, updated) VALUES (?, ?, ?)',
+                (key, tokens, now)
+            )
+            self._calls += 1
+            if self._calls % self.PRUNE_EVERY == 0:
+                # Корзина, не обновлявшаяся дольше времени полного пополнения, равна полной
+                connection.execute(
+                    'DELETE FROM rate_limit_buckets WHERE updated < ?', (now - capacity / rate,)
+                )
+            connection.execute('COMMIT')
+        except Exception:
+            connection.execute('ROLLBACK')
+            raise
+        return retry_after
+
+
+def _refill_and_take(tokens, updated, now, capacity, rate):
+    """Пополнение корзины за прошедшее время и попытка списать один токен"""
+    tokens = min(capacity, tokens + max(now - updated, 0) * rate)
+    if tokens >= 1:
+        return tokens - 1, 0
+    return tokens, (1 - tokens) / rate
+
+
+class AuthRateLimiter:
+    """Лимиты на вход и регистрацию: отдельные корзины по email и по IP"""
+
+    def __init__(self, store):
+        self.store = store
+        self._lock = threading.Lock()
+        self.allowed = 0
+        self.rejected_ip = 0
+        self.rejected_email = 0
+        # Оценка сэкономленного времени KDF: средняя длительность хеширования на момент отказа
+        self.hashing_seconds_saved = 0.0
+
+    def check(self, ip, email):
+        """
+        Проверка лимитов для запроса
+
+        Returns:
+            int: 0 если запрос разрешен, иначе рекомендуемый Retry-After в секундах
+        """
+        # Сначала email: отказ по одному адресу не расходует общую корзину IP
+        if email:
+            retry_after = self.store.take(
+                f'email:{email}', current_app.config['AUTH_RATE_LIMIT_EMAIL_BURST'], current_app.config['AUTH_RATE_LIMIT_EMAIL_PER_MINUTE'] / 60
+            )
+            if retry_after:
+                self._reject('email')
+                return math.ceil(retry_after)
+
+        retry_after = self.store.take(
+            f'ip:{ip}', current_app.config['AUTH_RATE_LIMIT_IP_BURST'], current_app.config['AUTH_RATE_LIMIT_IP_PER_MINUTE'] / 60
+        )
+        if retry_after:
+            self._reject('ip')
+            return math.ceil(retry_after)
+
+        with self._lock:
+            self.allowed += 1
+        return 0
+
+    def _reject(self, key):
+        # Каждый отклоненный запрос - как минимум одно несостоявшееся вычисление KDF
+        saved = get_hashing_stats()['average_seconds']
+        with self._lock:
+            if key == 'email':
+                self.rejected_email += 1
+            else:
+                self.rejected_ip += 1
+            self.hashing_seconds_saved += saved
+
+    def stats(self):
+        """Счетчики лимитера и оценка сэкономленного времени хеширования"""
+        with self._lock:
+            return {
+                'allowed': self.allowed,
+                'rejected_ip': self.rejected_ip,
+                'rejected_email': self.rejected_email,
+                'hashing_seconds_saved': round(self.hashing_seconds_saved, 4)
+            }
+
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def get_auth_limiter():
+    """Лимитер процесса (создается при первом обращении по настройкам приложения)"""
+    global _limiter
+    if _limiter is None:
+        with _limiter_lock:
+            if _limiter is None:
+                if current_app.config['RATE_LIMIT_BACKEND'] == 'sqlite':
+                    store = SQLiteBucketStore(current_app.config['RATE_LIMIT_SQLITE_PATH'])
+                else:
+                    store = MemoryBucketStore(current_app.config['RATE_LIMIT_MAX_KEYS'])
+                _limiter = AuthRateLimiter(store)
+    return _limiter
+
+
+def _request_email():
+    """Email из JSON тела или формы запроса (нормализованный)"""
+    data = request.get_json(silent=True) if request.is_json else request.form
+    # JSON тело может быть списком или строкой - лимит по email к нему не применяется
+    if not isinstance(data, dict):
+        return None
+    email = data.get('email')
+    if not isinstance(email, str):
+        return None
+    return email.strip().lower()[:120] or None
+
+
+def auth_rate_limit(f):
+    """
+    Декоратор лимита для маршрутов входа и регистрации
+
+    Проверяет только POST запросы (GET страниц входа не стоит вычислений KDF).
+    При превышении выбрасывает RateLimitExceeded (ответ 429 с Retry-After).
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if current_app.config['RATE_LIMIT_ENABLED'] and request.method == 'POST':
+            retry_after = get_auth_limiter().check(request.remote_addr or 'unknown', _request_email())
+            if retry_after:
+                raise RateLimitExceeded(retry_after)
+        return f(*args, **kwargs)
+    return decorated_function
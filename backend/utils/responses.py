@@ -2,7 +2,10 @@
 Утилиты для формирования стандартизированных ответов API
 """
 
-from flask import jsonify
+import hashlib
+from datetime import datetime, timedelta, timezone
+from functools import wraps
+from flask import jsonify, request, make_response
 
 def success_response(data=None, status_code=200):
     """
@@ -49,3 +52,79 @@ def error_response(message, status_code=400):
         'data': None,
         'error': message
     }), status_code
+
+
+def conditional_response(validator, public=False):
+    """
+    Декоратор для поддержки условных GET запросов (ETag / Last-Modified)
+
+    validator вызывается с теми же аргументами, что и маршрут, и должен дешево
+    (без загрузки и сериализации данных) вернуть версию ресурса:
+        (version, last_modified) - version: любые значения, меняющиеся вместе с ответом;
+                                   last_modified: datetime (UTC) или None
+        None - версия недоступна, запрос обрабатывается без условной логики
+
+    Если клиент прислал совпадающий If-None-Match (или If-Modified-Since не раньше
+    last_modified), маршрут не вызывается и возвращается 304.
+
+    Args:
+        validator: Функция вычисления версии ресурса
+        public: Разрешить кэширование общими кэшами (для данных без авторизации)
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            state = validator(*args, **kwargs)
+            if state is None:
+                return f(*args, **kwargs)
+
+            version, last_modified = state
+            # Параметры запроса (skip, limit, cursor) входят в ETag - это разные представления
+            etag = hashlib.sha1(repr((request.full_path, version)).encode()).hexdigest()
+
+            if _is_not_modified(etag, last_modified):
+                response = make_response('', 304)
+            else:
+                response = make_response(f(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+
+            response.set_etag(etag)
+            last_modified = _http_date(last_modified)
+            # Пока секунда last_modified не прошла, изменение в ту же секунду не изменит
+            # заголовок - такой Last-Modified не отправляется (остается только ETag)
+            if last_modified and last_modified <= datetime.now(timezone.utc):
+                response.last_modified = last_modified
+            # no-cache: клиент может хранить ответ, но обязан перепроверять его через ETag
+            response.cache_control.no_cache = True
+            if public:
+                response.cache_control.public = True
+            else:
+                response.cache_control.private = True
+            return response
+
+        return decorated_function
+    return decorator
+
+
+def _http_date(value):
+    """
+    Время изменения с точностью заголовков HTTP (до секунды), округленное вверх
+
+    Округление вниз выдало бы 304 для изменения в той же секунде, что и кэшированный ответ.
+    """
+    if value is None:
+        return None
+    value = value.replace(tzinfo=timezone.utc)
+    if value.microsecond:
+        value = value.replace(microsecond=0) + timedelta(seconds=1)
+    return value
+
+
+def _is_not_modified(etag, last_modified):
+    """Проверка условных заголовков запроса (If-None-Match приоритетнее If-Modified-Since)"""
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+    if last_modified and request.if_modified_since:
+        return _http_date(last_modified) <= request.if_modified_since
+    return False
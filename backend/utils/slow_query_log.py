@@ -0,0 +1,176 @@
+"""
+Журнал медленных SQL запросов (JSON lines)
+
+Запрос дольше SLOW_QUERY_MS, выполненный из backend/services/* или
+backend/routes/views.py, записывается в SLOW_QUERY_LOG_PATH одной JSON строкой:
+время, текст запроса, форма параметров (типы без значений), endpoint HTTP запроса
+и место вызова. План запроса (EXPLAIN QUERY PLAN для SQLite, EXPLAIN для PostgreSQL)
+снимается один раз для каждого различного текста запроса; записи связываются
+по statement_id.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+from flask import current_app, has_request_context, request
+from sqlalchemy import event
+from config import BASE_DIR
+from .cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+# Код, запросы которого попадают в журнал
+SOURCE_DIRS = (os.path.join(BASE_DIR, 'backend', 'services') + os.sep,)
+SOURCE_FILES = (os.path.join(BASE_DIR, 'backend', 'routes', 'views.py'),)
+
+# Запросы, для которых имеет смысл план выполнения
+EXPLAINABLE = ('SELECT', 'WITH', 'INSERT', 'UPDATE', 'DELETE')
+
+# Тексты запросов, для которых план уже записан: statement_id -> True
+_explained = LRUCache('query_plans', 1024)
+_write_lock = threading.Lock()
+
+
+def statement_id(statement):
+    """Короткий идентификатор текста запроса"""
+    return hashlib.sha1(statement.encode('utf-8')).hexdigest()[:12]
+
+
+def _parameter_rows(parameters, executemany):
+    """Наборы параметров (insertmanyvalues передает один плоский набор при executemany)"""
+    if executemany and parameters and isinstance(parameters[0], (list, tuple, dict)):
+        return list(parameters)
+    return [parameters]
+
+
+def parameter_shape(parameters, executemany=False):
+    """
+    Форма параметров без значений: типы (для строк и байтов - длина)
+
+    Returns:
+        list | dict: Форма одного набора; для executemany - {'rows': n, 'shape': форма первого}
+    """
+    rows = _parameter_rows(parameters, executemany)
+    if len(rows) > 1:
+        return {'rows': len(rows), 'shape': parameter_shape(rows[0])}
+    parameters = rows[0]
+    if isinstance(parameters, dict):
+        return {key: _value_shape(value) for key, value in parameters.items()}
+    return [_value_shape(value) for value in parameters or ()]
+
+
+def _value_shape(value):
+    if value is None:
+        return 'null'
+    if isinstance(value, (str, bytes)):
+        return f'{type(value).__name__}({len(value)})'
+    return type(value).__name__
+
+
+def _origin():
+    """Ближайшая к запросу функция из backend/services или views.py ('путь:строка функция')"""
+    frame = sys._getframe(2)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if filename.startswith(SOURCE_DIRS) or filename in SOURCE_FILES:
+            return f'{os.path.relpath(filename, BASE_DIR)}:{frame.f_lineno} {frame.f_code.co_name}'
+        frame = frame.f_back
+    return None
+
+
+def _explain(conn, statement, parameters, executemany):
+    """План выполнения запроса через отдельный курсор DBAPI (без событий SQLAlchemy)"""
+    if not statement.lstrip().upper().startswith(EXPLAINABLE):
+        return None
+    dialect = conn.dialect.name
+    if dialect == 'sqlite':
+        prefix = 'EXPLAIN QUERY PLAN '
+    elif dialect == 'postgresql':
+        prefix = 'EXPLAIN '
+    else:
+        return None
+    parameters = _parameter_rows(parameters, executemany)[0] or ()
+
+    cursor = conn.connection.cursor()
+    try:
+        cursor.execute(prefix + statement, parameters)
+        rows = cursor.fetchall()
+    except Exception as e:
+        return [f'EXPLAIN failed: {e}']
+    finally:
+        cursor.close()
+    if dialect == 'sqlite':
+        # (id, parent, notused, detail)
+        return [row[-1] for row in rows]
+    return [row[0] for row in rows]
+
+
+def _write(entry):
+    path = current_app.config['SLOW_QUERY_LOG_PATH']
+    line = json.dumps(entry, ensure_ascii=False, default=str)
+    try:
+        with _write_lock:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'a', encoding='utf-8') as f:
+                f.write(line + '\n')
+    except OSError as e:
+        logger.warning('Could not write slow query log %s: %s', path, e)
+
+
+def _log_slow(conn, statement, parameters, executemany, elapsed):
+    """Запись медленного запроса, если он выполнен из отслеживаемого кода"""
+    origin = _origin()
+    if origin is None:
+        return
+
+    sid = statement_id(statement)
+    entry = {
+        'ts': datetime.utcnow().isoformat(timespec='milliseconds') + 'Z',
+        'duration_ms': round(elapsed * 1000, 3),
+        'statement_id': sid,
+        'statement': ' '.join(statement.split()),
+        'params': parameter_shape(parameters, executemany),
+        'origin': origin,
+        'endpoint': request.endpoint if has_request_context() else None,
+        'method': request.method if has_request_context() else None,
+        'path': request.path if has_request_context() else None,
+    }
+    if _explained.get(sid) is None:
+        _explained.set(sid, True)
+        entry['plan'] = _explain(conn, statement, parameters, executemany)
+    _write(entry)
+
+
+def install_slow_query_log(engine):
+    """Подключение журнала медленных запросов к движку (SLOW_QUERY_MS <= 0 - выключен)"""
+    threshold = current_app.config['SLOW_QUERY_MS'] / 1000
+    if threshold <= 0:
+        return False
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def start_timer(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('slow_query_start', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def log_slow(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['slow_query_start'].pop()
+        if elapsed < threshold:
+            return
+        try:
+            _log_slow(conn, statement, parameters, executemany, elapsed)
+        except Exception:
+            # Журнал не должен ломать выполнение запроса
+            logger.exception('Slow query log failed')
+
+    @event.listens_for(engine, 'handle_error')
+    def drop_timer(context):
+        starts = context.connection.info.get('slow_query_start') if context.connection is not None else None
+        if starts:
+            starts.pop()
+
+    return True
@@ -0,0 +1,192 @@
+"""
+Учет SQL запросов: количество и время выполнения в рамках HTTP запроса
+
+События движка SQLAlchemy (before/after_cursor_execute) записывают каждый запрос
+во все активные счетчики текущего контекста: счетчик HTTP запроса и вложенные
+счетчики count_statements / statement_budget.
+
+Повторяющиеся одинаковые запросы (тот же SQL с разными параметрами) - типичный
+признак N+1 - записываются в лог в режиме отладки или при SQL_N_PLUS_ONE_LOG.
+"""
+
+import logging
+import time
+from collections import Counter
+from contextlib import ContextDecorator
+from contextvars import ContextVar
+from flask import current_app, g, request
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+# Активные счетчики текущего контекста (от внешнего к внутреннему)
+_active = ContextVar('sql_stats', default=())
+
+
+class StatementBudgetExceeded(AssertionError):
+    """Количество SQL запросов превысило заданный бюджет"""
+
+
+class SQLStats:
+    """
+    Счетчик SQL запросов: количество, суммарное время, повторы по тексту запроса
+
+    Args:
+        timings: Учитывать время каждого запроса (timings: текст -> [количество, сумма, максимум])
+    """
+
+    __slots__ = ('count', 'seconds', 'statements', 'timings')
+
+    def __init__(self, timings=False):
+        self.count = 0
+        self.seconds = 0.0
+        self.statements = Counter()
+        self.timings = {} if timings else None
+
+    def record(self, statement, seconds):
+        self.count += 1
+        self.seconds += seconds
+        self.statements[statement] += 1
+        if self.timings is not None:
+            entry = self.timings.get(statement)
+            if entry is None:
+                entry = self.timings[statement] = [0, 0.0, 0.0]
+            entry[0] += 1
+            entry[1] += seconds
+            entry[2] = max(entry[2], seconds)
+
+    def repeated(self, threshold=None):
+        """Запросы, выполненные не меньше threshold раз (вероятные N+1)"""
+        threshold = threshold or current_app.config['SQL_N_PLUS_ONE_THRESHOLD']
+        return [(statement, count) for statement, count in self.statements.most_common() if count >= threshold]
+
+
+def _push(timings=False):
+    stats = SQLStats(timings)
+    return stats, _active.set(_active.get() + (stats,))
+
+
+class count_statements(ContextDecorator):
+    """
+    Подсчет SQL запросов внутри блока (например, вокруг вызова тестового клиента)
+
+        with count_statements() as stats:
+            client.get('/dashboard')
+        assert stats.count <= 3
+
+    Args:
+        timings: Учитывать время каждого запроса (stats.timings)
+    """
+
+    def __init__(self, timings=False):
+        self.timings = timings
+
+    def _recreate_cm(self):
+        # Декоратор: свой экземпляр на каждый вызов - stats и token не делятся между потоками
+        return type(self)(self.timings)
+
+    def __enter__(self):
+        self.stats, self._token = _push(self.timings)
+        return self.stats
+
+    def __exit__(self, *exc):
+        _active.reset(self._token)
+        return False
+
+
+class statement_budget(ContextDecorator):
+    """
+    Бюджет SQL запросов для блока кода или обработчика маршрута
+
+    Args:
+        limit: Максимальное количество запросов
+        strict: True - выбросить StatementBudgetExceeded, False - записать предупреждение
+                в лог; None - по настройке SQL_BUDGET_STRICT
+
+    Используется как декоратор маршрута (@statement_budget(5)) или в тестах:
+        with statement_budget(5, strict=True):
+            client.get('/dashboard')
+    """
+
+    def __init__(self, limit, strict=None):
+        self.limit = limit
+        self.strict = strict
+
+    def _recreate_cm(self):
+        # Один экземпляр декоратора обслуживает все запросы маршрута (в том числе
+        # параллельные) - состояние блока хранится в новом экземпляре на каждый вызов
+        return type(self)(self.limit, self.strict)
+
+    def __enter__(self):
+        self.stats, self._token = _push()
+        return self.stats
+
+    def __exit__(self, exc_type, exc, tb):
+        _active.reset(self._token)
+        if exc_type is not None or self.stats.count <= self.limit:
+            return False
+
+        message = f'{self.stats.count} SQL statements, budget is {self.limit}'
+        # Самый частый повторяющийся запрос - подсказка, где искать N+1
+        repeated = self.stats.repeated(threshold=2)
+        if repeated:
+            message += f'; repeated: {repeated[0][1]}x {_shorten(repeated[0][0])}'
+        strict = current_app.config['SQL_BUDGET_STRICT'] if self.strict is None else self.strict
+        if strict:
+            raise StatementBudgetExceeded(message)
+        logger.warning('Statement budget exceeded: %s', message)
+        return False
+
+
+def _shorten(statement, length=200):
+    statement = ' '.join(statement.split())
+    return statement if len(statement) <= length else statement[:length] + '...'
+
+
+def install_sql_instrumentation(engine):
+    """Подключение учета запросов к движку"""
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def start_timer(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def stop_timer(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['query_start'].pop()
+        for stats in _active.get():
+            stats.record(statement, elapsed)
+
+    @event.listens_for(engine, 'handle_error')
+    def drop_timer(context):
+        # Запрос с ошибкой не доходит до after_cursor_execute
+        starts = context.connection.info.get('query_start') if context.connection is not None else None
+        if starts:
+            starts.pop()
+
+
+def init_sql_instrumentation(app):
+    """Счетчик запросов для каждого HTTP запроса (g.sql_stats) и поиск N+1 в конце запроса"""
+
+    @app.before_request
+    def start_request_stats():
+        g.sql_stats, g._sql_stats_token = _push()
+
+    @app.teardown_request
+    def finish_request_stats(exc):
+        token = g.pop('_sql_stats_token', None)
+        if token is None:
+            return
+        _active.reset(token)
+
+        stats = g.sql_stats
+        if app.debug or app.config['SQL_N_PLUS_ONE_LOG']:
+            for statement, count in stats.repeated():
+                logger.warning('Probable N+1 on %s %s (%s): %dx %s', request.method, request.path,
+                               request.endpoint, count, _shorten(statement))
+        logger.debug('%s %s: %d SQL statements, %.1f ms', request.method, request.path,
+                     stats.count, stats.seconds * 1000)
+
+
+def current_sql_stats():
+    """Счетчик SQL запросов текущего HTTP запроса (None вне запроса)"""
+    return g.get('sql_stats')
@@ -0,0 +1,86 @@
+"""
+Профиль SQLite для продакшена - PRAGMA настройки, применяемые к каждому соединению
+
+По умолчанию SQLite работает в режиме rollback journal с синхронной записью на диск
+при каждом коммите, а параллельные писатели сразу получают "database is locked".
+WAL журнал, synchronous=NORMAL и busy_timeout снимают эти ограничения.
+"""
+
+import logging
+from flask import current_app
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+# Допустимые значения строковых настроек (PRAGMA не поддерживает параметры запроса)
+_JOURNAL_MODES = {'DELETE', 'TRUNCATE', 'PERSIST', 'MEMORY', 'WAL', 'OFF'}
+_SYNCHRONOUS = {'OFF', 'NORMAL', 'FULL', 'EXTRA'}
+_TEMP_STORE = {'DEFAULT', 'FILE', 'MEMORY'}
+
+
+def _choice(name, value, allowed):
+    value = str(value).upper()
+    if value not in allowed:
+        raise ValueError(f'{name} must be one of: {", ".join(sorted(allowed))}')
+    return value
+
+
+def sqlite_pragmas():
+    """
+    Список PRAGMA команд профиля из настроек приложения
+
+    Returns:
+        list: Пары (имя, значение) в порядке применения
+    """
+    config = current_app.config
+    return [
+        ('journal_mode', _choice('SQLITE_JOURNAL_MODE', config['SQLITE_JOURNAL_MODE'], _JOURNAL_MODES)),
+        ('synchronous', _choice('SQLITE_SYNCHRONOUS', config['SQLITE_SYNCHRONOUS'], _SYNCHRONOUS)),
+        ('busy_timeout', int(config['SQLITE_BUSY_TIMEOUT'])),
+        ('mmap_size', int(config['SQLITE_MMAP_SIZE'])),
+        ('cache_size', int(config['SQLITE_CACHE_SIZE'])),
+        ('temp_store', _choice('SQLITE_TEMP_STORE', config['SQLITE_TEMP_STORE'], _TEMP_STORE)),
+    ]
+
+
+def install_sqlite_profile(engine):
+    """
+    Подключение профиля к движку SQLAlchemy (обработчик события connect)
+
+    Для других СУБД ничего не делает.
+
+    Returns:
+        bool: True если профиль подключен
+    """
+    if engine.dialect.name != 'sqlite' or not current_app.config['SQLITE_PROFILE_ENABLED']:
+        return False
+
+    pragmas = sqlite_pragmas()
+
+    @event.listens_for(engine, 'connect')
+    def apply_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas:
+                cursor.execute(f'PRAGMA {name}={value}')
+        finally:
+            cursor.close()
+
+    return True
+
+
+def sqlite_profile_report(engine):
+    """Фактические значения PRAGMA на соединении из пула (для вывода при запуске)"""
+    with engine.connect() as connection:
+        return {
+            name: connection.exec_driver_sql(f'PRAGMA {name}').scalar()
+            for name, _ in sqlite_pragmas()
+        }
+
+
+def setup_sqlite_profile(engine):
+    """Подключение профиля и запись фактических настроек в лог"""
+    if install_sqlite_profile(engine):
+        logger.info('SQLite profile: %s', ', '.join(
+            f'{name}={value}' for name, value in sqlite_profile_report(engine).items()
+        ))
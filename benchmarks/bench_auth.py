@@ -0,0 +1,50 @@
+"""
+Микробенчмарк аутентификации - накладные расходы require_auth на один запрос
+
+Сравнивает полную проверку JWT (кэш очищается перед каждым вызовом)
+и проверку через кэш проверенных токенов.
+
+Запуск:
+    python -m benchmarks.bench_auth
+"""
+
+import timeit
+from flask import Flask
+from config import Config
+from backend.utils.jwt_utils import create_token, require_auth, clear_token_cache
+
+NUMBER = 20000
+REPEAT = 5
+
+
+@require_auth
+def protected(user_id):
+    return user_id
+
+
+def run():
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    with app.app_context():
+        token = create_token(42)
+
+    with app.test_request_context(headers={'Authorization': f'Bearer {token}'}):
+        def uncached():
+            clear_token_cache()
+            protected()
+
+        def cached():
+            protected()
+
+        uncached_time = min(timeit.repeat(uncached, number=NUMBER, repeat=REPEAT)) / NUMBER
+        cached()
+        cached_time = min(timeit.repeat(cached, number=NUMBER, repeat=REPEAT)) / NUMBER
+
+    print(f"{'mode':>12} {'per request, us':>16}")
+    print(f"{'jwt.decode':>12} {uncached_time * 1e6:>16.2f}")
+    print(f"{'cached':>12} {cached_time * 1e6:>16.2f}")
+    print(f'speedup: {uncached_time / cached_time:.1f}x')
+
+
+if __name__ == '__main__':
+    run()
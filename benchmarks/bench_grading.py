@@ -0,0 +1,65 @@
+"""
+Бенчмарк проверки попытки - стоимость grade_attempt в зависимости от количества вопросов
+
+Запуск:
+    python -m benchmarks.bench_grading
+"""
+
+import json
+import random
+import timeit
+from types import SimpleNamespace
+from backend.services.grading_service import grade_attempt, clear_answer_keys
+
+QUESTION_COUNTS = [10, 50, 100, 500, 1000]
+REPEAT = 5
+
+
+def make_attempt(question_count, seed=42):
+    """Генерация вопросов (все три типа) и ответов пользователя без обращения к БД"""
+    rnd = random.Random(seed)
+    questions = []
+    answers = {}
+    for i in range(question_count):
+        question_type = ('single', 'multiple', 'text')[i % 3]
+        if question_type == 'single':
+            correct = [rnd.randrange(4)]
+            answer = str(rnd.randrange(4))
+        elif question_type == 'multiple':
+            correct = sorted(rnd.sample(range(6), 3))
+            answer = rnd.sample(range(6), 3)
+        else:
+            correct = f'Answer {i}'
+            answer = f'  answer {i} ' if rnd.random() < 0.5 else 'wrong'
+        questions.append(SimpleNamespace(
+            id=i + 1,
+            question_type=question_type,
+            correct_answer=json.dumps(correct)
+        ))
+        answers[i + 1] = answer
+    return questions, answers
+
+
+def run():
+    print(f"{'questions':>10} {'cold, us':>12} {'warm, us':>12} {'warm per q, us':>16}")
+    for count in QUESTION_COUNTS:
+        questions, answers = make_attempt(count)
+        number = max(1, 20000 // count)
+
+        # Холодный кэш - ключи компилируются при каждой проверке
+        def cold():
+            clear_answer_keys()
+            grade_attempt(questions, answers)
+
+        # Теплый кэш - типичная ситуация во время массового прохождения теста
+        def warm():
+            grade_attempt(questions, answers)
+
+        cold_time = min(timeit.repeat(cold, number=number, repeat=REPEAT)) / number
+        warm()
+        warm_time = min(timeit.repeat(warm, number=number, repeat=REPEAT)) / number
+        print(f'{count:>10} {cold_time * 1e6:>12.1f} {warm_time * 1e6:>12.1f} {warm_time * 1e6 / count:>16.3f}')
+
+
+if __name__ == '__main__':
+    run()
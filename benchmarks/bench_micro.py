@@ -0,0 +1,188 @@
+"""
+Набор микробенчмарков горячих функций и сериализаторов с сохраненным эталоном
+
+Результаты сравниваются с benchmarks/baseline.json. Время нормируется на
+калибровочную нагрузку (чистый Python цикл), поэтому эталон, снятый на другой
+машине, остается сопоставимым. Замедление больше порога считается регрессией
+(код выхода 1).
+
+Запуск:
+    python -m benchmarks.bench_micro
+    python -m benchmarks.bench_micro --threshold 0.3 --filter to_dict
+    python -m benchmarks.bench_micro --update-baseline
+"""
+
+import os
+
+# Отдельная БД в памяти - бенчмарк не трогает рабочую базу (до импорта config)
+os.environ['DATABASE_URL'] = 'sqlite://'
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+import argparse
+import json
+import sys
+import timeit
+from datetime import datetime
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+REPEAT = 5
+# Проходы по всем бенчмаркам - берется минимум, чтобы дрейф частоты CPU не искажал отдельные замеры
+ROUNDS = 3
+QUESTIONS = 20
+
+
+def calibration():
+    """Калибровочная нагрузка - не зависит от кода приложения"""
+    total = 0
+    for i in range(1000):
+        total += i * i % 7
+    return total
+
+
+def seed_data(db):
+    """Тест с вопросами всех типов и завершенная попытка с ответами"""
+    from backend.models.user import User
+    from backend.models.test import Test
+    from backend.models.question import Question
+    from backend.models.attempt import TestAttempt
+    from backend.models.answer import Answer
+
+    user = User(name='Bench', email='bench@example.com', password_hash='x')
+    db.session.add(user)
+    db.session.flush()
+    test = Test(user_id=user.id, title='Bench', description='Microbenchmark test', updated_at=datetime.utcnow())
+    db.session.add(test)
+    db.session.flush()
+
+    attempt = TestAttempt(test_id=test.id, user_id=user.id, started_at=datetime.utcnow())
+    db.session.add(attempt)
+    db.session.flush()
+    for i in range(QUESTIONS):
+        question_type = ('single', 'multiple', 'text')[i % 3]
+        correct = {'single': [1], 'multiple': [0, 2], 'text': 'Paris'}[question_type]
+        question = Question(
+            test_id=test.id, question_text=f'Question {i}', question_type=question_type,
+            options=json.dumps(['a', 'b', 'c', 'd']) if question_type != 'text' else None,
+            correct_answer=json.dumps(correct), order_index=i
+        )
+        db.session.add(question)
+        db.session.flush()
+        user_answer = {'single': 1, 'multiple': [2, 0], 'text': ' paris '}[question_type]
+        db.session.add(Answer(attempt_id=attempt.id, question_id=question.id,
+                              user_answer=json.dumps(user_answer), is_correct=True))
+    attempt.finished_at = datetime.utcnow()
+    attempt.score = 100.0
+    db.session.commit()
+    return test.id, attempt.id
+
+
+def build_cases(app):
+    """Словарь имя -> функция без аргументов (вызывается внутри контекста приложения)"""
+    from sqlalchemy.orm import selectinload
+    from backend.models import db
+    from backend.models.test import Test
+    from backend.models.attempt import TestAttempt
+    from backend.services.attempt_service import check_answer, calculate_score
+    from backend.utils.validation import validate_question_options, validate_email, validate_password
+    from backend.utils.responses import success_response
+    from backend.utils.jwt_utils import create_token, decode_token, clear_token_cache
+
+    test_id, attempt_id = seed_data(db)
+    test = db.session.get(Test, test_id, options=[selectinload(Test.questions), *Test.with_counts()])
+    attempt = db.session.get(TestAttempt, attempt_id, options=[selectinload(TestAttempt.answers)])
+    questions = {q.question_type: q for q in test.questions}
+    token = create_token(42)
+    test_dict = test.to_dict(include_questions=True)
+
+    def jwt_decode():
+        clear_token_cache()
+        decode_token(token)
+
+    return {
+        'check_answer[single]': lambda: check_answer(questions['single'], '1'),
+        'check_answer[multiple]': lambda: check_answer(questions['multiple'], [2, 0]),
+        'check_answer[text]': lambda: check_answer(questions['text'], ' paris '),
+        f'calculate_score[{QUESTIONS}q]': lambda: calculate_score(attempt_id),
+        'validate_question_options[single]': lambda: validate_question_options('single', ['a', 'b', 'c'], [1]),
+        'validate_question_options[multiple]': lambda: validate_question_options('multiple', ['a', 'b', 'c'], [0, 2]),
+        'validate_email': lambda: validate_email('student.name@example.com'),
+        'validate_password': lambda: validate_password('Secur3Passw0rd'),
+        f'Test.to_dict[{QUESTIONS}q]': lambda: test.to_dict(include_questions=True),
+        'Question.to_dict': lambda: questions['multiple'].to_dict(include_correct_answer=True),
+        f'TestAttempt.to_dict[{QUESTIONS}a]': lambda: attempt.to_dict(include_answers=True),
+        'success_response[test]': lambda: success_response(test_dict),
+        'jwt_encode': lambda: create_token(42),
+        'jwt_decode': jwt_decode,
+    }
+
+
+def measure(func):
+    """Время одного вызова в микросекундах (минимум из REPEAT серий)"""
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=REPEAT, number=number)) / number * 1e6
+
+
+def run(threshold, name_filter=None, update_baseline=False):
+    from app import create_app
+    from database.init_db import init_database
+
+    app = create_app()
+    init_database(app)
+
+    with app.app_context():
+        cases = build_cases(app)
+        if name_filter:
+            cases = {name: func for name, func in cases.items() if name_filter in name}
+        calibration_us = float('inf')
+        results = {name: float('inf') for name in cases}
+        for _ in range(ROUNDS):
+            calibration_us = min(calibration_us, measure(calibration))
+            for name, func in cases.items():
+                results[name] = min(results[name], measure(func))
+
+    if update_baseline:
+        with open(BASELINE_PATH, 'w', encoding='utf-8') as f:
+            json.dump({
+                'calibration_us': round(calibration_us, 4),
+                'results': {name: round(value, 4) for name, value in results.items()}
+            }, f, indent=2)
+            f.write('\n')
+        print(f'baseline written: {BASELINE_PATH}')
+
+    try:
+        with open(BASELINE_PATH, encoding='utf-8') as f:
+            baseline = json.load(f)
+    except OSError:
+        baseline = {'calibration_us': calibration_us, 'results': {}}
+
+    # Поправка на скорость машины относительно той, где снят эталон
+    scale = calibration_us / baseline['calibration_us']
+    regressions = []
+    print(f"{'benchmark':<38} {'us/call':>10} {'baseline':>10} {'change':>8}")
+    for name, value in results.items():
+        base = baseline['results'].get(name)
+        if base is None:
+            print(f'{name:<38} {value:>10.2f} {"-":>10} {"new":>8}')
+            continue
+        change = value / (base * scale) - 1
+        flag = ''
+        if change > threshold:
+            flag = '  REGRESSION'
+            regressions.append(name)
+        print(f'{name:<38} {value:>10.2f} {base * scale:>10.2f} {change * 100:>7.1f}%{flag}')
+
+    print(f'calibration: {calibration_us:.2f} us (machine scale {scale:.2f}), threshold {threshold * 100:.0f}%')
+    if regressions and not update_baseline:
+        print(f'FAIL: {len(regressions)} regression(s): {", ".join(regressions)}')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Микробенчмарки горячих функций с эталоном')
+    parser.add_argument('--threshold', type=float, default=0.3, help='допустимое замедление (0.3 = 30%%)')
+    parser.add_argument('--filter', dest='name_filter', help='только бенчмарки, содержащие подстроку')
+    parser.add_argument('--update-baseline', action='store_true', help='перезаписать baseline.json')
+    args = parser.parse_args()
+    sys.exit(run(args.threshold, args.name_filter, args.update_baseline))
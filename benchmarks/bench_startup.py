@@ -0,0 +1,79 @@
+"""
+Бенчмарк запуска приложения - время импорта, создания приложения и первых запросов
+
+Каждый замер выполняется в отдельном процессе интерпретатора (холодный импорт).
+С --max-boot-ms завершается с ошибкой, если импорт + create_app() медленнее порога.
+
+Запуск:
+    python -m benchmarks.bench_startup
+    python -m benchmarks.bench_startup --runs 10 --max-boot-ms 1500
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Код одного замера: время каждого этапа в миллисекундах выводится одной строкой JSON
+PROBE = '''
+import json, time
+started = time.perf_counter()
+import app as app_module
+imported = time.perf_counter()
+app = app_module.create_app()
+created = time.perf_counter()
+client = app.test_client()
+client.get('/login')
+first_page = time.perf_counter()
+client.get('/api/tests')
+first_api = time.perf_counter()
+client.get('/apispec.json')
+first_spec = time.perf_counter()
+print(json.dumps({
+    'import': (imported - started) * 1000,
+    'create_app': (created - imported) * 1000,
+    'first /login': (first_page - created) * 1000,
+    'first /api/tests': (first_api - first_page) * 1000,
+    'first /apispec.json': (first_spec - first_api) * 1000,
+}))
+'''
+
+
+def measure_once(database_url):
+    env = dict(os.environ, DATABASE_URL=database_url, LOG_LEVEL='WARNING')
+    output = subprocess.run(
+        [sys.executable, '-c', PROBE], cwd=ROOT, env=env,
+        check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def run(runs, max_boot_ms=None):
+    with tempfile.TemporaryDirectory() as tmp:
+        database_url = f'sqlite:///{os.path.join(tmp, "bench.db")}'
+        samples = [measure_once(database_url) for _ in range(runs)]
+
+    print(f"{'stage':>22} {'median, ms':>11} {'min, ms':>9}")
+    for stage in samples[0]:
+        values = [sample[stage] for sample in samples]
+        print(f'{stage:>22} {statistics.median(values):>11.1f} {min(values):>9.1f}')
+
+    boot = statistics.median(s['import'] + s['create_app'] for s in samples)
+    print(f'boot (import + create_app): {boot:.1f} ms')
+    if max_boot_ms is not None and boot > max_boot_ms:
+        print(f'FAIL: boot time exceeds {max_boot_ms} ms')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5, help='количество запусков')
+    parser.add_argument('--max-boot-ms', type=float, default=None, help='порог времени запуска')
+    args = parser.parse_args()
+    sys.exit(run(args.runs, args.max_boot_ms))
@@ -0,0 +1,322 @@
+"""
+Нагрузочный тест жизненного цикла попытки - много одновременных студентов
+
+Каждый студент: регистрация (или вход, если email уже занят), получение теста
+по ссылке, начало попытки, ответы на все вопросы, завершение. Тест с вопросами
+создает и публикует отдельный аккаунт преподавателя перед началом нагрузки.
+
+По умолчанию запускает собственный сервер на временной SQLite БД (полностью
+офлайн, лимит попыток входа отключен); с --url нагружает уже запущенный экземпляр.
+
+Отчет: пропускная способность, p50/p95/p99 по каждому endpoint, доля ошибок
+и конфликтов блокировок ("database is locked" в логе сервера, ответы 503).
+
+Запуск:
+    python -m benchmarks.load_test
+    python -m benchmarks.load_test --students 200 --concurrency 50 --questions 20 --ramp 10
+    python -m benchmarks.load_test --url http://127.0.0.1:8000 --batch
+"""
+
+import argparse
+import http.client
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import defaultdict
+from urllib.parse import urlsplit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PASSWORD = 'LoadTest123'
+
+
+class Stats:
+    """Задержки и коды ответов по endpoint (потокобезопасно)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.contention = 0
+        self.students_done = 0
+        self.students_failed = 0
+
+    def record(self, endpoint, seconds, status, ok):
+        with self._lock:
+            self.latencies[endpoint].append(seconds)
+            if not ok:
+                self.errors[endpoint] += 1
+            if status == 503:
+                self.contention += 1
+
+    def student_finished(self, ok):
+        with self._lock:
+            if ok:
+                self.students_done += 1
+            else:
+                self.students_failed += 1
+
+
+class Client:
+    """HTTP клиент с постоянным соединением (один на студента)"""
+
+    def __init__(self, base_url, stats):
+        parts = urlsplit(base_url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.stats = stats
+        self.token = None
+        self.connection = None
+
+    def request(self, method, path, endpoint, body=None, expected=(200,)):
+        headers = {'Content-Type': 'application/json'}
+        if self.token:
+            headers['Authorization'] = f'Bearer {self.token}'
+        payload = json.dumps(body) if body is not None else None
+
+        started = time.perf_counter()
+        try:
+            if self.connection is None:
+                self.connection = http.client.HTTPConnection(self.host, self.port, timeout=60)
+            self.connection.request(method, path, body=payload, headers=headers)
+            response = self.connection.getresponse()
+            raw = response.read()
+            status = response.status
+        except (OSError, http.client.HTTPException):
+            self.close()
+            self.stats.record(endpoint, time.perf_counter() - started, None, False)
+            return None, None
+        elapsed = time.perf_counter() - started
+
+        ok = status in expected
+        self.stats.record(endpoint, elapsed, status, ok)
+        try:
+            data = json.loads(raw) if raw else None
+        except ValueError:
+            data = None
+        return status, data
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+
+def create_test(base_url, questions, stats):
+    """Преподаватель создает и публикует тест; возвращает link_token"""
+    client = Client(base_url, stats)
+    email = f'teacher-{uuid.uuid4().hex[:8]}@load.test'
+    status, data = client.request('POST', '/api/auth/register', 'setup', {
+        'name': 'Load Teacher', 'email': email, 'password': PASSWORD
+    }, expected=(201,))
+    if status != 201:
+        raise RuntimeError(f'Teacher registration failed: {status} {data}')
+    client.token = data['data']['token']
+
+    _, data = client.request('POST', '/api/tests', 'setup', {'title': 'Load test'}, expected=(201,))
+    test_id = data['data']['id']
+    kinds = ['single', 'multiple', 'text']
+    for index in range(questions):
+        kind = kinds[index % len(kinds)]
+        question = {'question_text': f'Question {index + 1}', 'question_type': kind}
+        if kind == 'single':
+            question.update(options=['a', 'b', 'c', 'd'], correct_answer=index % 4)
+        elif kind == 'multiple':
+            question.update(options=['a', 'b', 'c', 'd'], correct_answer=[0, 2])
+        else:
+            question.update(correct_answer='answer')
+        client.request('POST', f'/api/tests/{test_id}/questions', 'setup', question, expected=(201,))
+
+    _, data = client.request('POST', f'/api/tests/{test_id}/publish', 'setup')
+    client.close()
+    return data['data']['link_token']
+
+
+def random_answer(question):
+    """Случайный ответ (примерно половина правильных для вопросов с вариантами)"""
+    if question['question_type'] == 'single':
+        return random.randrange(len(question.get('options') or [0]))
+    if question['question_type'] == 'multiple':
+        return random.choice([[0, 2], [1], [0, 1, 2]])
+    return random.choice(['answer', 'wrong'])
+
+
+def run_student(base_url, link_token, number, run_id, batch, stats):
+    """Полный сценарий одного студента; True если все шаги выполнены"""
+    client = Client(base_url, stats)
+    try:
+        email = f'student-{run_id}-{number}@load.test'
+        status, data = client.request('POST', '/api/auth/register', 'POST /api/auth/register', {
+            'name': f'Student {number}', 'email': email, 'password': PASSWORD
+        }, expected=(201, 400))
+        if status == 400:
+            status, data = client.request('POST', '/api/auth/login', 'POST /api/auth/login', {
+                'email': email, 'password': PASSWORD
+            })
+        if status not in (200, 201):
+            return False
+        client.token = data['data']['token']
+
+        status, data = client.request('GET', f'/api/tests/link/{link_token}', 'GET /api/tests/link/{token}')
+        if status != 200:
+            return False
+        test = data['data']
+
+        status, data = client.request('POST', f'/api/tests/{test["id"]}/attempts',
+                                      'POST /api/tests/{id}/attempts', expected=(201, 200))
+        if status not in (200, 201):
+            return False
+        attempt_id = data['data']['id']
+
+        answers = [{'question_id': q['id'], 'answer': random_answer(q)} for q in test['questions']]
+        if batch:
+            status, _ = client.request('POST', f'/api/attempts/{attempt_id}/answers/batch',
+                                       'POST /api/attempts/{id}/answers/batch', {'answers': answers})
+            if status != 200:
+                return False
+        else:
+            for answer in answers:
+                status, _ = client.request('POST', f'/api/attempts/{attempt_id}/answers',
+                                           'POST /api/attempts/{id}/answers', answer)
+                if status != 200:
+                    return False
+
+        status, _ = client.request('POST', f'/api/attempts/{attempt_id}/finish', 'POST /api/attempts/{id}/finish')
+        return status == 200
+    finally:
+        client.close()
+
+
+def percentile(sorted_values, p):
+    """Перцентиль по методу ближайшего ранга"""
+    if not sorted_values:
+        return 0
+    index = max(0, min(len(sorted_values) - 1, round(p / 100 * len(sorted_values) + 0.5) - 1))
+    return sorted_values[index]
+
+
+def report(stats, elapsed, locked_in_log):
+    total = sum(len(v) for k, v in stats.latencies.items() if k != 'setup')
+    errors = sum(v for k, v in stats.errors.items() if k != 'setup')
+
+    print(f"{'endpoint':<42} {'count':>6} {'rps':>8} {'p50, ms':>8} {'p95, ms':>8} {'p99, ms':>8} {'errors':>7}")
+    for endpoint in sorted(k for k in stats.latencies if k != 'setup'):
+        values = sorted(stats.latencies[endpoint])
+        print(f'{endpoint:<42} {len(values):>6} {len(values) / elapsed:>8.1f} '
+              f'{percentile(values, 50) * 1000:>8.1f} {percentile(values, 95) * 1000:>8.1f} '
+              f'{percentile(values, 99) * 1000:>8.1f} {stats.errors[endpoint]:>7}')
+
+    print()
+    print(f'duration: {elapsed:.1f} s')
+    print(f'requests: {total}, throughput: {total / elapsed:.1f} req/s')
+    print(f'students: {stats.students_done} finished, {stats.students_failed} failed '
+          f'({stats.students_done / elapsed:.2f} attempts/s)')
+    print(f'error rate: {errors / total * 100 if total else 0:.2f}%')
+    contention = stats.contention + (locked_in_log or 0)
+    print(f'lock contention: {contention} ({contention / total * 100 if total else 0:.2f}% of requests; '
+          f'503 responses: {stats.contention}, '
+          f'"database is locked" in server log: {"n/a" if locked_in_log is None else locked_in_log})')
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(tmp_dir):
+    """Локальный сервер на временной SQLite БД; возвращает (url, процесс, путь к логу)"""
+    port = _free_port()
+    env = dict(
+        os.environ,
+        DATABASE_URL=f'sqlite:///{os.path.join(tmp_dir, "load.db")}',
+        RATE_LIMIT_ENABLED='false',
+        LOG_LEVEL='WARNING',
+    )
+    subprocess.run([sys.executable, '-m', 'flask', '--app', 'app', 'init-db'],
+                   cwd=ROOT, env=env, check=True, capture_output=True)
+
+    log_path = os.path.join(tmp_dir, 'server.log')
+    log = open(log_path, 'w')
+    process = subprocess.Popen(
+        [sys.executable, '-c',
+         f'from app import create_app; create_app().run(host="127.0.0.1", port={port}, threaded=True)'],
+        cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT
+    )
+
+    url = f'http://127.0.0.1:{port}'
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1):
+                return url, process, log_path
+        except OSError:
+            if process.poll() is not None:
+                break
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError(f'Server did not start, see {log_path}')
+
+
+def run(args):
+    stats = Stats()
+    tmp_dir = None
+    process = log_path = None
+    base_url = args.url
+    if not base_url:
+        tmp_dir = tempfile.mkdtemp(prefix='sky-load-')
+        base_url, process, log_path = start_server(tmp_dir)
+
+    try:
+        link_token = args.link_token or create_test(base_url, args.questions, stats)
+        run_id = uuid.uuid4().hex[:8]
+        numbers = iter(range(args.students))
+        numbers_lock = threading.Lock()
+
+        def worker(index):
+            # Плавный разгон: воркеры стартуют равномерно в течение ramp секунд
+            time.sleep(args.ramp * index / args.concurrency)
+            while True:
+                with numbers_lock:
+                    number = next(numbers, None)
+                if number is None:
+                    return
+                stats.student_finished(run_student(base_url, link_token, number, run_id, args.batch, stats))
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(args.concurrency)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=10)
+
+    locked_in_log = None
+    if log_path:
+        with open(log_path, encoding='utf-8', errors='replace') as f:
+            locked_in_log = sum(1 for line in f if 'database is locked' in line)
+
+    report(stats, elapsed, locked_in_log)
+    if log_path:
+        print(f'server log: {log_path}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Нагрузочный тест: регистрация, тест по ссылке, попытка, ответы, завершение')
+    parser.add_argument('--url', help='адрес запущенного экземпляра (по умолчанию - свой сервер на временной SQLite)')
+    parser.add_argument('--students', type=int, default=50, help='количество студентов')
+    parser.add_argument('--concurrency', type=int, default=10, help='одновременных студентов')
+    parser.add_argument('--questions', type=int, default=10, help='вопросов в тесте')
+    parser.add_argument('--ramp', type=float, default=2, help='время разгона до полной нагрузки, секунды')
+    parser.add_argument('--batch', action='store_true', help='отправлять ответы одним запросом /answers/batch')
+    parser.add_argument('--link-token', help='использовать существующий опубликованный тест')
+    run(parser.parse_args())
@@ -18,11 +18,121 @@ class Config:
     # Путь к базе данных SQLite
     SQLALCHEMY_DATABASE_URI = os.getenv('DATABASE_URL', f'sqlite:///{os.path.join(BASE_DIR, "database", "tests.db")}')
 
+    # Профиль SQLite (PRAGMA для каждого соединения): WAL журнал, режим синхронизации,
+    # ожидание блокировки (мс), размер mmap (байты), кэш страниц (отрицательное - в КиБ),
+    # хранение временных таблиц
+    SQLITE_PROFILE_ENABLED = os.getenv('SQLITE_PROFILE_ENABLED', 'true').lower() == 'true'
+    SQLITE_JOURNAL_MODE = os.getenv('SQLITE_JOURNAL_MODE', 'WAL')
+    SQLITE_SYNCHRONOUS = os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL')
+    SQLITE_BUSY_TIMEOUT = int(os.getenv('SQLITE_BUSY_TIMEOUT', 5000))
+    SQLITE_MMAP_SIZE = int(os.getenv('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))
+    SQLITE_CACHE_SIZE = int(os.getenv('SQLITE_CACHE_SIZE', -64000))
+    SQLITE_TEMP_STORE = os.getenv('SQLITE_TEMP_STORE', 'MEMORY')
+
+    # Пул соединений с БД: постоянные соединения, дополнительные при всплесках,
+    # ожидание свободного соединения (секунды), проверка соединения перед выдачей,
+    # пересоздание соединений старше заданного возраста (секунды)
+    DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 5))
+    DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', 10))
+    DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 30))
+    DB_POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', 'true').lower() == 'true'
+    DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', 1800))
+    # Максимальное время выполнения одного SQL запроса в рамках HTTP запроса (мс, 0 - без ограничения)
+    STATEMENT_TIMEOUT_MS = int(os.getenv('STATEMENT_TIMEOUT_MS', 15000))
+
+    # Собранная спецификация OpenAPI (пересобирается только при изменении маршрутов)
+    # и сборка при запуске приложения вместо первого запроса к /apispec.json
+    API_SPEC_PATH = os.getenv('API_SPEC_PATH', os.path.join(BASE_DIR, 'build', 'apispec.json'))
+    API_SPEC_BUILD_ON_STARTUP = os.getenv('API_SPEC_BUILD_ON_STARTUP', 'false').lower() == 'true'
+
+    # Уровень логирования приложения
+    LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+
+    # Учет SQL запросов в рамках HTTP запроса: сколько одинаковых запросов считать вероятным N+1,
+    # запись N+1 в лог вне режима отладки, превышение бюджета statement_budget - исключение (иначе лог)
+    SQL_N_PLUS_ONE_THRESHOLD = int(os.getenv('SQL_N_PLUS_ONE_THRESHOLD', 5))
+    SQL_N_PLUS_ONE_LOG = os.getenv('SQL_N_PLUS_ONE_LOG', 'false').lower() == 'true'
+    SQL_BUDGET_STRICT = os.getenv('SQL_BUDGET_STRICT', 'false').lower() == 'true'
+    # Журнал медленных запросов из сервисов и HTML маршрутов: порог (мс, 0 - выключен) и файл JSON lines
+    SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', 200))
+    SLOW_QUERY_LOG_PATH = os.getenv('SLOW_QUERY_LOG_PATH', os.path.join(BASE_DIR, 'build', 'slow_queries.jsonl'))
+
+    # Метрики Prometheus на /metrics: включение, токен доступа (Authorization: Bearer; пусто - только
+    # запросы с локального адреса), границы корзин гистограмм задержки (секунды)
+    METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'true').lower() == 'true'
+    METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+    METRICS_LATENCY_BUCKETS = [float(v) for v in os.getenv(
+        'METRICS_LATENCY_BUCKETS', '0.005,0.01,0.025,0.05,0.1,0.25,0.5,1,2.5,5,10').split(',')]
+    # Каталог снимков метрик процессов (несколько воркеров) и период сохранения снимка (секунды)
+    METRICS_MULTIPROC_DIR = os.getenv('METRICS_MULTIPROC_DIR', '')
+    METRICS_FLUSH_SECONDS = float(os.getenv('METRICS_FLUSH_SECONDS', 5))
+
+    # Профилирование отдельных запросов: токен заголовка X-Profile (пусто - заголовок не действует),
+    # доля профилируемых запросов (0 - выключено), режим ('cprofile' или 'sampling'),
+    # интервал снимков стека (мс), каталог профилей и сколько последних профилей хранить,
+    # минимальная длительность запроса из выборки для сохранения профиля (мс)
+    PROFILE_TOKEN = os.getenv('PROFILE_TOKEN', '')
+    PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', 0))
+    PROFILE_MODE = os.getenv('PROFILE_MODE', 'cprofile')
+    PROFILE_SAMPLE_INTERVAL_MS = float(os.getenv('PROFILE_SAMPLE_INTERVAL_MS', 5))
+    PROFILE_DIR = os.getenv('PROFILE_DIR', os.path.join(BASE_DIR, 'build', 'profiles'))
+    PROFILE_MAX_ARTIFACTS = int(os.getenv('PROFILE_MAX_ARTIFACTS', 50))
+    PROFILE_MIN_DURATION_MS = float(os.getenv('PROFILE_MIN_DURATION_MS', 0))
+
+    # Реплика для чтения (статистика, списки тестов, тест по ссылке). Без настройки - основная БД.
+    # READ_REPLICA_SQLITE_COPY - использовать локальную копию основной SQLite БД (для проверки)
+    DATABASE_REPLICA_URL = os.getenv('DATABASE_REPLICA_URL', '')
+    READ_REPLICA_SQLITE_COPY = os.getenv('READ_REPLICA_SQLITE_COPY', 'false').lower() == 'true'
+    # Сколько секунд после записи пользователь читает свои данные с основной БД
+    READ_YOUR_WRITES_SECONDS = int(os.getenv('READ_YOUR_WRITES_SECONDS', 30))
+    # Максимальный возраст локальной копии (секунды, 0 - без ограничения): более старая копия
+    # не используется до следующего sync-replica
+    READ_REPLICA_MAX_STALENESS_SECONDS = int(os.getenv('READ_REPLICA_MAX_STALENESS_SECONDS', 300))
+
     # Отключаем отслеживание модификаций (не нужно, экономит память)
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+    # Количество доверенных обратных прокси перед приложением: IP клиента берется из
+    # X-Forwarded-For (0 - заголовок не учитывается, IP соединения)
+    TRUSTED_PROXY_COUNT = int(os.getenv('TRUSTED_PROXY_COUNT', 0))
+
     # Разрешенные источники для CORS (для API запросов с фронтенда)
     CORS_ORIGINS = os.getenv('CORS_ORIGINS', 'http://localhost:8080').split(',')
 
     # Срок действия JWT токенов в часах
     JWT_EXPIRATION_HOURS = int(os.getenv('JWT_EXPIRATION_HOURS', 24))
+
+    # Политика хеширования паролей: метод werkzeug с параметрами стоимости
+    # (например 'scrypt', 'scrypt:65536:8:1', 'pbkdf2:sha256:600000')
+    PASSWORD_HASH_METHOD = os.getenv('PASSWORD_HASH_METHOD', 'scrypt')
+    # Пул хеширования: число потоков, длина очереди и время ожидания места в очереди (секунды)
+    PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', os.cpu_count() or 2))
+    PASSWORD_HASH_QUEUE_SIZE = int(os.getenv('PASSWORD_HASH_QUEUE_SIZE', 32))
+    PASSWORD_HASH_WAIT_TIMEOUT = float(os.getenv('PASSWORD_HASH_WAIT_TIMEOUT', 5))
+
+    # Лимит запросов на вход и регистрацию (token bucket, проверяется до хеширования пароля):
+    # емкость корзины (всплеск) и скорость пополнения в запросах в минуту - по IP и по email.
+    # Корзина IP рассчитана на класс за одним NAT, основной лимит - по email
+    RATE_LIMIT_ENABLED = os.getenv('RATE_LIMIT_ENABLED', 'true').lower() == 'true'
+    AUTH_RATE_LIMIT_IP_BURST = int(os.getenv('AUTH_RATE_LIMIT_IP_BURST', 100))
+    AUTH_RATE_LIMIT_IP_PER_MINUTE = float(os.getenv('AUTH_RATE_LIMIT_IP_PER_MINUTE', 60))
+    AUTH_RATE_LIMIT_EMAIL_BURST = int(os.getenv('AUTH_RATE_LIMIT_EMAIL_BURST', 5))
+    AUTH_RATE_LIMIT_EMAIL_PER_MINUTE = float(os.getenv('AUTH_RATE_LIMIT_EMAIL_PER_MINUTE', 3))
+    # Хранилище корзин: 'memory' (свое в каждом процессе) или 'sqlite' (общее для воркеров сервера)
+    RATE_LIMIT_BACKEND = os.getenv('RATE_LIMIT_BACKEND', 'memory')
+    RATE_LIMIT_SQLITE_PATH = os.getenv('RATE_LIMIT_SQLITE_PATH', os.path.join(BASE_DIR, 'database', 'rate_limit.db'))
+    # Максимальное количество корзин в памяти процесса
+    RATE_LIMIT_MAX_KEYS = int(os.getenv('RATE_LIMIT_MAX_KEYS', 100000))
+
+    # Кэш проверенных JWT токенов: максимальный размер и время жизни записи в секундах
+    TOKEN_CACHE_SIZE = int(os.getenv('TOKEN_CACHE_SIZE', 10000))
+    TOKEN_CACHE_TTL = int(os.getenv('TOKEN_CACHE_TTL', 300))
+
+    # Максимальное количество скомпилированных ключей ответов в кэше проверки
+    ANSWER_KEY_CACHE_SIZE = int(os.getenv('ANSWER_KEY_CACHE_SIZE', 4096))
+
+    # Максимальное количество опубликованных тестов в кэше данных для прохождения по ссылке
+    TEST_PAYLOAD_CACHE_SIZE = int(os.getenv('TEST_PAYLOAD_CACHE_SIZE', 256))
+
+    # Размер партии строк при потоковой выгрузке попыток (/api/tests/<id>/export)
+    EXPORT_YIELD_PER = int(os.getenv('EXPORT_YIELD_PER', 1000))
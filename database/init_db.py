@@ -9,12 +9,31 @@ from backend.models.test import Test
 from backend.models.question import Question
 from backend.models.attempt import TestAttempt
 from backend.models.answer import Answer
+from backend.models.test_stats import TestStats
+
+# Индексы, добавленные в модели после создания таблиц. create_all не добавляет
+# индексы в уже существующие таблицы, поэтому они создаются отдельно
+ADDED_INDEXES = (
+    (TestAttempt, 'ix_test_attempts_user_finished'),
+    # Курсорная пагинация списков попыток и тестов
+    (TestAttempt, 'ix_test_attempts_test_started'),
+    (Test, 'ix_tests_user_created'),
+)
 
 def init_database(app):
     """
-    Инициализация базы данных - создание всех таблиц
+    Инициализация базы данных - создание всех таблиц и недостающих индексов
+
+    Повторный запуск безопасен: существующие таблицы и индексы не изменяются.
     """
     with app.app_context():
         db_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'database')
         os.makedirs(db_path, exist_ok=True)
         db.create_all()
+        create_missing_indexes()
+
+def create_missing_indexes():
+    """Создание индексов из ADDED_INDEXES, которых еще нет в базе данных"""
+    for model, name in ADDED_INDEXES:
+        index = next(index for index in model.__table__.indexes if index.name == name)
+        index.create(db.engine, checkfirst=True)
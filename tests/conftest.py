@@ -0,0 +1,116 @@
+"""
+Общие фикстуры тестов: приложение на временной SQLite БД и клиенты с авторизацией
+
+Настройки передаются в create_app: бюджеты SQL запросов маршрутов (@statement_budget)
+строгие - превышение выбрасывает StatementBudgetExceeded и тест падает; лимиты входа
+и метрики выключены, хеширование паролей дешевое.
+"""
+
+import os
+import tempfile
+import uuid
+import pytest
+from app import create_app
+from config import Config
+from database.init_db import init_database
+
+_tmp_dir = tempfile.mkdtemp(prefix='skytest-')
+
+
+class TestConfig(Config):
+    """Настройки приложения в тестах"""
+
+    __test__ = False
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = f'sqlite:///{os.path.join(_tmp_dir, "tests.db")}'
+    SQL_BUDGET_STRICT = True
+    RATE_LIMIT_ENABLED = False
+    PASSWORD_HASH_METHOD = 'pbkdf2:sha256:1000'
+    SLOW_QUERY_MS = 0
+    METRICS_ENABLED = False
+    READ_REPLICA_SQLITE_COPY = False
+    DATABASE_REPLICA_URL = ''
+
+
+PASSWORD = 'Secret123!'
+
+
+@pytest.fixture(scope='session')
+def app():
+    app = create_app(TestConfig)
+    init_database(app)
+    return app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+class ApiUser:
+    """Пользователь, зарегистрированный через API (запросы с его токеном)"""
+
+    def __init__(self, client, name='Test User'):
+        self.client = client
+        self.email = f'user-{uuid.uuid4().hex[:12]}@example.com'
+        response = client.post('/api/auth/register', json={'name': name, 'email': self.email, 'password': PASSWORD})
+        assert response.status_code == 201, response.get_json()
+        data = response.get_json()['data']
+        self.token = data['token']
+        self.id = data['user']['id']
+
+    def request(self, method, path, expected=200, **kwargs):
+        response = self.client.open(path, method=method, headers={'Authorization': f'Bearer {self.token}'}, **kwargs)
+        assert response.status_code == expected, (path, response.status_code, response.get_data(as_text=True)[:500])
+        return response.get_json()['data'] if response.is_json else response
+
+    def get(self, path, **kwargs):
+        return self.request('GET', path, **kwargs)
+
+    def post(self, path, expected=200, **kwargs):
+        return self.request('POST', path, expected=expected, **kwargs)
+
+    def create_test(self, questions=1, publish=True):
+        """Тест с вопросами всех типов; возвращает данные теста (с link_token, если опубликован)"""
+        test = self.post('/api/tests', expected=201, json={'title': f'Test {uuid.uuid4().hex[:6]}'})
+        kinds = ('single', 'multiple', 'text')
+        for index in range(questions):
+            kind = kinds[index % len(kinds)]
+            question = {'question_text': f'Question {index + 1}', 'question_type': kind}
+            if kind == 'single':
+                question.update(options=['a', 'b', 'c'], correct_answer=index % 3)
+            elif kind == 'multiple':
+                question.update(options=['a', 'b', 'c'], correct_answer=[0, 2])
+            else:
+                question.update(correct_answer='answer')
+            self.post(f'/api/tests/{test["id"]}/questions', expected=201, json=question)
+        if publish:
+            test = self.post(f'/api/tests/{test["id"]}/publish')
+        return test
+
+    def take_test(self, link_token):
+        """Полное прохождение опубликованного теста; возвращает id завершенной попытки"""
+        test = self.get(f'/api/tests/link/{link_token}')
+        attempt = self.post(f'/api/tests/{test["id"]}/attempts', expected=201)
+        answers = [{'question_id': question['id'], 'answer': 0 if question['question_type'] == 'single' else 'answer'}
+                   for question in test['questions']]
+        self.post(f'/api/attempts/{attempt["id"]}/answers/batch', json={'answers': answers})
+        self.post(f'/api/attempts/{attempt["id"]}/finish')
+        return attempt['id']
+
+
+@pytest.fixture
+def teacher(client):
+    return ApiUser(client, 'Teacher')
+
+
+@pytest.fixture
+def make_student(app):
+    """Фабрика студентов - у каждого свой клиент"""
+    return lambda: ApiUser(app.test_client(), 'Student')
+
+
+def login_session(client, user):
+    """Вход в веб-интерфейс (сессия в cookie клиента)"""
+    response = client.post('/login', data={'email': user.email, 'password': PASSWORD})
+    assert response.status_code == 302, response.get_data(as_text=True)[:500]
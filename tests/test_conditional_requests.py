@@ -0,0 +1,74 @@
+"""
+Условные GET запросы: ETag, If-Modified-Since с точностью до секунды не скрывает изменения
+"""
+
+import time
+from datetime import datetime
+from werkzeug.http import http_date
+from backend.utils.responses import _is_not_modified
+
+
+def _not_modified(app, last_modified, if_modified_since):
+    with app.test_request_context(headers={'If-Modified-Since': http_date(if_modified_since)}):
+        return _is_not_modified('etag', last_modified)
+
+
+def test_change_within_the_cached_second_is_modified(app):
+    cached = datetime(2026, 1, 1, 10, 0, 0)
+    assert not _not_modified(app, datetime(2026, 1, 1, 10, 0, 0, 500000), cached)
+
+
+def test_older_change_is_not_modified(app):
+    cached = datetime(2026, 1, 1, 10, 0, 0)
+    assert _not_modified(app, datetime(2026, 1, 1, 9, 59, 59, 500000), cached)
+    assert _not_modified(app, cached, cached)
+
+
+
+def _start_of_second():
+    """Ждет начала новой секунды, чтобы изменение и запросы после него попали в одну секунду"""
+    time.sleep(1 - time.time() % 1)
+
+
+def test_matching_etag_returns_not_modified(client, teacher):
+    test = teacher.create_test(questions=2)
+    headers = {'Authorization': f'Bearer {teacher.token}'}
+
+    response = client.get(f'/api/tests/{test["id"]}', headers=headers)
+    assert response.status_code == 200 and response.headers['ETag']
+
+    cached = client.get(f'/api/tests/{test["id"]}', headers={**headers, 'If-None-Match': response.headers['ETag']})
+    assert cached.status_code == 304
+    assert cached.headers['ETag'] == response.headers['ETag']
+    assert not cached.get_data()
+
+
+def test_write_changes_etag(client, teacher):
+    test = teacher.create_test(questions=2)
+    headers = {'Authorization': f'Bearer {teacher.token}'}
+    old_etag = client.get(f'/api/tests/{test["id"]}', headers=headers).headers['ETag']
+
+    teacher.request('PUT', f'/api/tests/{test["id"]}', json={'title': 'Renamed'})
+
+    response = client.get(f'/api/tests/{test["id"]}', headers={**headers, 'If-None-Match': old_etag})
+    assert response.status_code == 200
+    assert response.get_json()['data']['title'] == 'Renamed'
+    assert response.headers['ETag'] != old_etag
+
+
+def test_no_last_modified_within_the_changed_second(client, teacher):
+    test = teacher.create_test(questions=1)
+    path = f'/api/tests/link/{test["link_token"]}'
+
+    _start_of_second()
+    teacher.request('PUT', f'/api/tests/{test["id"]}', json={'title': 'Renamed'})
+    response = client.get(path)
+    assert response.status_code == 200
+    assert 'Last-Modified' not in response.headers
+
+    # После окончания секунды изменения заголовок отправляется и подтверждает кэш
+    _start_of_second()
+    response = client.get(path)
+    assert response.headers['Last-Modified']
+    cached = client.get(path, headers={'If-Modified-Since': response.headers['Last-Modified']})
+    assert cached.status_code == 304
@@ -0,0 +1,31 @@
+"""
+Маршрутизация чтения: свежесть локальной копии SQLite
+"""
+
+import os
+import sqlite3
+import time
+from sqlalchemy import create_engine
+from backend.utils import db_routing
+from backend.utils.db_routing import _replica_fresh, sync_sqlite_replica
+
+
+def test_replica_freshness_is_cached_until_sync(app, tmp_path, monkeypatch):
+    primary_uri, replica_uri = f'sqlite:///{tmp_path}/main.db', f'sqlite:///{tmp_path}/main_replica.db'
+    sqlite3.connect(tmp_path / 'main.db').close()
+    replica = create_engine(replica_uri)
+
+    with app.app_context():
+        # Копии еще нет - чтение с основной БД
+        assert not _replica_fresh(replica)
+
+        # Обновление копии сбрасывает кэш
+        assert sync_sqlite_replica(primary_uri, replica_uri)
+        assert _replica_fresh(replica)
+
+        # Устаревшая копия замечается после интервала проверки, а не при каждом запросе
+        stale = time.time() - 3600
+        os.utime(tmp_path / 'main_replica.db', (stale, stale))
+        assert _replica_fresh(replica)
+        monkeypatch.setattr(db_routing, 'REPLICA_MTIME_CHECK_SECONDS', 0)
+        assert not _replica_fresh(replica)
@@ -0,0 +1,33 @@
+"""
+Потоковая выгрузка попыток: ограничение времени SQL запросов не обрывает долгую выгрузку
+"""
+
+import time
+from app import create_app
+from conftest import TestConfig
+from backend.routes import statistics
+
+
+class SlowExportConfig(TestConfig):
+    # Короткий лимит и чтение по одной строке - выгрузка идет дольше STATEMENT_TIMEOUT_MS
+    STATEMENT_TIMEOUT_MS = 20
+    EXPORT_YIELD_PER = 1
+
+
+def _slow_chunks(attempts):
+    """Медленная обработка каждой попытки (например, медленный клиент)"""
+    for attempt in attempts:
+        time.sleep(0.01)
+        yield f'{attempt["attempt_id"]}\n'
+
+
+def test_slow_export_is_not_cut_off(app, teacher, make_student, monkeypatch):
+    test = teacher.create_test(questions=6)
+    attempt_ids = [make_student().take_test(test['link_token']) for _ in range(15)]
+
+    monkeypatch.setitem(statistics.EXPORT_FORMATS, 'csv', (_slow_chunks, 'text/csv'))
+    client = create_app(SlowExportConfig).test_client()
+    response = client.get(f'/api/tests/{test["id"]}/export', headers={'Authorization': f'Bearer {teacher.token}'})
+
+    assert response.status_code == 200
+    assert sorted(int(line) for line in response.get_data(as_text=True).split()) == sorted(attempt_ids)
@@ -0,0 +1,81 @@
+"""
+Проверка ответов через скомпилированные ключи совпадает с исходной check_answer
+"""
+
+import itertools
+import json
+from types import SimpleNamespace
+import pytest
+from backend.services.attempt_service import check_answer
+from backend.services.grading_service import clear_answer_keys
+
+
+def baseline_check_answer(question, user_answer):
+    """Исходная проверка ответа (до компиляции ключей) - эталон поведения"""
+    if not question.correct_answer:
+        return None
+    try:
+        correct = json.loads(question.correct_answer)
+    except (json.JSONDecodeError, TypeError):
+        return None
+
+    if question.question_type == 'single':
+        try:
+            if isinstance(user_answer, str):
+                try:
+                    user_ans_int = int(json.loads(user_answer))
+                except (json.JSONDecodeError, ValueError, TypeError):
+                    user_ans_int = int(user_answer)
+            else:
+                user_ans_int = int(user_answer)
+        except (ValueError, TypeError):
+            return False
+        if isinstance(correct, list):
+            if len(correct) > 0:
+                return user_ans_int == correct[0]
+            return False
+        return user_ans_int == correct
+    elif question.question_type == 'multiple':
+        if isinstance(user_answer, str):
+            try:
+                user_ans = json.loads(user_answer)
+            except (json.JSONDecodeError, TypeError):
+                return False
+        else:
+            user_ans = user_answer
+        if not isinstance(user_ans, list):
+            return False
+        if not isinstance(correct, list):
+            return None
+        return sorted(user_ans) == sorted(correct)
+    elif question.question_type == 'text':
+        return str(user_answer).strip().lower() == str(correct).strip().lower()
+    return None
+
+
+CORRECT_ANSWERS = [
+    None, '', 'not json', '0', '1', '"0"', '0.5', '1.0', 'true', '[]', '[1]', '["1"]', '[0, 2]', '[2, 0]',
+    '[0, 0]', '[0, 0, 2]', '[0.0, 2]', '"answer"', '" Answer "', '{"a": 1}', 'null',
+]
+USER_ANSWERS = [
+    0, 1, 2, 0.5, 1.0, True, None, '0', '1', '"0"', '"1"', '0.5', 'abc', '', ' ANSWER ', 'answer',
+    [], [0], [1], [0, 2], [2, 0], [0, 0], [0, 0, 2], [0, 2, 2], [0.0, 2], '[0, 2]', '[2,0]', '[0,0]', '[bad',
+]
+
+
+@pytest.mark.parametrize('question_type', ['single', 'multiple', 'text', 'other'])
+def test_check_answer_matches_baseline(question_type):
+    clear_answer_keys()
+    compared = 0
+    for question_id, (correct, user_answer) in enumerate(itertools.product(CORRECT_ANSWERS, USER_ANSWERS)):
+        question = SimpleNamespace(id=question_id, question_type=question_type, correct_answer=correct)
+        try:
+            expected = baseline_check_answer(question, user_answer)
+        except TypeError:
+            # Исходная проверка падала на несравнимых значениях - не сравниваем
+            continue
+        # Второй вызов берет ключ из кэша
+        assert check_answer(question, user_answer) == expected, (correct, user_answer)
+        assert check_answer(question, user_answer) == expected, (correct, user_answer)
+        compared += 1
+    assert compared > len(CORRECT_ANSWERS) * len(USER_ANSWERS) / 2
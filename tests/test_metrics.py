@@ -0,0 +1,33 @@
+"""
+Доступ к /metrics: без METRICS_TOKEN - только с локального адреса, с токеном - по Bearer
+"""
+
+import pytest
+from app import create_app
+from conftest import TestConfig
+
+
+class MetricsConfig(TestConfig):
+    METRICS_ENABLED = True
+
+
+@pytest.fixture
+def metrics_app(app):
+    return create_app(MetricsConfig)
+
+
+def test_metrics_only_for_local_clients_without_token(metrics_app):
+    client = metrics_app.test_client()
+    assert client.get('/metrics', environ_base={'REMOTE_ADDR': '127.0.0.1'}).status_code == 200
+    assert client.get('/metrics', environ_base={'REMOTE_ADDR': '203.0.113.7'}).status_code == 403
+
+
+def test_metrics_token_required_when_configured(metrics_app):
+    metrics_app.config['METRICS_TOKEN'] = 'secret'
+    client = metrics_app.test_client()
+    local = {'REMOTE_ADDR': '127.0.0.1'}
+    assert client.get('/metrics', environ_base=local).status_code == 403
+    response = client.get('/metrics', headers={'Authorization': 'Bearer secret'},
+                          environ_base={'REMOTE_ADDR': '203.0.113.7'})
+    assert response.status_code == 200
+    assert 'http_requests_total' in response.get_data(as_text=True)
@@ -0,0 +1,35 @@
+"""
+Курсорная пагинация списков API
+"""
+
+from backend.models import db
+from backend.models.attempt import TestAttempt
+
+
+def _walk(user, path, limit):
+    """Все страницы курсорного режима; возвращает id строк в порядке выдачи"""
+    ids, cursor = [], ''
+    while cursor is not None:
+        page = user.get(f'{path}?cursor={cursor}&limit={limit}')
+        ids += [item['id'] for item in page['items']]
+        cursor = page['next_cursor']
+    return ids
+
+
+def test_invalid_cursor_is_rejected(teacher):
+    test = teacher.create_test()
+    teacher.get(f'/api/tests/{test["id"]}/attempts?cursor=garbage', expected=400)
+    teacher.get('/api/tests?cursor=garbage', expected=400)
+
+
+def test_attempts_without_start_time_are_paged_last(app, teacher, make_student):
+    test = teacher.create_test(questions=2)
+    attempt_ids = [make_student().take_test(test['link_token']) for _ in range(4)]
+
+    # Попытки без started_at (ручные правки или перенос старой базы) не ломают курсор
+    with app.app_context():
+        TestAttempt.query.filter(TestAttempt.id.in_(attempt_ids[:2])).update({'started_at': None})
+        db.session.commit()
+
+    ids = _walk(teacher, f'/api/tests/{test["id"]}/attempts', limit=1)
+    assert ids == [attempt_ids[3], attempt_ids[2], attempt_ids[1], attempt_ids[0]]
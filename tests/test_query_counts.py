@@ -0,0 +1,45 @@
+"""
+Количество SQL запросов списков тестов не зависит от числа тестов, вопросов и попыток
+
+Счетчики вопросов и попыток загружаются подзапросами вместе с тестами
+(Test.with_counts), а не обходом связей каждого теста.
+"""
+
+from backend.utils.sql_instrumentation import count_statements
+from conftest import login_session
+
+
+def _statements(client, path, headers=None):
+    with count_statements() as stats:
+        response = client.get(path, headers=headers)
+    assert response.status_code == 200
+    return stats.count
+
+
+def _add_tests(teacher, make_student, tests, questions, attempts):
+    for _ in range(tests):
+        test = teacher.create_test(questions=questions)
+        for _ in range(attempts):
+            make_student().take_test(test['link_token'])
+
+
+def test_dashboard_statement_count_is_constant(client, teacher, make_student):
+    login_session(client, teacher)
+    _add_tests(teacher, make_student, tests=1, questions=1, attempts=1)
+    baseline = _statements(client, '/dashboard')
+
+    _add_tests(teacher, make_student, tests=3, questions=4, attempts=2)
+    assert _statements(client, '/dashboard') == baseline
+
+
+def test_api_tests_statement_count_is_constant(client, teacher, make_student):
+    headers = {'Authorization': f'Bearer {teacher.token}'}
+    _add_tests(teacher, make_student, tests=1, questions=1, attempts=1)
+    baseline = _statements(client, '/api/tests', headers)
+
+    _add_tests(teacher, make_student, tests=3, questions=4, attempts=2)
+    assert _statements(client, '/api/tests', headers) == baseline
+
+    tests = client.get('/api/tests', headers=headers).get_json()['data']
+    assert isinstance(tests, list)
+    assert sorted(test['attempts_count'] for test in tests) == [1, 2, 2, 2]
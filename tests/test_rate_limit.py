@@ -0,0 +1,19 @@
+"""
+Лимит попыток входа: разбор email из тела запроса
+"""
+
+import pytest
+from backend.utils.rate_limit import _request_email
+
+
+@pytest.mark.parametrize('body', [[{'email': 'a@example.com'}], 'a@example.com', 42, None])
+def test_non_object_json_body_has_no_email(app, body):
+    with app.test_request_context('/api/auth/login', method='POST', json=body):
+        assert _request_email() is None
+
+
+def test_email_is_normalized(app):
+    with app.test_request_context('/api/auth/login', method='POST', json={'email': ' A@Example.com '}):
+        assert _request_email() == 'a@example.com'
+    with app.test_request_context('/login', method='POST', data={'email': 'B@example.com'}):
+        assert _request_email() == 'b@example.com'
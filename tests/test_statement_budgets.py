@@ -0,0 +1,76 @@
+"""
+Бюджеты SQL запросов маршрутов (@statement_budget) на данных с несколькими
+вопросами и попытками - в тестах бюджеты строгие, превышение роняет запрос
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from backend.utils.sql_instrumentation import StatementBudgetExceeded, statement_budget
+from conftest import login_session
+
+
+@pytest.fixture
+def taken_test(teacher, make_student):
+    """Опубликованный тест с 6 вопросами и 4 завершенными попытками"""
+    test = teacher.create_test(questions=6)
+    students = [make_student() for _ in range(4)]
+    attempts = [(student, student.take_test(test['link_token'])) for student in students]
+    return test, attempts
+
+
+def test_budget_violation_fails_the_request(client, teacher):
+    headers = {'Authorization': f'Bearer {teacher.token}'}
+    with pytest.raises(StatementBudgetExceeded):
+        with statement_budget(0, strict=True):
+            client.get('/api/tests', headers=headers)
+
+
+def test_dashboard_within_budget(client, teacher, taken_test):
+    login_session(client, teacher)
+    assert client.get('/dashboard').status_code == 200
+
+
+def test_statistics_page_within_budget(client, teacher, taken_test):
+    test, _ = taken_test
+    login_session(client, teacher)
+    for query in ('', '?sort=score&order=asc', '?page=2&per_page=2'):
+        assert client.get(f'/statistics/{test["id"]}{query}').status_code == 200
+
+
+def test_test_statistics_api_within_budget(teacher, taken_test):
+    test, _ = taken_test
+    stats = teacher.get(f'/api/tests/{test["id"]}/statistics')
+    assert stats['total_attempts'] == 4
+
+
+def test_test_attempts_api_within_budget(teacher, taken_test):
+    test, _ = taken_test
+    assert len(teacher.get(f'/api/tests/{test["id"]}/attempts?skip=1&limit=2')) == 2
+
+    # Курсорный режим - первая и следующая страницы
+    page = teacher.get(f'/api/tests/{test["id"]}/attempts?cursor=&limit=3')
+    assert len(page['items']) == 3
+    page = teacher.get(f'/api/tests/{test["id"]}/attempts?cursor={page["next_cursor"]}&limit=3')
+    assert len(page['items']) == 1
+
+
+def test_attempt_results_api_within_budget(taken_test):
+    _, attempts = taken_test
+    student, attempt_id = attempts[0]
+    results = student.get(f'/api/attempts/{attempt_id}/results')
+    assert len(results['answers']) == 6
+
+
+def test_budgeted_route_handles_concurrent_requests(app, teacher, taken_test):
+    """Один экземпляр @statement_budget на маршрут не делит состояние между потоками"""
+    test, _ = taken_test
+    path = f'/api/tests/{test["id"]}/statistics'
+    headers = {'Authorization': f'Bearer {teacher.token}'}
+
+    def fetch(_):
+        client = app.test_client()
+        return [client.get(path, headers=headers).status_code for _ in range(10)]
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        statuses = [status for batch in executor.map(fetch, range(8)) for status in batch]
+    assert statuses == [200] * 80
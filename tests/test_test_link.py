@@ -0,0 +1,20 @@
+"""
+Публичные данные теста по ссылке
+"""
+
+
+def test_public_payload_keeps_test_fields(teacher, make_student):
+    test = teacher.create_test(questions=3)
+    make_student().take_test(test['link_token'])
+
+    public = make_student().get(f'/api/tests/link/{test["link_token"]}')
+    full = teacher.get(f'/api/tests/{test["id"]}')
+
+    # Все поля теста, кроме счетчика попыток (кэшируемый ответ)
+    assert set(public) == set(full) - {'attempts_count'}
+    for field in ('id', 'user_id', 'created_at', 'updated_at', 'link_token', 'is_published'):
+        assert public[field] == full[field], field
+
+    # Вопросы в том же порядке, без правильных ответов
+    assert [q['id'] for q in public['questions']] == [q['id'] for q in full['questions']]
+    assert all('correct_answer' not in q for q in public['questions'])
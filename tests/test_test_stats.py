@@ -0,0 +1,64 @@
+"""
+Агрегат статистики теста: инкрементальное обновление и полный пересчет совпадают
+"""
+
+from datetime import datetime
+import pytest
+from backend.models import db
+from backend.models.attempt import TestAttempt
+from backend.models.test_stats import TestStats
+from backend.services.stats_service import record_attempt_score, rebuild_test_stats
+
+FIELDS = ('attempts_count', 'score_sum', 'score_sq_sum', 'min_score', 'max_score')
+
+
+def _snapshot(test_id):
+    db.session.expire_all()
+    stats = db.session.get(TestStats, test_id)
+    return {field: getattr(stats, field) for field in FIELDS}
+
+
+def test_incremental_and_rebuilt_stats_are_equal(app, teacher, make_student):
+    test = teacher.create_test(questions=3)
+    for _ in range(3):
+        make_student().take_test(test['link_token'])
+
+    with app.app_context():
+        # Завершенная попытка без результата (например, перенесенная из старой базы)
+        attempt = TestAttempt(test_id=test['id'], user_id=teacher.id, finished_at=datetime.utcnow(), score=None)
+        db.session.add(attempt)
+        record_attempt_score(test['id'], None)
+        db.session.commit()
+
+        incremental = _snapshot(test['id'])
+        rebuild_test_stats(test['id'])
+        db.session.commit()
+        rebuilt = _snapshot(test['id'])
+
+        assert incremental['attempts_count'] == rebuilt['attempts_count'] == 4
+        for field in FIELDS[1:]:
+            assert incremental[field] == pytest.approx(rebuilt[field]), field
+        # Попытка без результата не влияет на минимум
+        assert rebuilt['min_score'] is not None and rebuilt['min_score'] >= 0
+        assert db.session.get(TestStats, test['id']).to_dict()['total_attempts'] == 4
+
+
+def test_missing_stats_row_is_computed_without_writes(app, teacher, make_student):
+    test = teacher.create_test(questions=2)
+    for _ in range(2):
+        make_student().take_test(test['link_token'])
+
+    with app.app_context():
+        expected = db.session.get(TestStats, test['id']).to_dict()
+        # Тест, созданный до появления таблицы test_stats
+        TestStats.query.filter_by(test_id=test['id']).delete()
+        db.session.commit()
+
+    assert teacher.get(f'/api/tests/{test["id"]}/statistics') == expected
+
+    # GET статистики ничего не сохраняет - строку создает rebuild-test-stats
+    with app.app_context():
+        assert db.session.get(TestStats, test['id']) is None
+        rebuild_test_stats(test['id'])
+        db.session.commit()
+        assert db.session.get(TestStats, test['id']).to_dict() == expected
@@ -0,0 +1,32 @@
+"""
+Отзыв JWT токенов действует и на токены, выданные в ту же секунду
+"""
+
+import pytest
+from backend.utils.jwt_utils import create_token, decode_token, revoke_token, revoke_user_tokens
+
+
+@pytest.fixture(autouse=True)
+def app_context(app):
+    with app.app_context():
+        yield
+
+
+def test_password_change_revokes_token_from_the_same_second():
+    token = create_token(1001)
+    assert decode_token(token) == 1001
+
+    revoke_user_tokens(1001)
+    assert decode_token(token) is None
+
+    fresh = create_token(1001)
+    assert decode_token(fresh) == 1001
+
+
+def test_logout_revokes_only_that_token():
+    token, other = create_token(1002), create_token(1002)
+    assert decode_token(token) == decode_token(other) == 1002
+
+    revoke_token(token)
+    assert decode_token(token) is None
+    assert decode_token(other) == 1002